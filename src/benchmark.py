@@ -0,0 +1,239 @@
+# coding=UTF-8
+"""
+    Benchmarks of GetTheFacts on a synthetic corpus.
+
+    Every scenario is run several times on the same corpus, and the best
+    time is reported, as the number of operations per second. The results
+    are printed, and can be saved as JSON and compared with the results
+    saved before:
+
+        python benchmark.py --output base.json
+        ... change the code ...
+        python benchmark.py --baseline base.json
+
+    The comparison fails (exit status 1) if any scenario became slower than
+    the baseline by more than the tolerance.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+import optparse
+from getthefacts.corpus import CorpusGenerator
+from getthefacts.actor import ActorStore, ActorJsonFormatter
+from getthefacts.loaders import readDir
+from getthefacts.rules import RuleParser, RuleCompiler
+from getthefacts.fact.jinja import JinjaFactTemplate, JinjaFactFormatter
+from getthefacts.fact.index import FactIndex
+from getthefacts.fact.choosers import RandomFactChooser, ActorBasedRandomFactChooser
+
+class Corpus:
+
+    """The generated actors, rules and facts, and their copies written to the directories."""
+
+    def __init__(self, options):
+        generator = CorpusGenerator(options.seed, options.tags)
+        self.seed = options.seed
+        self.choices = options.choices
+        self.actors = generator.actors(options.actors, options.tagsPerActor)
+        self.rules = [generator.rule(options.depth) for i in xrange(options.rules)]
+        self.facts = generator.facts(options.facts, options.depth, options.placeholders)
+        self.dir = tempfile.mkdtemp()
+        self.actorsDir = os.path.join(self.dir, "actors")
+        self.factsDir = os.path.join(self.dir, "facts")
+        os.mkdir(self.actorsDir)
+        os.mkdir(self.factsDir)
+        generator.write(self.actorsDir, self.factsDir, self.actors, self.facts)
+        self.store = ActorStore(self.actors)
+        self.index = FactIndex([JinjaFactTemplate(f) for f in self.facts], self.store)
+        self.parsed = [RuleParser(r).parse() for r in self.rules]
+        chooser = self.chooser()
+        self.bound = [f for f in [chooser.bind() for i in xrange(self.choices)] if f is not None]
+
+    def close(self):
+        shutil.rmtree(self.dir)
+
+    def chooser(self, actor = None):
+        """Return the chooser of facts about random actors, or about the actor, with seeded choices."""
+        if actor is None:
+            chooser = RandomFactChooser(self.index, self.store)
+        else:
+            chooser = ActorBasedRandomFactChooser(actor, self.index, self.store)
+        chooser.rng = random.Random(self.seed)
+        return chooser
+
+
+# Scenarios take the corpus and return the number of operations performed.
+
+def benchLoad(corpus):
+    """Read the actors and facts from the container files and index them."""
+    errors = []
+    store = ActorStore(readDir(corpus.actorsDir, ActorJsonFormatter(), errors))
+    index = FactIndex(readDir(corpus.factsDir, JinjaFactFormatter(), errors), store)
+    index.unsatisfiable()
+    if len(errors) > 0:
+        raise errors[0][1]
+    return len(store) + len(index)
+
+def benchParse(corpus):
+    """Parse the rules."""
+    for r in corpus.rules:
+        RuleParser(r).parse()
+    return len(corpus.rules)
+
+def benchEvaluate(corpus):
+    """Evaluate the parsed rules on every actor, one by one."""
+    for rule in corpus.parsed:
+        for actor in corpus.actors:
+            rule.evaluate(actor)
+    return len(corpus.parsed) * len(corpus.actors)
+
+def benchCompiled(corpus):
+    """Evaluate the compiled rules on every actor, one by one."""
+    compiler = RuleCompiler()
+    for rule in corpus.parsed:
+        predicate = compiler.compile(rule)
+        for actor in corpus.actors:
+            predicate(actor)
+    return len(corpus.parsed) * len(corpus.actors)
+
+def benchSelect(corpus):
+    """Select the actors satisfying the rules by the planner, bypassing the cache of the store."""
+    for rule in corpus.parsed:
+        corpus.store.planner.select(rule)
+    return len(corpus.parsed)
+
+def benchChoose(corpus):
+    """Choose the facts about random actors and bind the actors, without rendering."""
+    chooser = corpus.chooser()
+    for i in xrange(corpus.choices):
+        chooser.bind()
+    return corpus.choices
+
+def benchChooseFor(corpus):
+    """Choose the facts about the given actors and bind the actors, without rendering."""
+    rng = random.Random(corpus.seed)
+    for i in xrange(corpus.choices):
+        corpus.chooser(rng.choice(corpus.actors)).bind()
+    return corpus.choices
+
+def benchRender(corpus):
+    """Render the facts with bound actors."""
+    for f in corpus.bound:
+        f.render()
+    return len(corpus.bound)
+
+SCENARIOS = [
+    ("load", benchLoad),
+    ("parse", benchParse),
+    ("evaluate", benchEvaluate),
+    ("compiled", benchCompiled),
+    ("select", benchSelect),
+    ("choose", benchChoose),
+    ("choose-for", benchChooseFor),
+    ("render", benchRender),
+]
+
+def run(corpus, names, repeat):
+    """Return the dictionary {scenario: result} for the scenarios with specified names."""
+    results = {}
+    for name, scenario in SCENARIOS:
+        if name not in names:
+            continue
+        best = None
+        for i in xrange(repeat):
+            start = time.time()
+            ops = scenario(corpus)
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        results[name] = {"ops" : ops, "seconds" : best,
+                         "opsPerSecond" : ops / max(best, 1e-9)}
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Return the list of tuples (scenario, baseline ops per second, ops per
+    second, regressed) for the scenarios present in both results.
+    """
+    rows = []
+    for name, scenario in SCENARIOS:
+        if name in results and name in baseline:
+            before = baseline[name]["opsPerSecond"]
+            after = results[name]["opsPerSecond"]
+            rows.append((name, before, after, after < before * (1 - tolerance)))
+    return rows
+
+def parseOptions(args):
+    parser = optparse.OptionParser(usage = "%prog [options] [scenario ...]",
+                                   description = "Scenarios: " + ", ".join([n for n, s in SCENARIOS]))
+    parser.add_option("--actors", type = "int", default = 10000, help = "number of actors")
+    parser.add_option("--tags", type = "int", default = 20, help = "number of distinct tags")
+    parser.add_option("--tags-per-actor", dest = "tagsPerActor", type = "int", default = 3,
+                      help = "number of tags of every actor")
+    parser.add_option("--facts", type = "int", default = 200, help = "number of facts")
+    parser.add_option("--rules", type = "int", default = 100, help = "number of rules to parse and evaluate")
+    parser.add_option("--depth", type = "int", default = 2, help = "depth of rules")
+    parser.add_option("--placeholders", type = "int", default = 2, help = "number of actors per fact")
+    parser.add_option("--choices", type = "int", default = 1000,
+                      help = "number of facts to choose and render")
+    parser.add_option("--seed", type = "int", default = 0, help = "seed of the corpus")
+    parser.add_option("--repeat", type = "int", default = 3, help = "runs of every scenario")
+    parser.add_option("--output", help = "save the results as JSON into the file")
+    parser.add_option("--baseline", help = "compare the results with the JSON file")
+    parser.add_option("--tolerance", type = "float", default = 0.1,
+                      help = "allowed slowdown against the baseline, 0.1 by default")
+    options, names = parser.parse_args(args)
+    unknown = set(names) - set([n for n, s in SCENARIOS])
+    if len(unknown) > 0:
+        parser.error("unknown scenarios: %s" % ", ".join(sorted(unknown)))
+    return options, names or [n for n, s in SCENARIOS]
+
+def parametersOf(options):
+    """Return the options that define the corpus, which the results depend on."""
+    return dict([(k, v) for k, v in vars(options).iteritems()
+                 if k not in ("repeat", "output", "baseline", "tolerance")])
+
+def main(args):
+    options, names = parseOptions(args)
+    corpus = Corpus(options)
+    try:
+        results = run(corpus, names, options.repeat)
+    finally:
+        corpus.close()
+    for name, scenario in SCENARIOS:
+        if name in results:
+            r = results[name]
+            print "%-12s %12.1f ops/s %10.4f s" % (name, r["opsPerSecond"], r["seconds"])
+    if options.output:
+        f = open(options.output, "w")
+        try:
+            json.dump({"python" : platform.python_version(), "parameters" : parametersOf(options),
+                       "results" : results}, f, indent = 2, sort_keys = True)
+        finally:
+            f.close()
+    if options.baseline:
+        f = open(options.baseline)
+        try:
+            baseline = json.load(f)
+        finally:
+            f.close()
+        if baseline.get("parameters") != parametersOf(options):
+            print "Warning: the baseline was measured with other parameters."
+        regressed = False
+        print
+        print "%-12s %12s %12s %8s" % ("scenario", "baseline", "current", "change")
+        for name, before, after, slower in compare(results, baseline["results"], options.tolerance):
+            print "%-12s %12.1f %12.1f %+7.1f%%%s" % (name, before, after,
+                                                      (after / before - 1) * 100,
+                                                      slower and "  SLOWER" or "")
+            regressed = regressed or slower
+        return regressed and 1 or 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
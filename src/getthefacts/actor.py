@@ -1,7 +1,15 @@
 # coding=UTF-8
 
 import json
+import heapq
+import bisect
 from taggable import Taggable
+from bitsets import maskOf, idsOf
+from cache import LruCache
+from rules import RuleCompiler, RuleParser, attributeKey
+from planner import RulePlanner
+from sampling import AliasTable, weightOf
+from columns import ActorTable, ActorView
 
 class Actor(Taggable):
 
@@ -12,7 +20,480 @@ class Actor(Taggable):
         Taggable.__init__(self, tags)
         self.name = name
 
+
+class AttributeIndex:
+
+    """
+    Ids of actors sorted by the value of an attribute (see attributeKey), so
+    the comparison of the attribute with a value is resolved by binary
+    search. The index is built at once and is not updated: the store builds
+    a new one after the actors change.
+    """
+
+    def __init__(self, actors, attribute):
+        """Initialize new instance of AttributeIndex for the actors in the list."""
+        pairs = []
+        for actorId, actor in enumerate(actors):
+            if actor is None:
+                continue
+            value = getattr(actor, attribute, None)
+            if value is not None:
+                pairs.append((attributeKey(value), actorId))
+        pairs.sort()
+        self.keys = [key for key, actorId in pairs]
+        self.ids = [actorId for key, actorId in pairs]
+
+    def select(self, operator, key):
+        """Return the bitset of actors whose value compares with the key by the operator."""
+        start, end = self.range(operator, key)
+        return maskOf(self.ids[start:end])
+
+    def count(self, operator, key):
+        """Return the number of actors whose value compares with the key by the operator."""
+        start, end = self.range(operator, key)
+        return end - start
+
+    def range(self, operator, key):
+        """Return the bounds of the slice of 'ids' of actors that satisfy the comparison."""
+        start = bisect.bisect_left(self.keys, (key[0],))
+        end = bisect.bisect_left(self.keys, (key[0] + 1,))
+        if operator == "=":
+            start = bisect.bisect_left(self.keys, key, start, end)
+            end = bisect.bisect_right(self.keys, key, start, end)
+        elif operator == "<":
+            end = bisect.bisect_left(self.keys, key, start, end)
+        elif operator == "<=":
+            end = bisect.bisect_right(self.keys, key, start, end)
+        elif operator == ">":
+            start = bisect.bisect_right(self.keys, key, start, end)
+        elif operator == ">=":
+            start = bisect.bisect_left(self.keys, key, start, end)
+        return (start, end)
+
+
+class ActorRegistry:
+
+    """
+    Index of actor ids by name.
+
+    Besides the exact names, the registry keeps the aliases of actors (the
+    optional 'aliases' attribute, e.g. from JSON), and the lower-case forms
+    of names and aliases if 'caseFold' is set. An actor is resolved by its
+    exact name first, then by alias, then by the case-folded key.
+
+    Several actors may share a name; the one added first wins, as it did
+    with the linear search. Such names are reported by duplicates().
+
+    To keep the registry small for large populations, a key of a single
+    actor maps to its id rather than to a list, and the case-folded index
+    is only built on the first lookup that needs it.
+    """
+
+    def __init__(self, caseFold = True):
+        """Initialize new empty instance of ActorRegistry."""
+        self.caseFold = caseFold
+        self.names = {}
+        self.aliases = {}
+        self.folded = None
+
+    def actorAdded(self, actorId, actor):
+        """Add specified actor to the indexes."""
+        self.__put(self.names, actor.name, actorId)
+        for alias in self.__aliasesOf(actor):
+            self.__put(self.aliases, alias, actorId)
+        if self.folded is not None:
+            for key in self.__foldedKeysOf(actor):
+                self.__put(self.folded, key, actorId)
+
+    def actorRemoved(self, actorId, actor):
+        """Remove specified actor from the indexes."""
+        self.__discard(self.names, actor.name, actorId)
+        for alias in self.__aliasesOf(actor):
+            self.__discard(self.aliases, alias, actorId)
+        if self.folded is not None:
+            for key in self.__foldedKeysOf(actor):
+                self.__discard(self.folded, key, actorId)
+
+    def named(self, name):
+        """Return the list of ids of actors with exactly specified name."""
+        return self.__ids(self.names.get(name))
+
+    def idOf(self, name):
+        """Return the id of the actor with exactly specified name, or None."""
+        return self.__first(self.names.get(name))
+
+    def resolve(self, name):
+        """Return the id of the actor known by specified name or alias, or None."""
+        actorId = self.__first(self.names.get(name))
+        if actorId is None:
+            actorId = self.__first(self.aliases.get(name))
+        if actorId is None and self.caseFold and name is not None:
+            if self.folded is None:
+                self.__buildFolded()
+            actorId = self.__first(self.folded.get(name.lower()))
+        return actorId
+
+    def duplicates(self):
+        """Return the sorted list of names and aliases shared by several actors."""
+        return sorted([key for index in (self.names, self.aliases)
+                       for key, ids in index.iteritems() if isinstance(ids, list)])
+
+    def __buildFolded(self):
+        self.folded = {}
+        for index in (self.names, self.aliases):
+            for key, ids in index.iteritems():
+                if key is not None:
+                    for actorId in self.__ids(ids):
+                        self.__put(self.folded, key.lower(), actorId)
+
+    def __ids(self, value):
+        if value is None:
+            return []
+        if isinstance(value, list):
+            return value
+        return [value]
+
+    def __first(self, value):
+        if isinstance(value, list):
+            return value[0]
+        return value
+
+    def __put(self, index, key, actorId):
+        ids = index.get(key)
+        if ids is None:
+            index[key] = actorId
+        elif not isinstance(ids, list):
+            if ids != actorId:
+                index[key] = sorted([ids, actorId])
+        elif actorId not in ids:
+            ids.append(actorId)
+            ids.sort()
+
+    def __aliasesOf(self, actor):
+        aliases = getattr(actor, "aliases", None) or []
+        if isinstance(aliases, basestring):
+            return [aliases]
+        return aliases
+
+    def __foldedKeysOf(self, actor):
+        keys = set([alias.lower() for alias in self.__aliasesOf(actor)])
+        if actor.name is not None:
+            keys.add(actor.name.lower())
+        return keys
+
+    def __discard(self, index, key, actorId):
+        ids = index.get(key)
+        if ids == actorId:
+            del index[key]
+        elif isinstance(ids, list) and actorId in ids:
+            ids.remove(actorId)
+            if len(ids) == 1:
+                index[key] = ids[0]
+
+
+class ActorStore:
+
+    """
+    Indexed collection of actors.
+
+    Every actor added to the store receives an integer id, and every tag is
+    interned to an integer id as well. For each tag the store keeps a bitset
+    (a long where bit N is set if actor N has the tag), so the rules can be
+    evaluated over the whole population at once with bitwise operations, see
+    RuleBase.select().
+
+    Bitsets are built lazily: actors added since the last query are collected
+    per tag and merged into the bitsets in one pass on the next query.
+
+    The store keeps the number of actors per tag, that RulePlanner uses to
+    estimate the selectivity of rules; select() executes the plan chosen
+    by the planner for the canonical form of the rule.
+
+    Results of select() are kept in the LRU cache keyed by the canonical form
+    of the rule, so a rule shared by many facts is evaluated once until the
+    actors change. The same holds for the alias tables returned by sampler(),
+    that draw the actors satisfying a rule according to their weights.
+
+    Actors are indexed by name in the ActorRegistry kept in 'registry', so
+    NameRule and the lookup of actors by name do not scan the store. For
+    AttributeRule an AttributeIndex is built per attribute on first use.
+
+    For very large populations the store can be 'columnar': the actors are
+    then copied into an ActorTable, and the store returns ActorView objects
+    instead of the actors that were added.
+
+    Objects that keep data derived from the actors (e.g. FactIndex) can be
+    added to the 'listeners' list. They are notified by actorAdded(id, actor)
+    and actorRemoved(id, actor) calls.
+    """
+
+    # Maximum number of rule results kept in the cache.
+    CACHE_SIZE = 1024
+
+    # Maximum number of alias tables kept in the cache.
+    SAMPLERS_CACHE_SIZE = 256
+
+    def __init__(self, actors = [], columnar = False):
+        """Initialize new instance of ActorStore with specified actors."""
+        self.cache = LruCache(self.CACHE_SIZE)
+        self.samplers = LruCache(self.SAMPLERS_CACHE_SIZE)
+        self.columnar = columnar
+        self.actors = ActorTable() if columnar else []
+        self.tagIds = {}
+        self.tagBits = []
+        self.tagCounts = []
+        self.registry = ActorRegistry()
+        self.planner = RulePlanner(self)
+        self.attributes = {}
+        self.listeners = []
+        self.__ids = {}
+        self.__free = []
+        self.__recorded = []
+        self.__count = 0
+        self.__all = 0
+        self.__pending = {}
+        self.__pendingAll = []
+        for actor in actors:
+            self.add(actor)
+
+    def __len__(self):
+        return self.__count
+
+    def __iter__(self):
+        return (a for a in self.actors if a is not None)
+
+    def __getitem__(self, actorId):
+        return self.actors[actorId]
+
+    def __contains__(self, actor):
+        return self.idOf(actor) is not None
+
+    def internTag(self, tag):
+        """Return the integer id of specified tag, allocating it if needed."""
+        tagId = self.tagIds.get(tag)
+        if tagId is None:
+            tagId = len(self.tagBits)
+            self.tagIds[tag] = tagId
+            self.tagBits.append(0)
+            self.tagCounts.append(0)
+        return tagId
+
+    def add(self, actor):
+        """Add actor to the store and return its id; the lowest id of removed actors is reused."""
+        if len(self.__free) > 0:
+            actorId = heapq.heappop(self.__free)
+            self.actors[actorId] = actor
+        else:
+            actorId = len(self.actors)
+            self.actors.append(actor)
+            if not self.columnar:
+                self.__recorded.append(())
+        if self.columnar:
+            actor = self.actors[actorId]
+        else:
+            self.__ids[id(actor)] = actorId
+        self.__count += 1
+        self.__pendingAll.append(actorId)
+        self.__changed()
+        self.__addTags(actorId, actor.tags)
+        self.registry.actorAdded(actorId, actor)
+        for listener in self.listeners:
+            listener.actorAdded(actorId, actor)
+        return actorId
+
+    def remove(self, actor):
+        """
+        Remove actor from the store. Ids of other actors are not changed; the
+        id of the removed actor is given to the next added one.
+        """
+        actorId = self.idOf(actor)
+        if actorId is None:
+            raise KeyError, actor
+        self.__ids.pop(id(actor), None)
+        self.__count -= 1
+        self.__flush()
+        self.__all &= ~(1 << actorId)
+        self.__removeTags(actorId)
+        self.registry.actorRemoved(actorId, actor)
+        self.actors[actorId] = None
+        heapq.heappush(self.__free, actorId)
+        self.__changed()
+        for listener in self.listeners:
+            listener.actorRemoved(actorId, actor)
+
+    def retag(self, actor, tags):
+        """
+        Replace the tags of specified actor. The tags of actors in the store
+        must be changed by this method: the bitsets, the counts of actors per
+        tag and the cached results are updated, and the listeners are told
+        the actor was removed and added again.
+        """
+        actorId = self.idOf(actor)
+        if actorId is None:
+            raise KeyError, actor
+        self.__flush()
+        self.__removeTags(actorId)
+        if self.columnar:
+            self.actors.retag(actorId, tags)
+        else:
+            actor.tags = list(tags)
+        self.__addTags(actorId, tags)
+        self.__changed()
+        for listener in self.listeners:
+            listener.actorRemoved(actorId, actor)
+            listener.actorAdded(actorId, actor)
+
+    def idOf(self, actor):
+        """Return the id of specified actor, or None if it is not in the store."""
+        if isinstance(actor, ActorView):
+            return self.actors.idOf(actor) if self.columnar else None
+        return self.__ids.get(id(actor))
+
+    def everyone(self):
+        """Return the bitset of all actors in the store."""
+        self.__flush()
+        return self.__all
+
+    def tagged(self, tag):
+        """Return the bitset of actors tagged with specified tag."""
+        tagId = self.tagIds.get(tag)
+        if tagId is None:
+            return 0
+        self.__flush()
+        return self.tagBits[tagId]
+
+    def named(self, name):
+        """Return the bitset of actors with specified name."""
+        return maskOf(self.registry.named(name))
+
+    def byName(self, name):
+        """Return the actor known by specified name or alias, or None."""
+        actorId = self.registry.resolve(name)
+        return self.actors[actorId] if actorId is not None else None
+
+    def compared(self, attribute, operator, key):
+        """Return the bitset of actors whose attribute compares with the key, see AttributeRule."""
+        return self.__attributeIndex(attribute).select(operator, key)
+
+    def tagCount(self, tag):
+        """Return the number of actors tagged with specified tag."""
+        tagId = self.tagIds.get(tag)
+        if tagId is None:
+            return 0
+        return self.tagCounts[tagId]
+
+    def nameCount(self, name):
+        """Return the number of actors with specified name."""
+        return len(self.registry.named(name))
+
+    def comparedCount(self, attribute, operator, key):
+        """Return the number of actors whose attribute compares with the key."""
+        return self.__attributeIndex(attribute).count(operator, key)
+
+    def scan(self, rule):
+        """Return the bitset of actors satisfying the rule, evaluating it on each actor."""
+        return maskOf([i for i, a in enumerate(self.actors)
+                       if a is not None and rule.evaluate(a)])
+
+    def select(self, rule):
+        """Return the bitset of actors satisfying the rule, using the cache."""
+        mask = self.cache.get(rule)
+        if mask is None:
+            canonical = RuleCompiler().simplify(rule)
+            mask = self.cache.get(canonical)
+            if mask is None:
+                mask = self.planner.select(canonical)
+                self.cache.put(canonical, mask)
+            self.cache.put(rule, mask)
+        return mask
+
+    def sampler(self, rule):
+        """
+        Return the pair (ids, table) for the actors satisfying the rule, where
+        'ids' is the list of their ids and 'table' is the AliasTable that
+        draws positions in that list according to the weights of actors.
+        """
+        result = self.samplers.get(rule)
+        if result is None:
+            ids = idsOf(self.select(rule))
+            result = (ids, AliasTable([weightOf(self.actors[i]) for i in ids]))
+            self.samplers.put(rule, result)
+        return result
+
+    def setWeight(self, actor, weight):
+        """Set the sampling weight of specified actor."""
+        actor.weight = weight
+        self.__changed()
+
+    def ids(self, mask):
+        """Return the list of actor ids in specified bitset."""
+        return idsOf(mask)
+
+    def find(self, rule):
+        """Return the list of actors satisfying the rule."""
+        return [self.actors[i] for i in idsOf(self.select(rule))]
+
+    def __attributeIndex(self, attribute):
+        index = self.attributes.get(attribute)
+        if index is None:
+            index = AttributeIndex(self.actors, attribute)
+            self.attributes[attribute] = index
+        return index
+
+    def __changed(self):
+        """Forget the cached rule results after the actors have changed."""
+        if len(self.cache) > 0:
+            self.cache.clear()
+        if len(self.samplers) > 0:
+            self.samplers.clear()
+        if len(self.attributes) > 0:
+            self.attributes = {}
+
+    def __addTags(self, actorId, tags):
+        """Count the actor for its tags, and record its tag ids; the bits are set by __flush()."""
+        tagIds = []
+        for tag in tags:
+            tagId = self.internTag(tag)
+            if tagId in tagIds:
+                continue
+            tagIds.append(tagId)
+            self.__pending.setdefault(tagId, []).append(actorId)
+            self.tagCounts[tagId] += 1
+        if not self.columnar:
+            self.__recorded[actorId] = tuple(tagIds)
+
+    def __removeTags(self, actorId):
+        """Clear the bits and counts of the tags the actor was added with."""
+        if self.columnar:
+            tagIds = set([self.tagIds[t] for t in self.actors.tagsOf(actorId)])
+        else:
+            tagIds = self.__recorded[actorId]
+            self.__recorded[actorId] = ()
+        bit = 1 << actorId
+        for tagId in tagIds:
+            self.tagBits[tagId] &= ~bit
+            self.tagCounts[tagId] -= 1
+
+    def __flush(self):
+        """Merge the actors added or retagged since the last query into the bitsets."""
+        if len(self.__pendingAll) == 0 and len(self.__pending) == 0:
+            return
+        self.__all |= maskOf(self.__pendingAll)
+        for tagId, ids in self.__pending.iteritems():
+            self.tagBits[tagId] |= maskOf(ids)
+        self.__pending = {}
+        self.__pendingAll = []
+
         
+def checkTags(tags):
+    """
+    Raise ValueError if any of the tags contains a comparison operator: rules
+    would read such tag as a comparison of attribute, and never match it.
+    """
+    for tag in tags:
+        if RuleParser.OPERATOR_CHARS.search(tag) is not None:
+            raise ValueError, "Tag %r contains a comparison operator (<, > or =)." % tag
+
 class ActorFormatter:
 
     "Read or write Actor to string"
@@ -23,6 +504,7 @@ class ActorFormatter:
             return Actor(actorString.strip())
         [actorName, tagList] = actorString.split("|", 1)
         tags = [tag.strip() for tag in tagList.split(",")]
+        checkTags(tags)
         return Actor(actorName.strip(), tags)
     
     def write(self, actor):
@@ -39,6 +521,7 @@ class ActorJsonFormatter:
         a = Actor(None)
         for k,v in d.iteritems():
             setattr(a, k, v)
+        checkTags(a.tags)
         return a
 
     def write(self, actor):
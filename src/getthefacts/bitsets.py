@@ -0,0 +1,31 @@
+# coding=UTF-8
+"""
+Sets of actor ids represented as bitsets: a long where bit N is set if the
+actor with id N is in the set.
+"""
+
+import binascii
+
+def maskOf(ids):
+    """Return the bitset (a long) that has the bits with specified ids set."""
+    if len(ids) == 0:
+        return 0
+    bits = bytearray((max(ids) >> 3) + 1)
+    for i in ids:
+        bits[i >> 3] |= 1 << (i & 7)
+    bits.reverse()
+    return int(binascii.hexlify(str(bits)), 16)
+
+def idsOf(mask):
+    """Return the list of ids of bits that are set in specified bitset."""
+    s = bin(mask)[:1:-1]
+    ids = []
+    i = s.find("1")
+    while i != -1:
+        ids.append(i)
+        i = s.find("1", i + 1)
+    return ids
+
+def countOf(mask):
+    """Return the number of bits that are set in specified bitset."""
+    return bin(mask).count("1")
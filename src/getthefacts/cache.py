@@ -0,0 +1,45 @@
+# coding=UTF-8
+import threading
+from collections import OrderedDict
+
+class LruCache:
+
+    """
+    Dictionary of bounded size that forgets the least recently used items.
+    It is safe to use from several threads.
+    """
+
+    def __init__(self, capacity):
+        """Initialize new instance of LruCache that keeps up to 'capacity' items."""
+        self.capacity = capacity
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key, default = None):
+        """Return the value for key and mark it as recently used."""
+        with self.lock:
+            try:
+                value = self.items.pop(key)
+            except KeyError:
+                return default
+            self.items[key] = value
+            return value
+
+    def put(self, key, value):
+        """Store the value for key, forgetting the least recently used item if needed."""
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            if len(self.items) > self.capacity:
+                self.items.popitem(last = False)
+
+    def clear(self):
+        """Forget all items."""
+        with self.lock:
+            self.items.clear()
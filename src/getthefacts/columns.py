@@ -0,0 +1,236 @@
+# coding=UTF-8
+
+from array import array
+
+# Marks the names of removed actors.
+_REMOVED = object()
+
+class ActorTable:
+
+    """
+    Columnar storage of actors for very large populations.
+
+    Instead of an object with its own dictionary per actor, the table keeps
+    one column per attribute:
+        *   names, as a list of strings;
+        *   tags, as a single array of tag ids, with the offset and the
+            number of each actor's tags kept in two other arrays;
+        *   every other attribute (e.g. 'age') in a list that is only as long
+            as the last actor having the attribute. Equal values are interned,
+            so the column holds references to shared objects; lists are
+            stored as tuples.
+
+    ASCII-only text is stored as str, which is equal to the same unicode
+    string but takes less memory. Names are unique, so they are not interned.
+
+    The table behaves as the list of actors used by ActorStore: indexing it
+    returns a lightweight ActorView, or None for the removed actors. A new
+    actor can be put in the row of a removed one; the tags of removed actors
+    are dropped from the tag array once they take half of it.
+    """
+
+    def __init__(self):
+        """Initialize new empty instance of ActorTable."""
+        self.names = []
+        self.tags = []
+        self.tagIds = {}
+        self.tagOffsets = array("l")
+        self.tagLengths = array("H")
+        self.tagData = array("i")
+        self.unusedTags = 0
+        self.columns = {}
+        self.values = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, actorId):
+        if self.names[actorId] is _REMOVED:
+            return None
+        return ActorView(self, actorId)
+
+    def __setitem__(self, actorId, actor):
+        if actor is None:
+            self.names[actorId] = _REMOVED
+            self.unusedTags += self.tagLengths[actorId]
+            self.tagLengths[actorId] = 0
+            for column in self.columns.itervalues():
+                if actorId < len(column):
+                    column[actorId] = None
+            return
+        if self.names[actorId] is not _REMOVED:
+            raise TypeError, "Actors in ActorTable can only be put in place of removed ones"
+        self.names[actorId] = self.compact(actor.name)
+        self.tagOffsets[actorId] = len(self.tagData)
+        self.tagLengths[actorId] = len(actor.tags)
+        self.__copy(actorId, actor)
+        if self.unusedTags * 2 > len(self.tagData):
+            self.__packTags()
+
+    def __iter__(self):
+        return (self[i] for i in xrange(len(self.names)))
+
+    def append(self, actor):
+        """Copy the name, tags and attributes of specified actor to the table."""
+        actorId = len(self.names)
+        self.names.append(self.compact(actor.name))
+        self.tagOffsets.append(len(self.tagData))
+        self.tagLengths.append(len(actor.tags))
+        self.__copy(actorId, actor)
+
+    def retag(self, actorId, tags):
+        """Replace the tags of the actor with specified id."""
+        self.unusedTags += self.tagLengths[actorId]
+        self.tagOffsets[actorId] = len(self.tagData)
+        self.tagLengths[actorId] = len(tags)
+        for tag in tags:
+            self.tagData.append(self.internTag(tag))
+        if self.unusedTags * 2 > len(self.tagData):
+            self.__packTags()
+
+    def __copy(self, actorId, actor):
+        """Append the tags of the actor to the tag array, and set its attributes."""
+        for tag in actor.tags:
+            self.tagData.append(self.internTag(tag))
+        for key, value in vars(actor).iteritems():
+            if key not in ("name", "tags"):
+                self.setAttribute(actorId, key, value)
+
+    def __packTags(self):
+        """Rebuild the tag array without the tags of removed actors."""
+        data = array("i")
+        for actorId, start in enumerate(self.tagOffsets):
+            self.tagOffsets[actorId] = len(data)
+            data.extend(self.tagData[start:start + self.tagLengths[actorId]])
+        self.tagData = data
+        self.unusedTags = 0
+
+    def idOf(self, view):
+        """Return the id of the actor of specified ActorView if it is live in this table, or None."""
+        if view._table is self and self.isLive(view._id):
+            return view._id
+        return None
+
+    def isLive(self, actorId):
+        """Return True if the actor with specified id is in the table and is not removed."""
+        return 0 <= actorId < len(self.names) and self.names[actorId] is not _REMOVED
+
+    def compact(self, value):
+        """Return ASCII-only unicode string as str, that takes 4 times less memory."""
+        if isinstance(value, unicode):
+            try:
+                return str(value)
+            except UnicodeEncodeError:
+                pass
+        return value
+
+    def intern(self, value):
+        """Return the shared copy of specified value."""
+        if isinstance(value, list):
+            value = tuple(value)
+        value = self.compact(value)
+        try:
+            return self.values.setdefault((type(value), value), value)
+        except TypeError:
+            return value
+
+    def internTag(self, tag):
+        """Return the integer id of specified tag, allocating it if needed."""
+        tagId = self.tagIds.get(tag)
+        if tagId is None:
+            tagId = len(self.tags)
+            self.tagIds[tag] = tagId
+            self.tags.append(tag)
+        return tagId
+
+    def nameOf(self, actorId):
+        return self.names[actorId]
+
+    def tagsOf(self, actorId):
+        """Return the list of tags of the actor with specified id."""
+        start = self.tagOffsets[actorId]
+        return [self.tags[t] for t in self.tagData[start:start + self.tagLengths[actorId]]]
+
+    def hasTag(self, actorId, tag):
+        """Return True if the actor with specified id is tagged with specified tag."""
+        tagId = self.tagIds.get(tag)
+        if tagId is None:
+            return False
+        start = self.tagOffsets[actorId]
+        for i in xrange(start, start + self.tagLengths[actorId]):
+            if self.tagData[i] == tagId:
+                return True
+        return False
+
+    def getAttribute(self, actorId, key):
+        """Return the value of attribute of the actor, or raise AttributeError."""
+        column = self.columns.get(key)
+        if column is None or actorId >= len(column) or column[actorId] is None:
+            raise AttributeError, key
+        return column[actorId]
+
+    def setAttribute(self, actorId, key, value):
+        """Set the value of attribute of the actor, growing the column if needed."""
+        column = self.columns.setdefault(key, [])
+        if actorId >= len(column):
+            column.extend([None] * (actorId + 1 - len(column)))
+        column[actorId] = self.intern(value)
+
+
+class ActorView(object):
+
+    """
+    Actor stored in ActorTable. Views are created on access and hold only
+    the table and the id, so they are cheap; two views of the same actor are
+    equal. Other attributes than name and tags are looked up in the columns,
+    so the slots have names that can not clash with the attributes of actors.
+    """
+
+    __slots__ = ("_table", "_id")
+
+    def __init__(self, table, actorId):
+        object.__setattr__(self, "_table", table)
+        object.__setattr__(self, "_id", actorId)
+
+    @property
+    def name(self):
+        return self._table.nameOf(self._id)
+
+    @property
+    def tags(self):
+        return self._table.tagsOf(self._id)
+
+    def hasTags(self):
+        """Return True if any tags are assigned to this actor."""
+        return self._table.tagLengths[self._id] > 0
+
+    def isTaggedWith(self, tag):
+        """Return True if this actor is tagged with specified tag."""
+        return self._table.hasTag(self._id, tag)
+
+    def isTaggedWithAny(self, tags):
+        """Return True if this actor is tagged with any of specified tags."""
+        for tag in tags:
+            if self.isTaggedWith(tag): return True
+        return False
+
+    def __getattr__(self, key):
+        return self._table.getAttribute(self._id, key)
+
+    def __setattr__(self, key, value):
+        if key in ("name", "tags") or key in ActorView.__slots__:
+            raise AttributeError, "%s of ActorView can not be changed" % key
+        self._table.setAttribute(self._id, key, value)
+
+    def __eq__(self, other):
+        return (other.__class__ is ActorView) and \
+               (self._table is other._table) and (self._id == other._id)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self._id)
+
+    def __repr__(self):
+        return "<ActorView %d: %r>" % (self._id, self.name)
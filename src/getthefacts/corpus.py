@@ -0,0 +1,87 @@
+# coding=UTF-8
+"""
+    Module: corpus.
+
+    Description:
+
+    This module generates synthetic actors and Jinja facts of configurable
+    size for the benchmarks. The corpus depends only on the seed, so the
+    same parameters always produce the same actors, rules and facts.
+"""
+import os
+import json
+import random
+from actor import Actor
+from loaders import CONTAINER_EXTENSION
+
+# Separates the records in the container files written by CorpusGenerator.
+SEPARATOR = "-----"
+
+class CorpusGenerator:
+
+    """
+    CorpusGenerator generates the actors with tags from the pool of 'tags'
+    tags and a numeric 'age' attribute, and the facts whose placeholders
+    have rules of specified depth, built from those tags and attribute.
+    """
+
+    def __init__(self, seed = 0, tags = 20):
+        """Initialize new instance of CorpusGenerator."""
+        self.rng = random.Random(seed)
+        self.tags = ["tag%d" % i for i in xrange(tags)]
+
+    def actors(self, n, tagsPerActor = 3):
+        """Return the list of n actors, each tagged with 'tagsPerActor' distinct tags."""
+        actors = []
+        for i in xrange(n):
+            actor = Actor(u"Actor %d" % i, self.rng.sample(self.tags, tagsPerActor))
+            actor.age = self.rng.randint(1, 100)
+            actors.append(actor)
+        return actors
+
+    def rule(self, depth):
+        """
+        Return the string of a random rule: a tag, its negation or a comparison
+        of age for depth 0, or And/Or rule of 2-3 rules of smaller depth.
+        """
+        if depth <= 0:
+            kind = self.rng.random()
+            if kind < 0.7:
+                return self.rng.choice(self.tags)
+            if kind < 0.85:
+                return "!" + self.rng.choice(self.tags)
+            return "age%s%d" % (self.rng.choice(["<", ">="]), self.rng.randint(10, 90))
+        children = [self.rule(depth - 1) for i in xrange(self.rng.randint(2, 3))]
+        braces = self.rng.choice(["()", "[]"])
+        return braces[0] + ", ".join(children) + braces[1]
+
+    def fact(self, depth, placeholders):
+        """Return the source of Jinja fact with specified number of placeholders."""
+        lines = []
+        names = []
+        for i in xrange(placeholders):
+            name = "a%d" % (i + 1)
+            names.append(name)
+            lines.append("{%% actor '%s', '%s' %%}" % (name, self.rule(depth)))
+        words = ["{{ %s.name }}" % name for name in names]
+        lines.append("%s met {{ %s.age }} times{%% if %s.age > 50 %%}, long ago{%% endif %%}." %
+                     (" and ".join(words), names[0], names[0]))
+        return "\n".join(lines)
+
+    def facts(self, m, depth = 1, placeholders = 1):
+        """Return the list of sources of m Jinja facts."""
+        return [self.fact(depth, placeholders) for i in xrange(m)]
+
+    def write(self, actorsDir, factsDir, actors, facts):
+        """Write the actors as JSON records and the facts into a container file in each directory."""
+        records = [json.dumps(vars(a)) for a in actors]
+        self.__writeContainer(os.path.join(actorsDir, "actors" + CONTAINER_EXTENSION), records)
+        self.__writeContainer(os.path.join(factsDir, "facts" + CONTAINER_EXTENSION), facts)
+
+    def __writeContainer(self, fileName, records):
+        f = open(fileName, "w")
+        try:
+            f.write(("\n%s\n" % SEPARATOR).join(records))
+            f.write("\n")
+        finally:
+            f.close()
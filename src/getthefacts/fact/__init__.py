@@ -1,25 +1,42 @@
 # coding=UTF-8
+import threading
 from .. import rules
 
 class FactFormatError(Exception): pass
 
-class ActorPlaceholder():
+class ActorPlaceholder(object):
+    """
+    Definition of an actor in a fact template: the index the actor is
+    rendered by, and the rule the actor must satisfy.
+
+    Placeholders are shared by all facts built from the same template, and
+    must not be changed after creation. The actors chosen for a concrete
+    fact are kept by the Fact itself.
+    """
+
+    __slots__ = ("index", "rule", "_predicate")
+
     def __init__(self, index, rule):
         self.index = index
         self.rule = rule
-        self.actor = None
-
-    def set_actor(self, actor):
-        self.actor = actor
+        self._predicate = None
 
-    def has_actor(self):
-        return self.actor is not None
+    @property
+    def predicate(self):
+        """The rule compiled by RuleCompiler; it is compiled on first use."""
+        if self._predicate is None:
+            self._predicate = rules.RuleCompiler().compile(self.rule)
+        return self._predicate
 
 class FactTemplate():
     """
     The abstract class that defines basic functionality of fact template.
     Fact template defines the format of fact pattern and how actor placeholders are specified
     """
+
+    # Templates are parsed on first use, possibly from several threads.
+    parseLock = threading.Lock()
+
     def __init__(self):
         self.__parsed__ = False
 
@@ -27,17 +44,27 @@ class FactTemplate():
         """Parses the underlying template and returns a list of ActorPlaceholders defined in the template."""
         pass
 
+    def getActorPlaceholders(self):
+        """Returns the tuple of ActorPlaceholders defined in the template, parsing it if needed."""
+        if not self.__parsed__:
+            with FactTemplate.parseLock:
+                if not self.__parsed__:
+                    self.__actorPlaceholders__ = tuple(self.__parse__())
+                    self.__parsed__ = True
+        return self.__actorPlaceholders__
+
     def buildup(self):
         """Returns an instance of Fact built from the template."""
-        if not self.__parsed__:
-            self.__actorPlaceholders__ = self.__parse__()
-        return Fact(self, self.__actorPlaceholders__[:])
+        return Fact(self, self.getActorPlaceholders())
 
     def render(self, ctx):
-        """Renders the underlying template using the provided dictionary {index:actor} filled from ActorPlaceholders"""
+        """
+        Renders the underlying template using the provided dictionary {index:actor} filled from ActorPlaceholders.
+        All kinds of templates are rendered with the same context.
+        """
         pass
 
-class Fact:
+class Fact(object):
 
     """
     Defines the fact 'pattern' that can be applied to an actor.
@@ -62,22 +89,38 @@ class Fact:
             or bird, and are not big.
     """
 
+
+    __slots__ = ("template", "actorPlaceholders", "actors")
+
     def __init__(self, template, actorPlaceholders):
         self.template = template
         self.actorPlaceholders = actorPlaceholders
+        self.actors = [None] * len(actorPlaceholders)
+
+    def bind(self, i, actor):
+        """Choose the actor for the placeholder with specified position."""
+        self.actors[i] = actor
+
+    def isBound(self, i):
+        """Return True if the actor is chosen for the placeholder with specified position."""
+        return self.actors[i] is not None
 
     def ready(self):
-        return len(self.actorPlaceholders) == 0 or all([a.has_actor() for a in self.actorPlaceholders])
+        return None not in self.actors
 
     def isApplicableTo(self, actor):
         """Return True if fact's rule evaluates to True on specifies actor."""
-        return any([a.rule.evaluate(actor) for a in self.actorPlaceholders])
+        return any([a.predicate(actor) for a in self.actorPlaceholders])
 
     def getFactAbout(self, actor):
         """Create concrete fact from fact pattern and specified actor."""
-        self.actorPlaceholders[0].set_actor(actor)
-        return self.render()
+        actors = self.actors[:]
+        actors[0] = actor
+        return self.__render(actors)
 
     def render(self):
-        ctx = dict([(a.index, a.actor) for a in self.actorPlaceholders])
+        return self.__render(self.actors)
+
+    def __render(self, actors):
+        ctx = dict(zip([a.index for a in self.actorPlaceholders], actors))
         return self.template.render(ctx)
\ No newline at end of file
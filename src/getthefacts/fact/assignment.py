@@ -0,0 +1,145 @@
+# coding=UTF-8
+import random
+from . import *
+from ..sampling import AliasTable, weightOf
+
+class ActorAssigner:
+    """
+    Assigns distinct actors to the placeholders of a fact.
+
+    Placeholders are filled from the most selective one (with the fewest
+    candidate actors) to the least selective one. Every actor is drawn among
+    the candidates that leave the remaining placeholders satisfiable, so an
+    assignment never fails half-way: if the fact can be satisfied at all,
+    assign() succeeds.
+
+    The remaining placeholders are satisfiable if they can be matched with
+    distinct actors. A placeholder with at least as many free candidates as
+    there are placeholders left can always be matched last, so the matching
+    is only searched among placeholders with fewer candidates than that.
+    """
+
+    def __init__(self, actors):
+        """Initialize new instance of ActorAssigner with an ActorStore."""
+        self.actors = actors
+
+    def isSatisfiable(self, template, actor = None):
+        """
+        Return True if distinct actors can be assigned to all placeholders of
+        the template; if 'actor' is specified, it must be one of them.
+        """
+        placeholders = template.getActorPlaceholders()
+        if actor is None:
+            return self.__isFeasible(self.__candidates(placeholders), set())
+        return self.__positionFor(placeholders, actor) is not None
+
+    def assign(self, fact, used, rng = random):
+        """
+        Assign actors to the free placeholders of the fact, never assigning
+        the actors with ids from the 'used' set. Return False if the free
+        placeholders can not be filled.
+        """
+        free = [i for i in range(len(fact.actorPlaceholders)) if not fact.isBound(i)]
+        rules = dict([(i, fact.actorPlaceholders[i].rule) for i in free])
+        candidates = dict([(i, self.actors.sampler(rules[i])[0]) for i in free])
+        free.sort(key = lambda i: len(candidates[i]))
+        if not self.__isFeasible([candidates[i] for i in free], used):
+            return False
+        for n, i in enumerate(free):
+            rest = [candidates[j] for j in free[n + 1:]]
+            actorId = self.__draw(rules[i], rest, used, rng)
+            fact.bind(i, self.actors[actorId])
+            used.add(actorId)
+        return True
+
+    def assignWith(self, fact, actor, rng = random):
+        """
+        Assign the actor to one of the placeholders it satisfies, and other
+        actors to the rest of placeholders. Return False if it is not possible.
+        """
+        position = self.__positionFor(fact.actorPlaceholders, actor, rng)
+        if position is None:
+            return False
+        fact.bind(position, actor)
+        used = set()
+        actorId = self.actors.idOf(actor)
+        if actorId is not None:
+            used.add(actorId)
+        return self.assign(fact, used, rng)
+
+    def __candidates(self, placeholders):
+        return [self.actors.sampler(p.rule)[0] for p in placeholders]
+
+    def __positionFor(self, placeholders, actor, rng = random):
+        """Return the random position for the actor that leaves other placeholders satisfiable."""
+        positions = [i for i, p in enumerate(placeholders) if p.predicate(actor)]
+        rng.shuffle(positions)
+        used = set()
+        actorId = self.actors.idOf(actor)
+        if actorId is not None:
+            used.add(actorId)
+        for position in positions:
+            rest = placeholders[:position] + placeholders[position + 1:]
+            if self.__isFeasible(self.__candidates(rest), used):
+                return position
+        return None
+
+    def __draw(self, rule, rest, used, rng):
+        """Draw the id of an actor satisfying the rule that keeps 'rest' satisfiable."""
+        ids, table = self.actors.sampler(rule)
+        # Only a few actors are used or critical for the rest of placeholders,
+        # so a draw rarely hits one of them.
+        for attempt in range(2 * (len(used) + len(rest)) + 1):
+            i = table.sample(rng)
+            if i is None:
+                break
+            if self.__isAllowed(ids[i], rest, used):
+                return ids[i]
+        ids = [a for a in ids if self.__isAllowed(a, rest, used)]
+        i = AliasTable([weightOf(self.actors[a]) for a in ids]).sample(rng)
+        if i is None:
+            return rng.choice(ids)
+        return ids[i]
+
+    def __isAllowed(self, actorId, rest, used):
+        if actorId in used:
+            return False
+        used.add(actorId)
+        try:
+            return self.__isFeasible(rest, used)
+        finally:
+            used.remove(actorId)
+
+    def __isFeasible(self, candidates, used):
+        """Return True if distinct actors not in 'used' can be chosen from each list of candidates."""
+        k = len(candidates)
+        constrained = []
+        for ids in candidates:
+            free = []
+            for actorId in ids:
+                if actorId not in used:
+                    free.append(actorId)
+                    if len(free) == k:
+                        break
+            if len(free) == 0:
+                return False
+            if len(free) < k:
+                constrained.append(free)
+        return self.__match(constrained)
+
+    def __match(self, candidates):
+        """Return True if the bipartite matching covers all lists of candidates."""
+        owners = {}
+        def augment(i, seen):
+            for actorId in candidates[i]:
+                if actorId in seen:
+                    continue
+                seen.add(actorId)
+                if actorId not in owners or augment(owners[actorId], seen):
+                    owners[actorId] = i
+                    return True
+            return False
+        for i in range(len(candidates)):
+            if not augment(i, set()):
+                return False
+        return True
@@ -1,76 +1,88 @@
 # coding=UTF-8
 import random
 from . import *
+from .index import FactIndex
+from ..actor import ActorStore
 
 # Seed the random generator when the module is imported.
 random.seed();
 
 class FactChooser:
     def __init__(self, facts, actors):
+        if actors is not None and not isinstance(actors, ActorStore):
+            actors = ActorStore(actors)
+        if facts is not None and actors is not None and not isinstance(facts, FactIndex):
+            facts = FactIndex(facts, actors)
         self.facts = facts
         self.actors = actors
+        self.rng = random
 
-    def choose(self):
+    def bind(self):
+        """Return the chosen Fact with its actors bound, or None if no fact can be chosen."""
         pass
 
+    def choose(self):
+        """Return the rendered chosen fact, or None if no fact can be chosen."""
+        fact = self.bind()
+        if fact is None:
+            return None
+        return fact.render()
+
+    def generate(self, n, seed = None):
+        """
+        Yield up to n rendered facts. The generation stops early if no fact
+        can be chosen. If seed is specified, the choice of facts and actors
+        is reproducible; randomness inside the templates is not affected.
+        """
+        if seed is not None:
+            self.rng = random.Random(seed)
+        for i in xrange(n):
+            fact = self.choose()
+            if fact is None:
+                return
+            yield fact
+
 class RandomFactChooser(FactChooser):
     def __init__(self, facts, actors):
         FactChooser.__init__(self, facts, actors)
 
-    def choose(self):
-        if self.facts is None or len(self.facts) == 0:
+    def bind(self):
+        if self.facts is None or len(self.facts) == 0 or self.actors is None:
             return None
 
-        fact = random.choice(self.facts).buildup()
-        actors = self.actors[:]
-        if (len(fact.actorPlaceholders) > 0) \
-            and (actors is None or len(actors) < len(fact.actorPlaceholders)):
+        template = self.facts.sample(self.rng)
+        if template is None:
             return None
-
-        for placeholder in fact.actorPlaceholders:
-            applicable = [actor for actor in actors if placeholder.rule.evaluate(actor)]
-            if len(applicable) == 0:
-                return None
-            a = random.choice(applicable)
-            placeholder.set_actor(a)
-            actors.remove(a)
-        if fact.ready():
-            return fact.render()
-        else:
+        fact = template.buildup()
+        if not self.facts.assigner.assign(fact, set(), self.rng):
             return None
+        return fact
 
 class ActorBasedRandomFactChooser(FactChooser):
     def __init__(self, actor, facts, actors):
-        self.actor = actor
-        facts = [f for f in facts if f.isApplicableTo(actor)]        
         FactChooser.__init__(self, facts, actors)
+        self.actor = actor
 
-    def choose(self):
-        if self.facts is None or len(self.facts) == 0:
+    def bind(self):
+        if self.facts is None or len(self.facts) == 0 or self.actors is None:
             return None
 
-        fact = random.choice(self.facts).buildup()
-        for placeholder in fact.actorPlaceholders:
-            if placeholder.rule.evaluate(self.actor):
-                placeholder.set_actor(self.actor)
-                break
-
-        actors = self.actors[:]
-        if (len(fact.actorPlaceholders) > 0) \
-            and (actors is None or len(actors) < len(fact.actorPlaceholders)):
+        template = self.facts.sampleFor(self.actor, self.rng)
+        if template is None:
             return None
-
-        for placeholder in fact.actorPlaceholders:
-            if placeholder.has_actor():
-                continue
-            applicable = [actor for actor in actors if placeholder.rule.evaluate(actor)]
-            if len(applicable) == 0:
-                return None
-            a = random.choice(applicable)
-            placeholder.set_actor(a)
-            actors.remove(a)
-        if fact.ready():
-            return fact.render()
-        else:
+        fact = template.buildup()
+        if not self.facts.assigner.assignWith(fact, self.actor, self.rng):
             return None
+        return fact
 
+def generate(facts, actors, n, actor = None, seed = None):
+    """
+    Yield up to n facts about random actors, or about specified actor.
+    The same chooser is used for the whole batch, so the indexes, compiled
+    templates and sampling tables are built once.
+    """
+    if actor is None:
+        chooser = RandomFactChooser(facts, actors)
+    else:
+        chooser = ActorBasedRandomFactChooser(actor, facts, actors)
+    return chooser.generate(n, seed)
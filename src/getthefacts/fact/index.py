@@ -0,0 +1,229 @@
+# coding=UTF-8
+import heapq
+import bisect
+import random
+from . import *
+from .assignment import ActorAssigner
+from ..sampling import AliasTable, weightOf
+
+class FactIndex:
+    """
+    Collection of fact templates indexed by the actors they are applicable to.
+
+    The index behaves as a list of templates, and additionally keeps the map
+    from placeholder rule to the ids of facts using it, and the map from actor
+    id to the list of ids of the facts applicable to that actor. The list for
+    an actor is built on the first request, evaluating each distinct rule
+    once, and is kept up to date afterwards: facts added to or removed from
+    the index are added to or removed from the lists of all actors they are
+    applicable to, and the lists of actors removed from the ActorStore are
+    dropped. Ids of facts do not change when other facts are removed; the
+    removed fact leaves None in its place until its id is given to the next
+    added fact.
+
+    Facts are drawn by sample() and sampleFor() according to their weights.
+    The alias tables behind them are rebuilt on the next draw after the facts,
+    their weights or the actors have changed. Facts that can not be satisfied
+    by the actors of the store are never drawn.
+
+    Templates are not parsed when added; sample() parses only the templates
+    it draws, and the first applicableTo() parses all of them. A template
+    that fails to parse is parsed only once: the error is kept in 'errors',
+    by the id of the fact, and the fact is treated as unsatisfiable.
+    """
+
+    def __init__(self, facts, actors):
+        """Initialize new instance of FactIndex with facts and ActorStore."""
+        self.facts = []
+        self.actors = actors
+        self.__ids = {}
+        self.__free = []
+        self.errors = {}
+        self.assigner = ActorAssigner(actors)
+        self.__byRule = {}
+        self.__indexed = 0
+        self.__satisfiable = {}
+        self.__applicable = {}
+        self.__table = None
+        self.__tables = {}
+        actors.listeners.append(self)
+        for fact in facts:
+            self.add(fact)
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def __iter__(self):
+        return (f for f in self.facts if f is not None)
+
+    def __getitem__(self, factId):
+        return self.facts[factId]
+
+    def add(self, fact):
+        """Add fact template to the index and return its id; the lowest id of removed facts is reused."""
+        if len(self.__free) > 0:
+            factId = heapq.heappop(self.__free)
+            self.facts[factId] = fact
+        else:
+            factId = len(self.facts)
+            self.facts.append(fact)
+        self.__ids[id(fact)] = factId
+        self.__weightsChanged()
+        if factId < self.__indexed:
+            self.__indexFact(factId)
+        if len(self.__applicable) > 0:
+            self.__indexRules()
+        return factId
+
+    def remove(self, fact):
+        """Remove fact template from the index."""
+        factId = self.__ids[id(fact)]
+        rules = []
+        if factId < self.__indexed and factId not in self.errors:
+            rules = set([placeholder.rule for placeholder in fact.getActorPlaceholders()])
+        del self.__ids[id(fact)]
+        self.facts[factId] = None
+        heapq.heappush(self.__free, factId)
+        self.__satisfiable.pop(factId, None)
+        self.errors.pop(factId, None)
+        self.__weightsChanged()
+        for rule in rules:
+            factIds = self.__byRule[rule][1]
+            if factId in factIds:
+                factIds.remove(factId)
+                if len(factIds) == 0:
+                    del self.__byRule[rule]
+        if factId >= self.__indexed:
+            return
+        for factIds in self.__applicable.itervalues():
+            if factId in factIds:
+                factIds.remove(factId)
+
+    def applicableTo(self, actor):
+        """Return the list of ids of facts applicable to specified actor."""
+        self.__indexRules()
+        actorId = self.actors.idOf(actor)
+        factIds = self.__applicable.get(actorId)
+        if factIds is None:
+            factIds = set()
+            for placeholder, ids in self.__byRule.itervalues():
+                if placeholder.predicate(actor):
+                    factIds.update(ids)
+            factIds = sorted(factIds)
+            if actorId is not None:
+                self.__applicable[actorId] = factIds
+        return factIds
+
+    def isSatisfiable(self, factId):
+        """Return True if distinct actors can be assigned to all placeholders of the fact."""
+        if self.facts[factId] is None or self.__parse(factId) is None:
+            return False
+        satisfiable = self.__satisfiable.get(factId)
+        if satisfiable is None:
+            satisfiable = self.assigner.isSatisfiable(self.facts[factId])
+            self.__satisfiable[factId] = satisfiable
+        return satisfiable
+
+    def unsatisfiable(self):
+        """Return the list of ids of facts that can not be satisfied by the actors."""
+        return [i for i, f in enumerate(self.facts)
+                if f is not None and not self.isSatisfiable(i)]
+
+    def setWeight(self, factId, weight):
+        """Set the sampling weight of the fact with specified id."""
+        self.facts[factId].weight = weight
+        self.__weightsChanged()
+
+    def decay(self, factor):
+        """Multiply the sampling weights of all facts by specified factor."""
+        for fact in self:
+            fact.weight = weightOf(fact) * factor
+        self.__weightsChanged()
+
+    def sample(self, rng = random):
+        """Return the random fact template, or None if there are no facts."""
+        while True:
+            # Other threads may drop the table meanwhile, so it is read once.
+            table = self.__table
+            if table is None:
+                # Facts not parsed yet are assumed to be satisfiable.
+                table = self.__table = AliasTable([f is not None and i not in self.errors
+                                                   and self.__satisfiable.get(i, True)
+                                                   and weightOf(f) or 0
+                                                   for i, f in enumerate(self.facts)])
+            i = table.sample(rng)
+            if i is None:
+                return None
+            if self.isSatisfiable(i):
+                return self.facts[i]
+            self.__table = None
+
+    def sampleFor(self, actor, rng = random):
+        """Return the random fact template applicable to the actor, or None."""
+        actorId = self.actors.idOf(actor)
+        factIds = self.applicableTo(actor)
+        table = self.__tables.get(actorId)
+        if table is None:
+            table = AliasTable([self.assigner.isSatisfiable(self.facts[i], actor)
+                                and weightOf(self.facts[i]) or 0
+                                for i in factIds])
+            if actorId is not None:
+                self.__tables[actorId] = table
+        i = table.sample(rng)
+        if i is None:
+            return None
+        return self.facts[factIds[i]]
+
+    def actorAdded(self, actorId, actor):
+        self.__actorsChanged()
+
+    def actorRemoved(self, actorId, actor):
+        self.__applicable.pop(actorId, None)
+        self.__actorsChanged()
+
+    def __indexRules(self):
+        """Group the facts added since the last call by their placeholder rules."""
+        for factId in range(self.__indexed, len(self.facts)):
+            if self.facts[factId] is not None:
+                self.__indexFact(factId)
+        self.__indexed = len(self.facts)
+
+    def __indexFact(self, factId):
+        """Add the fact to the lists of its rules, and of the actors it is applicable to."""
+        placeholders = self.__parse(factId)
+        if placeholders is None:
+            return
+        for placeholder in placeholders:
+            insertId(self.__byRule.setdefault(placeholder.rule, (placeholder, []))[1], factId)
+        if len(self.__applicable) > 0:
+            mask = 0
+            for placeholder in placeholders:
+                mask |= self.actors.select(placeholder.rule)
+            for actorId in self.actors.ids(mask):
+                factIds = self.__applicable.get(actorId)
+                if factIds is not None:
+                    insertId(factIds, factId)
+
+    def __parse(self, factId):
+        """Return the placeholders of the fact, or None if its template fails to parse."""
+        if factId in self.errors:
+            return None
+        try:
+            return self.facts[factId].getActorPlaceholders()
+        except Exception, e:
+            self.errors[factId] = e
+            return None
+
+    def __actorsChanged(self):
+        self.__satisfiable = {}
+        self.__weightsChanged()
+
+    def __weightsChanged(self):
+        self.__table = None
+        self.__tables = {}
+
+def insertId(ids, i):
+    """Insert the id into the sorted list of ids, unless it is there already."""
+    position = bisect.bisect_left(ids, i)
+    if position == len(ids) or ids[position] != i:
+        ids.insert(position, i)
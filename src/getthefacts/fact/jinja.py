@@ -1,7 +1,9 @@
 # coding=UTF-8
-
+import marshal
+import threading
 from . import *
 from .. import rules
+from ..cache import LruCache
 
 from jinja2 import Environment
 from jinja2.ext import Extension
@@ -38,7 +40,7 @@ class ActorExtension(Extension):
             except rules.RuleParserError:
                 parser.fail('Invalid rule syntax: "%s"' % r, lineno, exc = rules.RuleParserError)
         else:
-            rule = rules.TrueRule()
+            rule = rules.factory.trueRule()
         if not parser.stream.current.test('block_end'):
             parser.fail('"actor" statement not finished.', lineno)
 
@@ -49,17 +51,120 @@ class ActorExtension(Extension):
         return []
 
 class JinjaFactTemplate(FactTemplate):
-    def __init__(self, factString):
+    """
+    Fact template in Jinja2 syntax with actors defined by ActorExtension.
+
+    The source of the template is either given as a string, or read from
+    the file when needed. On the first buildup() the source is only parsed
+    to collect the placeholders; it is compiled on the first render(). All
+    templates are compiled in one shared Environment, and the compiled ones
+    are kept in a bounded LRU cache, so the memory taken by compiled code
+    does not grow with the size of the corpus; keepCompiled() keeps the
+    compiled template with the template instead, out of the cache.
+
+    The file may be read again for compiling, after it was parsed. If its
+    actors have changed meanwhile, the compiled code would not match the
+    placeholders, so FactFormatError is raised until the file is reloaded.
+    """
+
+    # The Environment shared by all templates.
+    environment = Environment(extensions = [ActorExtension])
+
+    # ActorExtension collects placeholders into the shared environment,
+    # so only one template can be parsed or compiled at a time.
+    compileLock = threading.Lock()
+
+    # Maximum number of compiled templates kept in memory.
+    COMPILED_CACHE_SIZE = 10000
+
+    # The compiled templates, by JinjaFactTemplate.
+    compiled = LruCache(COMPILED_CACHE_SIZE)
+
+    def __init__(self, factString, fileName = None):
         FactTemplate.__init__(self)
         self.factString = factString
+        self.fileName = fileName
+        self.kept = None
+
+    def getSource(self):
+        """Return the source of the template, reading it from file if needed."""
+        if self.factString is not None:
+            return self.factString
+        f = open(self.fileName)
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def getTemplate(self):
+        """Return the compiled jinja2 Template, compiling it if needed."""
+        if self.kept is not None:
+            return self.kept
+        self.getActorPlaceholders()
+        with JinjaFactTemplate.compileLock:
+            template = JinjaFactTemplate.compiled.get(self)
+            if template is None:
+                template = self.__compile__()
+                JinjaFactTemplate.compiled.put(self, template)
+            return template
+
+    def keepCompiled(self):
+        """Compile the template if needed, and keep it for as long as the template lives."""
+        self.kept = self.getTemplate()
+
+    def getCode(self):
+        """Return the pair of Python code compiled from the template and the list of its ActorPlaceholders."""
+        with JinjaFactTemplate.compileLock:
+            return self.__collect(JinjaFactTemplate.environment.compile)
 
     def __parse__(self):
-        self.e = Environment(extensions = [ActorExtension])
-        self.template = self.e.from_string(self.factString)
-        return self.e.actorPlaceholders
+        with JinjaFactTemplate.compileLock:
+            return self.__collect(JinjaFactTemplate.environment.parse)[1]
+
+    def __compile__(self):
+        """Compiles the template and returns the jinja2 Template. Called with compileLock held."""
+        template, placeholders = self.__collect(JinjaFactTemplate.environment.from_string)
+        if [(p.index, p.rule) for p in placeholders] != \
+           [(p.index, p.rule) for p in self.getActorPlaceholders()]:
+            raise FactFormatError, ("The actors of %s have changed since it was parsed; "
+                                    "please reload it." % self.fileName)
+        return template
+
+    def __collect(self, method):
+        """Call the method of environment on the source, and return its result with the placeholders found."""
+        e = JinjaFactTemplate.environment
+        e.actorPlaceholders = []
+        try:
+            return (method(self.getSource()), e.actorPlaceholders)
+        finally:
+            e.actorPlaceholders = []
 
     def render(self, ctx):
-        return self.template.render(ctx)
+        return self.getTemplate().render(ctx)
+
+class PrecompiledFactTemplate(JinjaFactTemplate):
+    """
+    Jinja fact template built from the result of JinjaFactTemplate.getCode():
+    the placeholder definitions (index, rule) and the marshalled code.
+    """
+
+    def __init__(self, fileName, placeholders, code):
+        JinjaFactTemplate.__init__(self, None, fileName)
+        self.placeholders = placeholders
+        self.code = code
+
+    def getRecord(self):
+        """Return the pair of placeholder definitions and marshalled code."""
+        return (self.placeholders, self.code)
+
+    def __parse__(self):
+        return [ActorPlaceholder(index, rules.factory.intern(rule))
+                for index, rule in self.getRecord()[0]]
+
+    def __compile__(self):
+        e = JinjaFactTemplate.environment
+        code = marshal.loads(self.getRecord()[1])
+        return e.template_class.from_code(e, code, e.make_globals(None))
 
 class JinjaFactFormatter:
 
@@ -68,3 +173,11 @@ class JinjaFactFormatter:
     def read(self, factString):
         t = JinjaFactTemplate(factString)
         return t
+
+    def readFile(self, fileName):
+        """Return the template that reads its source from the file when needed."""
+        return JinjaFactTemplate(None, fileName)
+
+    def readRecord(self, factString, origin):
+        """Return the template for the record of a container file."""
+        return JinjaFactTemplate(factString, origin)
@@ -1,4 +1,5 @@
 # coding=UTF-8
+import re
 import random
 from . import *
 from .. import rules
@@ -12,10 +13,22 @@ class Substitution:
         [big, beautiful] is a substitution, and a resulting fact may have 2 variants:
         %s is a big tree.
         %s is a beautiful tree.
+
+    Substitutions can be nested, e.g. "[a [big, tall], an old] tree". Each
+    choice is kept both as text, in 'choices', and as the list of segments
+    (see splitSegments), in 'options'.
     """
-    def __init__(self, subst):
+    def __init__(self, subst, choices = None, options = None):
         self.subst = subst
-        self.choices = [s.strip() for s in subst.strip().lstrip("[").rstrip("]").split(",")]
+        if options is None:
+            [substitution] = splitSegments(subst.strip())
+            choices, options = substitution.choices, substitution.options
+        self.choices = choices
+        self.options = options
+        self.compiled = [compileSegments(o) for o in options]
+        self.literals = None
+        if all([len(slots) == 0 for pattern, slots in self.compiled]):
+            self.literals = [pattern % () for pattern, slots in self.compiled]
 
     def __choose__(self):
         return random.choice(self.choices)
@@ -23,16 +36,111 @@ class Substitution:
     def resolve(self, fact):
         return fact.replace(self.subst, self.__choose__())
 
+    def render(self, ctx):
+        """Return randomly chosen option rendered with ctx."""
+        if self.literals is not None:
+            return random.choice(self.literals)
+        return renderCompiled(random.choice(self.compiled), ctx)
+
+# Tokens that start or end segments of the simple fact format.
+SEGMENT_TOKENS = re.compile(r"%s|%%|\[|\]|,")
+
+def splitSegments(format):
+    """
+    Split the simple fact format into the list of segments. A segment is a
+    literal string, an int (the index of an actor, for '%s'), or a
+    Substitution. Raise FactFormatError if the brackets are not balanced.
+    """
+    segments = []
+    # Each item is (outer segments, choices, options, start of substitution,
+    # start of current choice) for the substitutions that are not closed yet.
+    stack = []
+    pos = 0
+    for match in SEGMENT_TOKENS.finditer(format):
+        if match.start() > pos:
+            segments.append(format[pos:match.start()])
+        pos = match.end()
+        token = match.group()
+        if token == "%s":
+            segments.append(0)
+        elif token == "%%":
+            segments.append("%")
+        elif token == "[":
+            stack.append((segments, [], [], match.start(), pos))
+            segments = []
+        elif token == "," and len(stack) == 0:
+            segments.append(",")
+        else:
+            if len(stack) == 0:
+                raise FactFormatError, "Unexpected ']' at %d." % match.start()
+            outer, choices, options, start, choiceStart = stack[-1]
+            choices.append(format[choiceStart:match.start()].strip())
+            options.append(mergeSegments(segments, True))
+            segments = []
+            if token == ",":
+                stack[-1] = (outer, choices, options, start, pos)
+            else:
+                stack.pop()
+                outer.append(Substitution(format[start:pos], choices, options))
+                segments = outer
+    if len(stack) > 0:
+        raise FactFormatError, "Substitution at %d is not closed." % stack[-1][3]
+    if pos < len(format):
+        segments.append(format[pos:])
+    return mergeSegments(segments, False)
+
+def mergeSegments(segments, strip):
+    """Join adjacent literal segments, and strip the whitespace around the list if needed."""
+    merged = []
+    for segment in segments:
+        if isinstance(segment, basestring) and len(merged) > 0 and \
+           isinstance(merged[-1], basestring):
+            merged[-1] += segment
+        else:
+            merged.append(segment)
+    if strip and len(merged) > 0:
+        if isinstance(merged[0], basestring):
+            merged[0] = merged[0].lstrip()
+        if isinstance(merged[-1], basestring):
+            merged[-1] = merged[-1].rstrip()
+    return [segment for segment in merged if segment != ""]
+
+def compileSegments(segments):
+    """
+    Return the pair (pattern, slots) for the list of segments: the literal
+    segments are joined into a '%' format pattern, and the other segments
+    (actor indexes and substitutions) are the slots filling the pattern.
+    """
+    pattern = []
+    slots = []
+    for segment in segments:
+        if isinstance(segment, basestring):
+            pattern.append(segment.replace("%", "%%"))
+        else:
+            pattern.append("%s")
+            slots.append(segment)
+    return ("".join(pattern), slots)
+
+def renderCompiled(compiled, ctx):
+    """Render the pair (pattern, slots) returned by compileSegments with ctx."""
+    pattern, slots = compiled
+    return pattern % tuple([ctx[s].name if s.__class__ is int else s.render(ctx)
+                            for s in slots])
+
 class SimpleStringFactTemplate(FactTemplate):
     """
     Fact Template that defines current format of facts:
      - Single actor supported
      - Actor placeholder is '%s'
-     - Substitutions supported
+     - Substitutions supported, and can be nested
      - Single-line
      - Fact pattern separated from rule definition by '|'
      - Rule definition section is optional
      - Example of the format: "%s is a big tree.| (big, tree)"
+
+    The pattern is split into segments once, when the template is parsed,
+    and the segments are compiled into a single format string, filled by
+    the names of actors and the chosen substitutions in one step.
     """
 
     def __init__(self, factString):
@@ -40,43 +148,62 @@ class SimpleStringFactTemplate(FactTemplate):
         self.factString = factString
 
     def __parse__(self):
-        rule = rules.TrueRule()
+        rule = rules.factory.trueRule()
         format = self.factString
         if self.factString.find("|") > -1:
             [format, ruleString] = self.factString.split("|", 1)
             rule = rules.RuleParser(ruleString).parse()
         self.format = format
-        self.__findSubstitutions__()
-        hasActorplaceholder = self.factString.find("%s") > -1
+        self.segments = splitSegments(format)
+        self.compiled = compileSegments(self.segments)
+        self.substitutions = [s for s in self.segments if isinstance(s, Substitution)]
+        hasActorplaceholder = format.find("%s") > -1
         if hasActorplaceholder:
             return [ActorPlaceholder(0, rule)]
         else:
             return []
 
-    def render(self, actors):
-        fmt = self.__resolveSubstitutions__()
-        return fmt % actors[0].name
-
-    def __resolveSubstitutions__(self):
-        f = self.format
-        for s in self.substitutions:
-            f = s.resolve(f)
-        return f
-
-    def __findSubstitutions__(self):
-        self.substitutions = []
-        s = self.format.split("[")
-        if len(s) != len(self.format.split("]")):
-            raise FactFormatError()
-        for subst in s:
-            if "]" in subst:
-                subst = subst[0 : subst.find("]")]
-                self.substitutions.append(Substitution("[" + subst + "]"))
+    def render(self, ctx):
+        return renderCompiled(self.compiled, ctx)
 
 class SimpleStringFactFormatter:
 
-    """Read and write Facts to and from string."""
+    """
+    Read and write Facts to and from string.
+
+    The records of container files are read in the multiline format:
+
+        $1 is a tree,
+        and a big one.
+        -
+        $1: (tree, big)
+
+    The lines before the '-' line are the pattern, where '$1' is the actor
+    placeholder, and the line after it is the rule of the actor. Only one
+    actor is supported.
+    """
 
     def read(self, factString):
-        t = SimpleStringFactTemplate(factString)
-        return t.buildup()
+        """Return the template of the fact; it is parsed on first use."""
+        return SimpleStringFactTemplate(factString)
+
+    def readRecord(self, record, origin):
+        """Read the fact from the record of a container file."""
+        return self.read(self.__joinLines(record))
+
+    def __joinLines(self, record):
+        """Convert the multiline record to the single-line format."""
+        lines = [line.strip() for line in record.strip().splitlines()]
+        ruleLines = []
+        if "-" in lines:
+            i = lines.index("-")
+            lines, ruleLines = lines[:i], [line for line in lines[i + 1:] if line != ""]
+        pattern = "\n".join(lines).replace("$1", "%s")
+        if len(ruleLines) == 0:
+            return pattern
+        if len(ruleLines) > 1 or "|" in pattern:
+            raise FactFormatError, "Only one rule, for $1, is supported: %s" % record
+        rule = ruleLines[0]
+        if rule.startswith("$1:"):
+            rule = rule[3:]
+        return pattern + "|" + rule
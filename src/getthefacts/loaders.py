@@ -0,0 +1,272 @@
+# coding=UTF-8
+"""
+    Module: loaders.
+
+    Description:
+
+    This module contains generators that read actors and facts from files
+    one by one, so a store can be loaded without keeping the whole content
+    of its files in memory.
+
+    The formatter given to a loader must have the read(string) method. If it
+    also has the readFile(fileName) method, the directory loader uses it, so
+    the formatter can defer reading the file until the object is used.
+
+    A container file (with CONTAINER_EXTENSION) holds many records, separated
+    by lines of five or more dashes. The file is memory-mapped and split into
+    records in one pass, and each record is read by the formatter; if the
+    formatter has the readRecord(string, origin) method, it is used, where
+    'origin' is "file name:line". For example:
+
+        -----
+        {% actor "user" %}
+        Hello, {{ user.name }}!
+        -----
+        {% actor "user", "human" %}
+        Bye, {{ user.name }}!
+        -----
+
+    If the list is passed as 'errors' argument, the items that fail to load
+    are skipped, and the pairs (file name, exception) are appended to the
+    list. Otherwise the exception is raised.
+
+    DirectoryReloader remembers the files of a directory it has loaded, and
+    later re-reads only the files that have changed. DirectoryWatcher calls
+    a function periodically in a background thread, e.g. to reload.
+"""
+import os
+import re
+import mmap
+import hashlib
+import threading
+
+# Extension of the files that contain many records.
+CONTAINER_EXTENSION = ".gtf"
+
+# The line that separates the records of a container file.
+SEPARATOR_LINE = re.compile(r"^-{5,}[ \t]*\r?$", re.M)
+
+def readLines(fileName, formatter, errors = None):
+    """Yield objects read from non-empty, non-comment lines of the file."""
+    try:
+        f = open(fileName)
+    except EnvironmentError, e:
+        if errors is None:
+            raise
+        errors.append((fileName, e))
+        return
+    try:
+        for line in f:
+            if line.strip() == "" or line.startswith("#"):
+                continue
+            try:
+                item = formatter.read(line.strip())
+            except Exception, e:
+                if errors is None:
+                    raise
+                errors.append((fileName, e))
+                continue
+            if item is not None:
+                yield item
+    finally:
+        f.close()
+
+def readFile(fileName):
+    """Return the content of the file."""
+    f = open(fileName)
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+def listDir(dirName):
+    """Return the sorted list of paths of the files in the directory."""
+    names = [os.path.join(dirName, name) for name in sorted(os.listdir(dirName))]
+    return [name for name in names if os.path.isfile(name)]
+
+def isContainer(fileName):
+    """Return True if the file holds many records."""
+    return fileName.endswith(CONTAINER_EXTENSION)
+
+def splitRecords(data):
+    """
+    Yield the pairs (line number, text) for the non-empty records of data
+    (a string or a memory-mapped file) separated by the separator lines.
+    """
+    pos = 0
+    line = 1
+    for match in SEPARATOR_LINE.finditer(data):
+        text = data[pos:match.start()]
+        if text.strip() != "":
+            yield (line + text[:len(text) - len(text.lstrip())].count("\n"), text.strip())
+        line += text.count("\n")
+        pos = match.end()
+    text = data[pos:]
+    if text.strip() != "":
+        yield (line + text[:len(text) - len(text.lstrip())].count("\n"), text.strip())
+
+def recordsOf(fileName):
+    """
+    Yield the pairs (origin, text) for the records of the file: the records
+    of a container, or the single record with the content of other file.
+    """
+    if not isContainer(fileName):
+        yield (fileName, readFile(fileName))
+        return
+    f = open(fileName, "rb")
+    try:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+    finally:
+        f.close()
+    try:
+        for line, text in splitRecords(data):
+            yield ("%s:%d" % (fileName, line), text)
+    finally:
+        data.close()
+
+def readRecords(fileName, formatter, errors = None):
+    """Yield objects read from the records of the container file."""
+    try:
+        for origin, text in recordsOf(fileName):
+            try:
+                if hasattr(formatter, "readRecord"):
+                    item = formatter.readRecord(text, origin)
+                else:
+                    item = formatter.read(text)
+            except Exception, e:
+                if errors is None:
+                    raise
+                errors.append((origin, e))
+                continue
+            if item is not None:
+                yield item
+    except EnvironmentError, e:
+        if errors is None:
+            raise
+        errors.append((fileName, e))
+
+def readDir(dirName, formatter, errors = None):
+    """Yield objects read from the files of the directory, one per file or record."""
+    for fileName in listDir(dirName):
+        if isContainer(fileName):
+            for item in readRecords(fileName, formatter, errors):
+                yield item
+            continue
+        try:
+            if hasattr(formatter, "readFile"):
+                item = formatter.readFile(fileName)
+            else:
+                item = formatter.read(readFile(fileName))
+        except Exception, e:
+            if errors is None:
+                raise
+            errors.append((fileName, e))
+            continue
+        if item is not None:
+            yield item
+
+class DirectoryReloader:
+
+    """
+    Loads the objects from the files of a directory, one per file or record,
+    and then reloads only the files that were added, changed or removed.
+
+    For every file the modification time and the size are remembered. If
+    they change, the MD5 digest of the content is compared with the one
+    computed at the previous change, and the file is reparsed only if the
+    content differs. Digests are not computed on the initial load, so the
+    first change of a file always makes it reparsed.
+    """
+
+    def __init__(self, dirName, formatter):
+        """Initialize new instance of DirectoryReloader."""
+        self.dirName = dirName
+        self.formatter = formatter
+        self.files = {}
+
+    def load(self, errors = None):
+        """Yield objects read from the files of the directory, remembering the files."""
+        self.files = {}
+        for fileName in listDir(self.dirName):
+            for item in self.__read(fileName, self.__state(fileName, False), errors):
+                yield item
+
+    def reload(self, collection, errors = None):
+        """
+        Update the collection (an object with add() and remove() methods)
+        with the changes of directory since the last load or reload. Return
+        the tuple of numbers of added, changed and removed files.
+        """
+        added = changed = removed = 0
+        fileNames = listDir(self.dirName)
+        for fileName in set(self.files) - set(fileNames):
+            state, items = self.files.pop(fileName)
+            for item in items:
+                collection.remove(item)
+            removed += 1
+        for fileName in fileNames:
+            old = self.files.get(fileName)
+            state = self.__state(fileName, False)
+            if old is not None and old[0][:2] == state[:2]:
+                continue
+            state = self.__state(fileName, True)
+            if old is not None and old[0][2] is not None and old[0][2] == state[2]:
+                self.files[fileName] = (state, old[1])
+                continue
+            if old is not None:
+                for item in old[1]:
+                    collection.remove(item)
+            for item in self.__read(fileName, state, errors):
+                collection.add(item)
+            if old is None:
+                added += 1
+            else:
+                changed += 1
+        return (added, changed, removed)
+
+    def __state(self, fileName, digest):
+        """Return the tuple (modification time, size, digest or None) for the file."""
+        st = os.stat(fileName)
+        if digest:
+            return (st.st_mtime, st.st_size, hashlib.md5(readFile(fileName)).hexdigest())
+        return (st.st_mtime, st.st_size, None)
+
+    def __read(self, fileName, state, errors):
+        """Return the list of objects read from the file, and remember them."""
+        items = []
+        if isContainer(fileName):
+            items = list(readRecords(fileName, self.formatter, errors))
+        else:
+            try:
+                if hasattr(self.formatter, "readFile"):
+                    items = [self.formatter.readFile(fileName)]
+                else:
+                    items = [self.formatter.read(readFile(fileName))]
+            except Exception, e:
+                if errors is None:
+                    raise
+                errors.append((fileName, e))
+            items = [item for item in items if item is not None]
+        self.files[fileName] = (state, items)
+        return items
+
+class DirectoryWatcher(threading.Thread):
+
+    """Daemon thread that calls the function every 'interval' seconds until stopped."""
+
+    def __init__(self, interval, function):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.interval = interval
+        self.function = function
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.function()
+
+    def stop(self):
+        """Stop calling the function."""
+        self.stopped.set()
@@ -0,0 +1,100 @@
+# coding=UTF-8
+"""
+    Module: parallel.
+
+    Description:
+
+    This module loads the jinja store (directories of JSON actors and Jinja
+    facts) with a pool of processes. Files are distributed among the worker
+    processes in chunks. The workers parse JSON and compile templates (all
+    records of a container file are handled by one worker), and
+    send back picklable records: the attributes of actors, and the pairs of
+    placeholder definitions and marshalled code for facts. The records are
+    collected in the order of file names, so the result does not depend on
+    the order the workers finish in.
+"""
+import marshal
+import multiprocessing
+from actor import Actor, ActorJsonFormatter
+from loaders import listDir, recordsOf
+from fact.jinja import JinjaFactTemplate, PrecompiledFactTemplate
+
+def readActorRecord(text):
+    """Return the pair (attributes of actor, error message) for the JSON text."""
+    try:
+        actor = ActorJsonFormatter().read(text)
+        if actor is None:
+            return (None, None)
+        return (vars(actor), None)
+    except Exception, e:
+        return (None, "%s: %s" % (e.__class__.__name__, e))
+
+def compileFactRecord(text):
+    """Return the pair ((placeholder definitions, marshalled code), error message) for the template."""
+    try:
+        code, placeholders = JinjaFactTemplate(text).getCode()
+        return (([(p.index, p.rule) for p in placeholders], marshal.dumps(code)), None)
+    except Exception, e:
+        return (None, "%s: %s" % (e.__class__.__name__, e))
+
+def readFileRecords(fileName, read):
+    """Return the list of triples (origin, record, error message) for the records of the file."""
+    try:
+        return [(origin,) + read(text) for origin, text in recordsOf(fileName)]
+    except EnvironmentError, e:
+        return [(fileName, None, "%s: %s" % (e.__class__.__name__, e))]
+
+def readActorRecords(fileName):
+    """Return the list of triples (origin, attributes of actor, error message) for the file."""
+    return readFileRecords(fileName, readActorRecord)
+
+def compileFactRecords(fileName):
+    """Return the list of triples (origin, fact record, error message) for the file."""
+    return readFileRecords(fileName, compileFactRecord)
+
+class ParallelLoader:
+
+    """Load actors and facts from directories with a pool of processes."""
+
+    # Number of chunks per worker process the files are split into.
+    CHUNKS_PER_PROCESS = 4
+
+    def __init__(self, processes = None):
+        """Initialize new instance of ParallelLoader; by default a process per CPU is used."""
+        self.processes = processes or multiprocessing.cpu_count()
+
+    def load(self, actorsDir, factsDir):
+        """
+        Return the tuple (actors, facts, errors), where 'errors' is the list
+        of pairs (file name, error message) for the files that failed to load.
+        """
+        errors = []
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            actorFiles = listDir(actorsDir)
+            factFiles = listDir(factsDir)
+            actorRecords = pool.imap(readActorRecords, actorFiles, self.__chunkSize(actorFiles))
+            factRecords = pool.imap(compileFactRecords, factFiles, self.__chunkSize(factFiles))
+            actors = []
+            for records in actorRecords:
+                for origin, attrs, error in records:
+                    if error is not None:
+                        errors.append((origin, error))
+                    elif attrs is not None:
+                        actor = Actor(None)
+                        actor.__dict__.update(attrs)
+                        actors.append(actor)
+            facts = []
+            for records in factRecords:
+                for origin, record, error in records:
+                    if error is not None:
+                        errors.append((origin, error))
+                    else:
+                        facts.append(PrecompiledFactTemplate(origin, record[0], record[1]))
+        finally:
+            pool.close()
+            pool.join()
+        return (actors, facts, errors)
+
+    def __chunkSize(self, files):
+        return max(1, len(files) / (self.processes * self.CHUNKS_PER_PROCESS))
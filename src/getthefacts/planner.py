@@ -0,0 +1,225 @@
+# coding=UTF-8
+"""
+    Module: planner.
+
+    Description:
+
+    This module contains the query planner that decides how the actors
+    satisfying a rule are selected from the ActorStore. The planner estimates
+    the number of actors selected by each part of the rule from the
+    statistics of the store (the number of actors per tag and name, and the
+    attribute indexes), and chooses:
+        *   the order of children of And/Or rules: the most selective and
+            cheapest children are checked first;
+        *   whether a child is selected through the index of the store as a
+            bitset, or is evaluated on the actors one by one.
+"""
+
+from rules import *
+from bitsets import maskOf, idsOf
+
+
+class Plan:
+
+    """
+    Step of the plan that selects the actors satisfying 'rule'.
+
+    The 'strategy' of the step is one of:
+        index   the bitset is taken from the tag, name or attribute index;
+        scan    the rule of a kind unknown to the planner selects the actors
+                by its own select() method, by default evaluating itself
+                on every actor of the store;
+        not     the complement of the bitset of the only child;
+        and     the intersection of the bitsets of children, in their order;
+        or      the union of the bitsets of children;
+        filter  the first child is selected, and the second one, a check,
+                is evaluated only on the actors selected by the first;
+        check   the rule is evaluated on the actors selected before.
+
+    'rows' is the estimated number of selected actors, and 'cost' is the
+    estimated cost of the step with its children, in units of evaluating
+    a TagRule on one actor.
+    """
+
+    def __init__(self, rule, strategy, rows, cost, children = [], predicate = None):
+        """Initialize new instance of Plan."""
+        self.rule = rule
+        self.strategy = strategy
+        self.rows = rows
+        self.cost = cost
+        self.children = children
+        self.predicate = predicate
+
+    def select(self, store):
+        """Execute the plan and return the bitset of selected actors."""
+        if self.strategy in ("index", "scan"):
+            return self.rule.select(store)
+        if self.strategy == "check":
+            return maskOf([i for i, a in enumerate(store.actors)
+                           if a is not None and self.predicate(a)])
+        if self.strategy == "not":
+            return store.everyone() & ~self.children[0].select(store)
+        if self.strategy == "and":
+            mask = store.everyone()
+            for child in self.children:
+                if mask == 0: break
+                mask &= child.select(store)
+            return mask
+        if self.strategy == "or":
+            mask = 0
+            for child in self.children:
+                mask |= child.select(store)
+            return mask
+        if self.strategy == "filter":
+            predicate = self.children[1].predicate
+            ids = idsOf(self.children[0].select(store))
+            return maskOf([i for i in ids if predicate(store.actors[i])])
+        raise ValueError, "Unknown strategy: %s" % self.strategy
+
+    def describe(self, depth = 0):
+        """Return the list of lines that describe the plan, one per step."""
+        rule = RuleFormatter().write(self.rule)
+        lines = ["%s%s rows~%d cost~%.1f %s" % ("  " * depth, self.strategy,
+                                                 round(self.rows), self.cost, rule)]
+        for child in self.children:
+            lines.extend(child.describe(depth + 1))
+        return lines
+
+
+class RulePlanner:
+
+    """
+    RulePlanner builds the Plan for a rule from the statistics of ActorStore.
+
+    Children of a rule are assumed to be independent, so the selectivity of
+    And rule is the product of selectivities of its children. Rules of kinds
+    that are unknown to the planner select the actors by their own select()
+    method, and are never evaluated as a part of a check.
+    """
+
+    # Cost of a bitwise operation on the bitsets, per actor of the store.
+    BITSET_COST = 0.02
+
+    # Cost of evaluating the compiled rule on one actor, besides the cost of
+    # its checks estimated by RuleCompiler.
+    CALL_COST = 1
+
+    # Rules that are selected through the indexes of the store.
+    INDEXED = (TrueRule, FalseRule, TagRule, NameRule, AttributeRule)
+
+    def __init__(self, store):
+        """Initialize new instance of RulePlanner for specified ActorStore."""
+        self.store = store
+        self.compiler = RuleCompiler()
+
+    def select(self, rule):
+        """Return the bitset of actors satisfying the rule, according to its plan."""
+        return self.plan(rule).select(self.store)
+
+    def plan(self, rule):
+        """Return the Plan for specified rule."""
+        size = len(self.store)
+        if rule.__class__ in self.INDEXED:
+            rows = self.selectivity(rule) * size
+            return Plan(rule, "index", rows, self.__indexCost(rule, rows))
+        if rule.__class__ is NotRule:
+            child = self.plan(rule.baseRule)
+            return Plan(rule, "not", size - child.rows,
+                        child.cost + size * self.BITSET_COST, [child])
+        if rule.__class__ is AndRule:
+            return self.__planAnd(rule)
+        if rule.__class__ is OrRule:
+            children = [self.plan(r) for r in rule.baseRules]
+            children.sort(key = lambda p: -p.rows)
+            cost = sum([p.cost for p in children]) + len(children) * size * self.BITSET_COST
+            return Plan(rule, "or", self.selectivity(rule) * size, cost, children)
+        return Plan(rule, "scan", self.selectivity(rule) * size,
+                    size * self.__evaluationCost(rule))
+
+    def selectivity(self, rule):
+        """Return the estimated fraction of actors satisfying the rule."""
+        size = len(self.store)
+        if size == 0 or rule.__class__ is FalseRule:
+            return 0.0
+        if rule.__class__ is TrueRule:
+            return 1.0
+        if rule.__class__ is TagRule:
+            return float(self.store.tagCount(rule.tag)) / size
+        if rule.__class__ is NameRule:
+            return float(self.store.nameCount(rule.name)) / size
+        if rule.__class__ is AttributeRule:
+            return float(self.store.comparedCount(rule.attribute, rule.operator, rule.key)) / size
+        if rule.__class__ is NotRule:
+            return 1.0 - self.selectivity(rule.baseRule)
+        if rule.__class__ is AndRule:
+            result = 1.0
+            for r in rule.baseRules:
+                result *= self.selectivity(r)
+            return result
+        if rule.__class__ is OrRule:
+            result = 1.0
+            for r in rule.baseRules:
+                result *= 1.0 - self.selectivity(r)
+            return 1.0 - result
+        # Nothing is known about the rules of other kinds.
+        return 0.5
+
+    def order(self, rule):
+        """
+        Return the rule equivalent to specified one, where the children of
+        And/Or rules are ordered for evaluation on one actor: the children
+        that are cheap and most likely decide the result are checked first.
+        """
+        if rule.__class__ is NotRule:
+            return NotRule(self.order(rule.baseRule))
+        if rule.__class__ is AndRule:
+            children = [self.order(r) for r in rule.baseRules]
+            children.sort(key = lambda r: self.compiler.cost(r) /
+                                          max(1.0 - self.selectivity(r), 1e-6))
+            return AndRule(children)
+        if rule.__class__ is OrRule:
+            children = [self.order(r) for r in rule.baseRules]
+            children.sort(key = lambda r: self.compiler.cost(r) /
+                                          max(self.selectivity(r), 1e-6))
+            return OrRule(children)
+        return rule
+
+    def __planAnd(self, rule):
+        size = len(self.store)
+        rows = self.selectivity(rule) * size
+        children = [self.plan(r) for r in rule.baseRules]
+        children.sort(key = lambda p: (p.rows, p.cost))
+        cost = sum([p.cost for p in children]) + len(children) * size * self.BITSET_COST
+        # Instead of selecting every child, evaluate the rest of the rule on
+        # the actors selected by the most selective child, if it is cheaper.
+        first, rest = children[0], [p.rule for p in children[1:]]
+        restRule = len(rest) == 1 and rest[0] or AndRule(rest)
+        filterCost = first.cost + first.rows * self.__evaluationCost(restRule)
+        if filterCost < cost and self.__isKnown(restRule):
+            check = Plan(restRule, "check", rows, filterCost - first.cost,
+                         predicate = self.__compile(restRule))
+            return Plan(rule, "filter", rows, filterCost, [first, check])
+        return Plan(rule, "and", rows, cost, children)
+
+    def __isKnown(self, rule):
+        """Return True if the rule consists of the rules of kinds known to the planner."""
+        if rule.__class__ is NotRule:
+            return self.__isKnown(rule.baseRule)
+        if rule.__class__ in (AndRule, OrRule):
+            return all([self.__isKnown(r) for r in rule.baseRules])
+        return rule.__class__ in self.INDEXED
+
+    def __indexCost(self, rule, rows):
+        if rule.__class__ in (TrueRule, FalseRule):
+            return 0.0
+        if rule.__class__ is TagRule:
+            return len(self.store) * self.BITSET_COST
+        # Names and attributes are found in dictionaries or by binary search,
+        # and the bitset is built from the found ids.
+        return 1.0 + rows
+
+    def __evaluationCost(self, rule):
+        return self.CALL_COST + self.compiler.cost(rule)
+
+    def __compile(self, rule):
+        return self.compiler.compile(self.order(rule), simplify = False)
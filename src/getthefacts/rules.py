@@ -20,8 +20,15 @@
         All objects, that are animal, bird or fish,
         but are not big, satisfy this expression.
 
+    Attributes of objects can be compared with values as well:
+
+    (human, age>=18, !species=cat)
+
 """
 
+import re
+import weakref
+
 
 class RuleBase:
 
@@ -30,11 +37,28 @@ class RuleBase:
 
     Overrides the __eq__ operator, but gives no implementation. This forces all
     decendants to override the equality operator to aviod errors.
+    Descendants that override __eq__ also override __hash__ consistently, so
+    that structurally equal rules can be used as the same dictionary key.
     """
 
     def __eq__(self, other):
         return NotImplemented
 
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return id(self)
+
+    def select(self, store):
+        """
+        Return the bitset of actors from the ActorStore that satisfy the rule.
+
+        The default implementation evaluates the rule on every actor of the
+        store. Descendants override it to use the tag index of the store.
+        """
+        return store.scan(self)
+
 class TrueRule(RuleBase):
 
     """
@@ -45,9 +69,15 @@ class TrueRule(RuleBase):
     def evaluate(self, actor):
         return True
 
+    def select(self, store):
+        return store.everyone()
+
     def __eq__(self, other):
         return other.__class__ is TrueRule
 
+    def __hash__(self):
+        return hash("TrueRule")
+
     
 class FalseRule(RuleBase):
 
@@ -59,9 +89,15 @@ class FalseRule(RuleBase):
     def evaluate(self, actor):
         return False
 
+    def select(self, store):
+        return 0
+
     def __eq__(self, other):
         return other.__class__ is FalseRule
 
+    def __hash__(self):
+        return hash("FalseRule")
+
 
 class TagRule(RuleBase):
     def __init__(self, tag):
@@ -70,9 +106,15 @@ class TagRule(RuleBase):
     def evaluate(self, actor):
         return actor.isTaggedWith(self.tag)
 
+    def select(self, store):
+        return store.tagged(self.tag)
+
     def __eq__(self, other):
         return (other.__class__ is TagRule) and (self.tag == other.tag)
 
+    def __hash__(self):
+        return hash(("TagRule", self.tag))
+
 
 class NameRule(RuleBase):
     def __init__(self, name):
@@ -81,9 +123,92 @@ class NameRule(RuleBase):
     def evaluate(self, actor):
         return self.name == actor.name
 
+    def select(self, store):
+        return store.named(self.name)
+
+    def resolve(self, store):
+        """Return the id of the single actor with this name in the store, or None."""
+        return store.registry.idOf(self.name)
+
     def __eq__(self, other):
         return (other.__class__ is NameRule) and (self.name == other.name)
 
+    def __hash__(self):
+        return hash(("NameRule", self.name))
+
+
+# Values of boolean attributes, as written in rules.
+BOOLEANS = {"true" : True, "false" : False}
+
+def attributeKey(value):
+    """
+    Return the key that orders the values of attributes: a value that looks
+    like a number is compared as a number, booleans and the words "true" and
+    "false" are compared as booleans, and other values are compared as text.
+    The first element of the key is 0 for numbers, 1 for text and 2 for
+    booleans.
+    """
+    if isinstance(value, bool):
+        return (2, value)
+    if isinstance(value, (int, long, float)):
+        return (0, value)
+    if isinstance(value, basestring) and value.lower() in BOOLEANS:
+        return (2, BOOLEANS[value.lower()])
+    try:
+        number = float(value)
+        if number == number:
+            return (0, number)
+    except (TypeError, ValueError):
+        pass
+    return (1, value)
+
+
+class AttributeRule(RuleBase):
+
+    """
+    Compares an attribute of actor with a value, e.g. age>18 or species=cat.
+
+    Numbers are compared with numbers, booleans with booleans (written as
+    true or false in rules) and text with text, see attributeKey(); a value
+    never satisfies a comparison with a value of another kind. Actors that
+    do not have the attribute do not satisfy the rule.
+    """
+
+    # Supported comparison operators.
+    OPERATORS = {
+        "=" : lambda a, b: a == b,
+        "<" : lambda a, b: a < b,
+        "<=" : lambda a, b: a <= b,
+        ">" : lambda a, b: a > b,
+        ">=" : lambda a, b: a >= b,
+    }
+
+    def __init__(self, attribute, operator, value):
+        if operator not in self.OPERATORS:
+            raise ValueError, "Unknown comparison operator: %s" % operator
+        self.attribute = attribute
+        self.operator = operator
+        self.value = value
+        self.key = attributeKey(value)
+
+    def evaluate(self, actor):
+        value = getattr(actor, self.attribute, None)
+        if value is None:
+            return False
+        key = attributeKey(value)
+        return key[0] == self.key[0] and self.OPERATORS[self.operator](key, self.key)
+
+    def select(self, store):
+        return store.compared(self.attribute, self.operator, self.key)
+
+    def __eq__(self, other):
+        return (other.__class__ is AttributeRule) and \
+               (self.attribute == other.attribute) and \
+               (self.operator == other.operator) and (self.key == other.key)
+
+    def __hash__(self):
+        return hash(("AttributeRule", self.attribute, self.operator, self.key))
+
 
 class NotRule(RuleBase):
     def __init__(self, baseRule):
@@ -91,11 +216,17 @@ class NotRule(RuleBase):
         
     def evaluate(self, actor):
         return not self.baseRule.evaluate(actor)
-    
+
+    def select(self, store):
+        return store.everyone() & ~self.baseRule.select(store)
+
     def __eq__(self, other):
         return (other.__class__ is NotRule) and \
                (self.baseRule == other.baseRule)
 
+    def __hash__(self):
+        return hash(("NotRule", self.baseRule))
+
 
 class CompositeRule(RuleBase):
     def __init__(self, baseRules):
@@ -105,6 +236,12 @@ class CompositeRule(RuleBase):
         return issubclass(other.__class__, CompositeRule) and \
                (self.baseRules == other.baseRules)
 
+    def __hash__(self):
+        # Rules are not changed after creation, so the hash is computed once.
+        if not hasattr(self, "_hash"):
+            self._hash = hash((self.__class__.__name__, tuple(self.baseRules)))
+        return self._hash
+
 
 class AndRule(CompositeRule):
     def __init__(self, baseRules):
@@ -115,6 +252,13 @@ class AndRule(CompositeRule):
             if not rule.evaluate(actor): return False
         return True
 
+    def select(self, store):
+        mask = store.everyone()
+        for rule in self.baseRules:
+            if mask == 0: break
+            mask &= rule.select(store)
+        return mask
+
     def __eq__(self, other):
         return other.__class__ is AndRule and \
                CompositeRule.__eq__(self, other)
@@ -129,64 +273,270 @@ class OrRule(CompositeRule):
             if rule.evaluate(actor): return True
         return False
 
+    def select(self, store):
+        mask = 0
+        for rule in self.baseRules:
+            mask |= rule.select(store)
+        return mask
+
     def __eq__(self, other):
         return other.__class__ is OrRule and \
                CompositeRule.__eq__(self, other)
 
 
-class RuleParserError(Exception): pass
+class RuleCompiler:
+
+    """
+    RuleCompiler turns a rule tree into a single predicate function.
+
+    The rule is simplified first: nested And/Or rules are flattened, TrueRule
+    and FalseRule are folded, double negations and duplicate children are
+    removed, and the children are ordered so that the cheapest and the most
+    selective checks run first. Children of equal cost are ordered by hash,
+    so structurally equivalent rules simplify to equal canonical rules. The
+    result is then generated as one Python expression, so evaluating it
+    costs a single function call instead of a method call per node.
+    """
 
+    # Relative cost of evaluating a rule of each kind.
+    COSTS = {
+        TrueRule : 0,
+        FalseRule : 0,
+        NameRule : 1,
+        TagRule : 2,
+        AttributeRule : 3,
+    }
+
+    # Cost of a rule of unknown kind, that is evaluated by its own method.
+    UNKNOWN_COST = 10
+
+    # Subtrees nested deeper than this are compiled into separate functions,
+    # so the generated expression stays within the limits of Python parser.
+    MAX_DEPTH = 32
+
+    def cost(self, rule):
+        """Return the estimated cost of evaluating specified rule."""
+        if isinstance(rule, NotRule):
+            return self.cost(rule.baseRule) + 1
+        if isinstance(rule, CompositeRule):
+            return sum([self.cost(r) for r in rule.baseRules]) + 1
+        return self.COSTS.get(rule.__class__, self.UNKNOWN_COST)
+
+    def simplify(self, rule):
+        """Return the simplified rule that is equivalent to specified one."""
+        if rule.__class__ is NotRule:
+            return self.__simplifyNot(rule)
+        if rule.__class__ is AndRule:
+            return self.__simplifyComposite(rule, AndRule, FalseRule, TrueRule)
+        if rule.__class__ is OrRule:
+            return self.__simplifyComposite(rule, OrRule, TrueRule, FalseRule)
+        return rule
 
-class RuleParserContext:
+    def compile(self, rule, simplify = True):
+        """
+        Return the function of one argument equivalent to rule.evaluate().
+        If 'simplify' is False, the rule is compiled as is, so the children
+        of And/Or rules are checked in their order (see RulePlanner).
+        """
+        if simplify:
+            rule = self.simplify(rule)
+        return self.__compile(rule)
+
+    def __simplifyNot(self, rule):
+        base = self.simplify(rule.baseRule)
+        if base.__class__ is TrueRule:
+            return FalseRule()
+        if base.__class__ is FalseRule:
+            return TrueRule()
+        if base.__class__ is NotRule:
+            return base.baseRule
+        return NotRule(base)
+
+    def __simplifyComposite(self, rule, kind, absorbing, neutral):
+        children = []
+        pending = [self.simplify(r) for r in rule.baseRules]
+        pending.reverse()
+        while len(pending) > 0:
+            r = pending.pop()
+            if r.__class__ is kind:
+                pending.extend(reversed(r.baseRules))
+            elif r.__class__ is absorbing:
+                return absorbing()
+            elif r.__class__ is not neutral and r not in children:
+                children.append(r)
+        if len(children) == 0:
+            return neutral()
+        if len(children) == 1:
+            return children[0]
+        children.sort(key = lambda r: (self.cost(r), hash(r)))
+        return kind(children)
+
+    def __compile(self, rule):
+        constants = {}
+        expr = self.__expression(rule, constants, 0)
+        return eval("lambda actor: " + expr, constants)
+
+    def __constant(self, value, constants):
+        name = "_c%d" % len(constants)
+        constants[name] = value
+        return name
+
+    def __expression(self, rule, constants, depth):
+        if depth > self.MAX_DEPTH:
+            return "%s(actor)" % self.__constant(self.__compile(rule), constants)
+        if rule.__class__ is TrueRule:
+            return "True"
+        if rule.__class__ is FalseRule:
+            return "False"
+        if rule.__class__ is TagRule:
+            return "actor.isTaggedWith(%s)" % self.__constant(rule.tag, constants)
+        if rule.__class__ is NameRule:
+            return "%s == actor.name" % self.__constant(rule.name, constants)
+        if rule.__class__ is NotRule:
+            return "not (%s)" % self.__expression(rule.baseRule, constants, depth + 1)
+        if rule.__class__ in (AndRule, OrRule):
+            op = rule.__class__ is AndRule and " and " or " or "
+            return "(%s)" % op.join([self.__expression(r, constants, depth + 1)
+                                     for r in rule.baseRules])
+        return "%s(actor)" % self.__constant(rule.evaluate, constants)
+
+
+class RuleFormatter:
 
     """
-    RuleParserContext stores information about the current stage of string
-    parsing process.
+    Write rules to the string representation read by RuleParser. TrueRule
+    and FalseRule have no representation in the grammar, and are written
+    as TRUE and FALSE.
     """
 
-    def __init__(self, str, pos):
-        """Initialize RuleParserContext with string and starting position."""
-        self.str = str
-        self.pos = pos
-        self.hasErrors = False
-        self.error = ""
-        self.result = None
-        self.isDone = False
+    def write(self, rule):
+        """Write rule to string representation."""
+        if rule.__class__ is TrueRule:
+            return "TRUE"
+        if rule.__class__ is FalseRule:
+            return "FALSE"
+        if rule.__class__ is TagRule:
+            return rule.tag
+        if rule.__class__ is NameRule:
+            return "@" + rule.name
+        if rule.__class__ is AttributeRule:
+            return "%s%s%s" % (rule.attribute, rule.operator, rule.value)
+        if rule.__class__ is NotRule:
+            return "!" + self.write(rule.baseRule)
+        if rule.__class__ is AndRule:
+            return "(%s)" % ", ".join([self.write(r) for r in rule.baseRules])
+        if rule.__class__ is OrRule:
+            return "[%s]" % ", ".join([self.write(r) for r in rule.baseRules])
+        return repr(rule)
+
+
+class RuleFactory:
 
-    def getChar(self):
-        """Return the character at the current position of the string."""
-        return self.str[self.pos]
+    """
+    RuleFactory creates rules, returning the same instance for structurally
+    equal rules (hash-consing). A composite rule is looked up by the
+    identities of its children, which are shared instances themselves, so
+    the lookup does not walk the subtrees.
+
+    Sharing saves the memory of large fact libraries, where the same rules
+    are spelled by thousands of facts, and makes the rule objects good keys
+    for memoization by identity. The shared rules must not be changed.
+    Rules are held weakly, so the ones no longer used are forgotten.
+    """
 
-    def isEOL(self):
-        """
-        Return True if the current position is beyond the end of the line,
-        and False otherwise.
-        """
-        return (self.pos >= len(self.str))
+    def __init__(self):
+        """Initialize new empty instance of RuleFactory."""
+        self.rules = weakref.WeakValueDictionary()
+        self.shared = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self.rules)
+
+    def trueRule(self):
+        return self.__share(("TrueRule",), TrueRule)
+
+    def falseRule(self):
+        return self.__share(("FalseRule",), FalseRule)
+
+    def tagRule(self, tag):
+        return self.__share(("TagRule", tag), TagRule, tag)
+
+    def nameRule(self, name):
+        return self.__share(("NameRule", name), NameRule, name)
+
+    def attributeRule(self, attribute, operator, value):
+        key = ("AttributeRule", attribute, operator, attributeKey(value))
+        return self.__share(key, AttributeRule, attribute, operator, value)
+
+    def notRule(self, baseRule):
+        baseRule = self.intern(baseRule)
+        return self.__share(("NotRule", id(baseRule)), NotRule, baseRule)
+
+    def andRule(self, baseRules):
+        return self.__shareComposite(AndRule, baseRules)
+
+    def orRule(self, baseRules):
+        return self.__shareComposite(OrRule, baseRules)
+
+    def intern(self, rule):
+        """Return the shared instance of rule that is structurally equal to specified one."""
+        if self.shared.get(id(rule)) is rule:
+            return rule
+        if rule.__class__ is TrueRule:
+            return self.trueRule()
+        if rule.__class__ is FalseRule:
+            return self.falseRule()
+        if rule.__class__ is TagRule:
+            return self.tagRule(rule.tag)
+        if rule.__class__ is NameRule:
+            return self.nameRule(rule.name)
+        if rule.__class__ is AttributeRule:
+            return self.attributeRule(rule.attribute, rule.operator, rule.value)
+        if rule.__class__ is NotRule:
+            return self.notRule(rule.baseRule)
+        if rule.__class__ is AndRule:
+            return self.andRule(rule.baseRules)
+        if rule.__class__ is OrRule:
+            return self.orRule(rule.baseRules)
+        # Rules of unknown kind are shared by their own __eq__ and __hash__.
+        return self.__share(("RuleBase", rule), lambda: rule)
+
+    def __shareComposite(self, ruleClass, baseRules):
+        baseRules = [self.intern(r) for r in baseRules]
+        key = (ruleClass.__name__, tuple([id(r) for r in baseRules]))
+        return self.__share(key, ruleClass, baseRules)
+
+    def __share(self, key, ruleClass, *args):
+        # The entries whose keys refer to children by id are removed together
+        # with the parent rule, that keeps the children alive.
+        rule = self.rules.get(key)
+        if rule is None:
+            rule = ruleClass(*args)
+            rule = self.rules.setdefault(key, rule)
+            self.shared[id(rule)] = rule
+        return rule
 
-    def reportError(self, errorMsg):
-        """Set the context state as erroneous and break the parsing process."""
-        self.isDone = True
-        self.hasErrors = True
-        self.error = errorMsg
+# Factory of the rules read by RuleParser.
+factory = RuleFactory()
 
-    def moveNext(self):
-        """Move current context position to next character in string."""
-        self.moveBy(1)
 
-    def moveTo(self, newPos):
-        """Move current context position to specified position."""
-        self.pos = newPos
+class RuleParserError(Exception): pass
 
-    def moveBy(self, delta):
-        """Move current context position by specified delta."""
-        self.pos += delta
 
 class RuleParser:
     
     """
     RuleParser provides the ability to parse a string representation of rule
     into the rule object.
+
+    The string is split into tokens by a single regular expression: reserved
+    characters, and the text between them, which is a tag, a name or a
+    comparison. The tokens are then parsed with an explicit stack instead of
+    recursion. Rules are evaluated, compared and simplified recursively, so
+    the parser rejects rules nested deeper than MAX_DEPTH levels.
+
+    Rules are created by the RuleFactory, by default the shared one, so the
+    equal rules of all parsed strings are the same instances.
     """
 
     # List of recognized whitespace characters.
@@ -195,9 +545,30 @@ class RuleParser:
     # List of reserves characters in this grammar.
     RESERVED = [",", "[", "]", "(", ")", "!", "@"]
 
-    def __init__(self, ruleString):
+    # Whitespace, a reserved character, or the text up to the next reserved character.
+    TOKEN = re.compile("([%s]+)|([%s])|([^%s]+)" %
+                       ("".join(WHITESPACES), re.escape("".join(RESERVED)),
+                        re.escape("".join(RESERVED))))
+
+    # Comparison of attribute with value, e.g. "age >= 18".
+    COMPARISON = re.compile(r"^([^<>=]+?)\s*(<=|>=|=|<|>)\s*([^<>=]+)$")
+
+    # Characters of comparison operators.
+    OPERATOR_CHARS = re.compile(r"[<>=]")
+
+    # Maximum number of nested braces and negations.
+    MAX_DEPTH = 200
+
+    # Closing brace, factory method and rule kind for each opening brace.
+    BRACES = {
+        "(" : (")", RuleFactory.andRule, "And"),
+        "[" : ("]", RuleFactory.orRule, "Or"),
+    }
+
+    def __init__(self, ruleString, ruleFactory = None):
         """Initialize RuleParser instance with string representation of rule."""
         self.str = ruleString
+        self.factory = ruleFactory or factory
 
     def parse(self):
         """
@@ -206,144 +577,100 @@ class RuleParser:
         If the string is not a correct representation of rule, a RuleParserError
         is raised.
         """
-        ctx = RuleParserContext(self.str, 0)
-        rule = self.__parseRule(ctx)
-        self.__skipWhitespace(ctx)
-        if not ctx.isEOL():
-            raise RuleParserError, ("Unexpected characters found after the end "
-                                    "of the rule at %d") % ctx.pos
-        return rule
-
-    def __parseRule(self, ctx):
-        """
-        Parse one rule using specified parsing context and return rule instance.
-        """
-        self.__skipWhitespace(ctx)
-
-        if ctx.isEOL():
+        tokens = self.__tokenize()
+        # Each item is ["!", pos] for a negation, or [brace, pos, rules] for
+        # the And or Or rule that is not closed yet.
+        stack = []
+        i = 0
+        while True:
+            if i == len(tokens):
+                self.__failAtEOL(stack)
+            token, text, pos = tokens[i]
+            i += 1
+            if (token == "!" or token in self.BRACES) and len(stack) == self.MAX_DEPTH:
+                raise RuleParserError, ("Rule is nested deeper than %d levels at %d." %
+                                        (self.MAX_DEPTH, pos))
+            if token == "!":
+                stack.append(["!", pos])
+                continue
+            if token in self.BRACES:
+                closing, create, kind = self.BRACES[token]
+                if i < len(tokens) and tokens[i][0] == closing:
+                    raise RuleParserError, "Incorrect or empty %s rule definition." % kind
+                stack.append([token, pos, []])
+                continue
+            if token == "@":
+                if i == len(tokens):
+                    raise RuleParserError, ("Unexpected end of line met at %d."
+                                            % (len(self.str) - 1))
+                if tokens[i][0] != "text":
+                    raise RuleParserError, ("Empty textual field encountered at %d." %
+                                            tokens[i][2])
+                rule = self.factory.nameRule(tokens[i][1])
+                i += 1
+            elif token == "text":
+                rule = self.__parseAtom(text, pos)
+            else:
+                raise RuleParserError, ("Invalid rule format: unknown rule at %d." %
+                                        pos)
+
+            # Wrap the rule into the pending negations, and close the braces
+            # until a comma or the end of the rule is met.
+            while True:
+                while len(stack) > 0 and stack[-1][0] == "!":
+                    stack.pop()
+                    rule = self.factory.notRule(rule)
+                if len(stack) == 0:
+                    if i < len(tokens):
+                        raise RuleParserError, ("Unexpected characters found after the end "
+                                                "of the rule at %d") % tokens[i][2]
+                    return rule
+                brace, start, rules = stack[-1]
+                closing, create, kind = self.BRACES[brace]
+                rules.append(rule)
+                if i == len(tokens):
+                    self.__failAtEOL(stack)
+                token, text, pos = tokens[i]
+                i += 1
+                if token == ",":
+                    if i < len(tokens) and tokens[i][0] == closing:
+                        raise RuleParserError, ("Unexpected closing brace "
+                                                "encountered at %d." % tokens[i][2])
+                    break
+                if token != closing:
+                    raise RuleParserError, ("Expected ',' or '%s' at %d." %
+                                            (closing, pos))
+                stack.pop()
+                rule = create(self.factory, rules)
+
+    def __tokenize(self):
+        """Return the list of tokens (token, text, position); token is a reserved character or 'text'."""
+        tokens = []
+        for match in self.TOKEN.finditer(self.str):
+            if match.group(2) is not None:
+                tokens.append((match.group(2), None, match.start()))
+            elif match.group(3) is not None:
+                text = match.group(3).strip()
+                if len(text) == 0:
+                    raise RuleParserError, ("Empty textual field encountered at %d." %
+                                            match.end())
+                tokens.append(("text", text, match.start()))
+        return tokens
+
+    def __failAtEOL(self, stack):
+        if len(stack) == 0:
             raise RuleParserError, "End of line encountered before rule started"
-        elif ctx.getChar() == "@":
-            self.__parseName(ctx)
-        elif ctx.getChar() == "!":
-            self.__parseNot(ctx)
-        elif ctx.getChar() == "[":
-            self.__parseOr(ctx)
-        elif ctx.getChar() == "(":
-            self.__parseAnd(ctx)
-        elif self.__isTextChar(ctx.getChar()):
-            self.__parseTag(ctx)
-        else:
-            ctx.reportError("Invalid rule format: unknown rule at %d." %
-                            ctx.pos)
-
-        if ctx.hasErrors:
-            raise RuleParserError, ctx.error
-        else:
-            return ctx.result
-
-    def __isTextChar(self, ch):
-        """Return True, if specified character is a text character."""
-        return not ch in self.RESERVED
-
-    def __moveNext(self, ctx):
-        if not ctx.isEOL():
-            ctx.moveNext()
-            self.__skipWhitespace(ctx)
-
-    def __parseText(self, ctx):
-        """Parse the text value and return it as string."""
-        if ctx.isEOL():
-            raise RuleParserError, ("Unexpected end of line met at %d."
-                                    % (len(ctx.str) - 1))
-
-        start = ctx.pos
-        while (not ctx.isEOL()) and self.__isTextChar(ctx.getChar()):
-            ctx.moveNext()
-        result = ctx.str[start:ctx.pos].strip()
-        if len(result) == 0:
-            raise RuleParserError, ("Empty textual field encountered at %d." %
-                                    ctx.pos)
-        return result
-
-    def __parseTag(self, ctx):
-        """Parse the TagRule from string."""
-        ctx.result = TagRule(self.__parseText(ctx))
-
-    def __parseName(self, ctx):
-        """Parse the NameRule from string."""
-        # Skip the "@" character.
-        ctx.moveNext()
-        ctx.result = NameRule(self.__parseText(ctx))
-
-    def __parseNot(self, ctx):
-        """Parse the NotRule from string."""
-        # Skip the "!" character.
-        self.__moveNext(ctx)
-        if ctx.isEOL():
+        if stack[-1][0] == "!":
             raise RuleParserError, "Unexpected end of line met."
-        # Wrap the rule next to "!" into the NotRule.
-        ctx.result = NotRule(self.__parseRule(ctx))
-
-    def __parseAnd(self, ctx):
-        """Parse the AndRule from string."""
-        # Skip the "(".
-        self.__moveNext(ctx)
-        rules = []
-        while not ctx.isEOL() and ctx.getChar() != ")":
-            r = self.__parseRule(ctx)
-            rules.append(r)
-            # If the comma-separated list of rules isn't finished yet.
-            if not ctx.isEOL() and ctx.getChar() == ",":
-                # then move to the start of the next rule.
-                self.__moveNext(ctx)
-                if ctx.getChar() == ")":
-                    raise RuleParserError, ("Unexpected closing brace"
-                                            "encountered at %d." % ctx.pos)
-        
-        if ctx.isEOL():
-            raise RuleParserError, ("End of line is encountered before"
-                                   "closing brace.")
-
-        if ctx.getChar() == ")":
-            self.__moveNext(ctx)
-
-        if len(rules) == 0:
-            raise RuleParserError, "Incorrect or empty And rule definition."
-
-        ctx.result = AndRule(rules)
-
-    def __parseOr(self, ctx):
-        """Parse the OrRule from string."""
-        # Skip the "[".
-        self.__moveNext(ctx)
-        rules = []
-        while not ctx.isEOL() and (ctx.getChar() != "]"):
-            r = self.__parseRule(ctx)
-            rules.append(r)
-            # If the comma-separated list of rules isn't finished yet.
-            if not ctx.isEOL() and ctx.getChar() == ",":
-                # then move to the start of the next rule.
-                self.__moveNext(ctx)
-                if ctx.getChar() == "]":
-                    raise RuleParserError, ("Unexpected closing brace"
-                                            "encountered at %d." % ctx.pos)
-
-        if ctx.isEOL():
-            raise RuleParserError, ("End of line is encountered before"
-                                   "closing brace.")
-
-        if ctx.getChar() == "]":
-            self.__moveNext(ctx)
-
-        if len(rules) == 0:
-            raise RuleParserError, "Incorrect or empty Or rule definition. "
-
-        ctx.result = OrRule(rules)
-
-    def __skipWhitespace(self, ctx):
-        """
-        Skip the whitespace from current position to the first non-whitespace
-        symbol.
-        """
-        while not ctx.isEOL() and (ctx.getChar() in self.WHITESPACES):
-            ctx.moveNext()
\ No newline at end of file
+        raise RuleParserError, ("End of line is encountered before "
+                                "closing brace.")
+
+    def __parseAtom(self, text, pos):
+        """Parse the TagRule, or the AttributeRule if the text is a comparison."""
+        if self.OPERATOR_CHARS.search(text) is None:
+            return self.factory.tagRule(text)
+        match = self.COMPARISON.match(text)
+        if match is None:
+            raise RuleParserError, "Invalid comparison at %d." % pos
+        attribute, operator, value = match.groups()
+        return self.factory.attributeRule(attribute, operator, value)
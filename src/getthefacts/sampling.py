@@ -0,0 +1,59 @@
+# coding=UTF-8
+import random
+
+INFINITY = float("inf")
+
+class AliasTable:
+
+    """
+    Walker's alias table for sampling indexes with given weights in O(1).
+
+    The table is built by Vose's method in O(n). Index i is drawn with the
+    probability weights[i] / sum(weights). A table with no positive weights
+    is empty, and sample() returns None for it. Weights must be finite and
+    not negative; ValueError is raised otherwise.
+    """
+
+    def __init__(self, weights):
+        """Initialize new instance of AliasTable with the list of weights."""
+        for w in weights:
+            if not 0 <= w < INFINITY:
+                raise ValueError, "Invalid weight: %r" % w
+        n = len(weights)
+        total = float(sum(weights))
+        self.prob = [1.0] * n
+        self.alias = range(n)
+        if n == 0 or total <= 0:
+            self.size = 0
+            return
+        self.size = n
+        scaled = [w * n / total for w in weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while len(small) > 0 and len(large) > 0:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+
+    def __len__(self):
+        return self.size
+
+    def sample(self, rng = random):
+        """Return the random index, or None if the table is empty."""
+        if self.size == 0:
+            return None
+        i = int(rng.random() * self.size)
+        if rng.random() < self.prob[i]:
+            return i
+        return self.alias[i]
+
+
+def weightOf(item):
+    """Return the sampling weight of an actor or a fact; 1 unless specified."""
+    return float(getattr(item, "weight", 1))
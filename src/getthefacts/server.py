@@ -0,0 +1,317 @@
+# coding=UTF-8
+"""
+    Module: server.
+
+    Description:
+
+    This module serves the facts over a local TCP or Unix socket, so the store
+    is loaded once and many requests are answered by one long-running process.
+
+    The protocol is line based. Every request is one line:
+        say             a fact about a random actor;
+        say name        a fact about the named actor;
+        batch n [name]  n facts about random actors, or about the named actor;
+        quit            close the connection after answering the requests
+                        sent before.
+    Every response starts with the line "OK n", followed by n lines with the
+    facts encoded as JSON strings (facts may span several lines), or is
+    the single line "ERR message".
+
+    Clients may send many requests without waiting for the responses
+    (pipelining). The connections are handled by one asyncore event loop;
+    the facts are rendered by a pool of worker threads, and the responses
+    are sent in the order of requests, whatever order they are rendered in.
+
+    Threads of one process render the facts one at a time, so the server
+    may also fork several processes accepting the connections on the same
+    listening socket. The store is loaded and indexed, and the templates
+    are compiled, before forking, so the processes share them copy-on-write
+    instead of building their own.
+"""
+import os
+import gc
+import signal
+import random
+import json
+import socket
+import asyncore
+import asynchat
+import threading
+import Queue
+from multiprocessing.pool import ThreadPool
+from fact.choosers import RandomFactChooser, ActorBasedRandomFactChooser
+
+class FactService:
+
+    """
+    FactService answers the requests of the protocol from the loaded store.
+
+    Choosing the facts updates the caches of the store and the index, so it
+    is done by one thread at a time, holding the lock; rendering the chosen
+    facts, which takes most of the time, is done concurrently. Whoever
+    changes the store while it is served must hold the same lock.
+    """
+
+    # The largest number of facts returned by one batch request.
+    MAX_BATCH = 10000
+
+    def __init__(self, facts, actors, lock = None):
+        """Initialize new instance of FactService for the FactIndex and ActorStore."""
+        self.facts = facts
+        self.actors = actors
+        self.lock = lock or threading.Lock()
+
+    def prepare(self):
+        """
+        Build the indexes of the store and compile all templates ahead of the
+        requests. The compiled templates are kept with the templates, not in
+        the bounded cache, so none of them is compiled again after forking.
+        """
+        with self.lock:
+            self.facts.unsatisfiable()
+            self.facts.sample(random.Random())
+            for template in self.facts:
+                if hasattr(template, "keepCompiled"):
+                    template.keepCompiled()
+
+    def answer(self, request):
+        """Return the response to the request line, including the trailing newline."""
+        try:
+            facts = self.__render(self.__choose(request))
+        except ValueError, e:
+            return "ERR %s\n" % e
+        except Exception, e:
+            return "ERR Error occurred: %s\n" % e
+        lines = ["OK %d" % len(facts)] + [json.dumps(f) for f in facts]
+        return "\n".join(lines) + "\n"
+
+    def __choose(self, request):
+        words = request.split(None, 1)
+        command, argument = (words + ["", ""])[:2]
+        if command == "say":
+            count, name = 1, argument
+        elif command == "batch":
+            [count, name] = (argument.split(None, 1) + [""])[:2]
+            try:
+                count = int(count)
+            except ValueError:
+                raise ValueError, "Please specify the number of facts."
+            if not 0 <= count <= self.MAX_BATCH:
+                raise ValueError, "The number of facts must be from 0 to %d." % self.MAX_BATCH
+        else:
+            raise ValueError, "Unknown command: %s" % command
+        with self.lock:
+            if len(name) == 0:
+                chooser = RandomFactChooser(self.facts, self.actors)
+            else:
+                actor = self.actors.byName(name.decode("utf-8"))
+                if actor is None:
+                    raise ValueError, "Could not find %s." % name
+                chooser = ActorBasedRandomFactChooser(actor, self.facts, self.actors)
+            chosen = []
+            for i in xrange(count):
+                fact = chooser.bind()
+                if fact is None:
+                    break
+                chosen.append(fact)
+        return chosen
+
+    def __render(self, facts):
+        return [f.render() for f in facts]
+
+
+class FactChannel(asynchat.async_chat):
+
+    """Connection of one client. Requests are numbered, and answered in order."""
+
+    def __init__(self, server, sock):
+        asynchat.async_chat.__init__(self, sock, server.map)
+        self.server = server
+        self.set_terminator("\n")
+        self.buffer = []
+        self.requested = 0
+        self.sent = 0
+        self.ready = {}
+        self.quitting = False
+
+    def collect_incoming_data(self, data):
+        self.buffer.append(data)
+
+    def found_terminator(self):
+        request = "".join(self.buffer).strip()
+        self.buffer = []
+        if self.quitting or len(request) == 0:
+            return
+        if request == "quit":
+            self.quitting = True
+            self.flush()
+            return
+        self.server.submit(self, self.requested, request)
+        self.requested += 1
+
+    def completed(self, number, response):
+        """Keep the response to the request, and send the responses that are due."""
+        self.ready[number] = response
+        self.flush()
+
+    def flush(self):
+        while self.sent in self.ready:
+            self.push(self.ready.pop(self.sent))
+            self.sent += 1
+        if self.quitting and self.sent == self.requested:
+            self.close_when_done()
+
+    def handle_close(self):
+        self.close()
+
+
+class Waker(asyncore.file_dispatcher):
+
+    """Pipe that wakes up the event loop when the workers complete a request."""
+
+    def __init__(self, server):
+        self.reader, self.writer = os.pipe()
+        asyncore.file_dispatcher.__init__(self, self.reader, server.map)
+        self.server = server
+
+    def wake(self):
+        os.write(self.writer, "x")
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        self.recv(4096)
+        self.server.dispatch()
+
+    def close(self):
+        asyncore.file_dispatcher.close(self)
+        os.close(self.writer)
+
+
+class FactServer(asyncore.dispatcher):
+
+    """
+    FactServer listens on the address, which is either the pair (host, port)
+    for TCP, or the path of a Unix socket, and answers the requests of all
+    clients by FactService with a pool of 'workers' threads in every
+    process.
+    """
+
+    def __init__(self, service, address, workers = 4):
+        """Initialize new instance of FactServer and start listening on the address."""
+        self.map = {}
+        asyncore.dispatcher.__init__(self, map = self.map)
+        self.service = service
+        self.path = None
+        self.creator = os.getpid()
+        if isinstance(address, tuple):
+            self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.set_reuse_addr()
+        else:
+            if os.path.exists(address):
+                os.remove(address)
+            self.create_socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.path = address
+        self.bind(address)
+        self.listen(128)
+        self.address = self.socket.getsockname()
+        self.workers = workers
+        self.waker = None
+        self.running = True
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            FactChannel(self, pair[0])
+
+    def submit(self, channel, number, request):
+        """Answer the request of the channel on the worker pool."""
+        def done(response):
+            self.completed.put((channel, number, response))
+            self.waker.wake()
+        self.pool.apply_async(self.service.answer, (request,), callback = done)
+
+    def dispatch(self):
+        """Pass the responses completed by the workers to their channels."""
+        while True:
+            try:
+                channel, number, response = self.completed.get_nowait()
+            except Queue.Empty:
+                return
+            if channel.connected:
+                channel.completed(number, response)
+
+    def serve(self, timeout = 0.5):
+        """Run the event loop until the server is stopped."""
+        self.pool = ThreadPool(self.workers)
+        self.completed = Queue.Queue()
+        self.waker = Waker(self)
+        try:
+            while self.running:
+                asyncore.loop(timeout, True, self.map, 1)
+        finally:
+            for dispatcher in self.map.values():
+                dispatcher.close()
+            self.waker = None
+            self.pool.terminate()
+            self.pool.join()
+            self.__removeSocket()
+
+    def stop(self):
+        """Stop the server; it may be called from any thread."""
+        self.running = False
+        if self.waker is not None:
+            self.waker.wake()
+
+    def fork(self, processes):
+        """
+        Serve in specified number of child processes, sharing the listening
+        socket, until all of them exit or the parent is interrupted; then
+        stop the children. The thread pool and the event loop are created by
+        each child, after forking.
+        """
+        self.service.prepare()
+        gc.collect()
+        children = []
+        for i in xrange(processes):
+            pid = os.fork()
+            if pid == 0:
+                self.__serveChild()
+            children.append(pid)
+        try:
+            while len(children) > 0:
+                pid, status = os.wait()
+                children.remove(pid)
+        finally:
+            for pid in children:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            for pid in children:
+                try:
+                    os.waitpid(pid, 0)
+                except OSError:
+                    pass
+            self.close()
+            self.__removeSocket()
+
+    def __removeSocket(self):
+        """Remove the file of the Unix socket, in the process that created it."""
+        if self.path is not None and os.getpid() == self.creator:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+    def __serveChild(self):
+        """Serve in the child process until the parent stops it, and exit."""
+        # The parent is interrupted and stops the children with SIGTERM.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        try:
+            self.serve()
+        finally:
+            os._exit(0)
@@ -0,0 +1,142 @@
+# coding=UTF-8
+"""
+    Module: snapshot.
+
+    Description:
+
+    This module contains classes that write the loaded actors and Jinja facts
+    into a single snapshot file, and load them back without parsing JSON,
+    rules or templates.
+
+    The snapshot file consists of:
+        * the MAGIC line;
+        * the records of facts, one after another; each record is a pickled
+          pair of placeholder definitions (index, rule) and the marshalled
+          Python code compiled from the template;
+        * the pickled header: the source files with their modification times
+          and sizes, the interned tags, the actor records, and the file name,
+          offset and length of every fact record;
+        * the offset of the header, as 16 hexadecimal digits.
+
+    The file is memory-mapped when loaded, and only the header is read at
+    once. A fact record is read when the fact is used for the first time.
+"""
+import os
+import mmap
+import marshal
+import cPickle
+from actor import Actor
+from loaders import listDir
+from fact.jinja import PrecompiledFactTemplate
+
+MAGIC = "GTF snapshot 1\n"
+
+class SnapshotError(Exception): pass
+
+def sourcesOf(dirs):
+    """Return the dictionary {file name: (modification time, size)} for the files of directories."""
+    sources = {}
+    for d in dirs:
+        for fileName in listDir(d):
+            st = os.stat(fileName)
+            sources[fileName] = (st.st_mtime, st.st_size)
+    return sources
+
+class SnapshotWriter:
+
+    """Write actors and Jinja fact templates into the snapshot file."""
+
+    def write(self, fileName, actors, facts, sources):
+        """
+        Write the snapshot of actors and facts loaded from the sources, given
+        as returned by sourcesOf() before loading. The file is replaced only
+        when the snapshot is complete.
+        """
+        tags = []
+        tagIds = {}
+        actorRecords = []
+        for actor in actors:
+            attrs = dict(vars(actor))
+            ids = []
+            for tag in attrs.pop("tags", []):
+                if tag not in tagIds:
+                    tagIds[tag] = len(tags)
+                    tags.append(tag)
+                ids.append(tagIds[tag])
+            actorRecords.append((attrs, tuple(ids)))
+
+        tmpName = fileName + ".tmp"
+        f = open(tmpName, "wb")
+        try:
+            f.write(MAGIC)
+            factRecords = []
+            for template in facts:
+                code, placeholders = template.getCode()
+                record = cPickle.dumps(([(p.index, p.rule) for p in placeholders],
+                                        marshal.dumps(code)), 2)
+                factRecords.append((template.fileName, f.tell(), len(record)))
+                f.write(record)
+            header = {
+                "sources" : sources,
+                "tags" : tags,
+                "actors" : actorRecords,
+                "facts" : factRecords,
+            }
+            offset = f.tell()
+            cPickle.dump(header, f, 2)
+            f.write("%016x" % offset)
+        finally:
+            f.close()
+        os.rename(tmpName, fileName)
+
+class Snapshot:
+
+    """Snapshot file opened for reading."""
+
+    def __init__(self, fileName):
+        """Open the snapshot file and read its header."""
+        f = open(fileName, "rb")
+        try:
+            self.data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        finally:
+            f.close()
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise SnapshotError("%s is not a snapshot file." % fileName)
+        offset = int(self.data[-16:], 16)
+        self.header = cPickle.loads(self.data[offset:-16])
+
+    def isStale(self, dirs):
+        """Return True if the source directories have changed since the snapshot was written."""
+        return sourcesOf(dirs) != self.header["sources"]
+
+    def actors(self):
+        """Yield the actors of the snapshot."""
+        tags = self.header["tags"]
+        for attrs, ids in self.header["actors"]:
+            actor = Actor(None, [tags[i] for i in ids])
+            actor.__dict__.update(attrs)
+            yield actor
+
+    def facts(self):
+        """Return the list of fact templates of the snapshot."""
+        return [SnapshotFactTemplate(self, fileName, offset, length)
+                for fileName, offset, length in self.header["facts"]]
+
+    def record(self, offset, length):
+        """Return the fact record at specified position."""
+        return cPickle.loads(self.data[offset:offset + length])
+
+class SnapshotFactTemplate(PrecompiledFactTemplate):
+    """
+    Jinja fact template loaded from the snapshot. The placeholders and the
+    compiled code are read from the snapshot record on first use.
+    """
+
+    def __init__(self, snapshot, fileName, offset, length):
+        PrecompiledFactTemplate.__init__(self, fileName, None, None)
+        self.snapshot = snapshot
+        self.offset = offset
+        self.length = length
+
+    def getRecord(self):
+        return self.snapshot.record(self.offset, self.length)
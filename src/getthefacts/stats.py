@@ -0,0 +1,238 @@
+# coding=UTF-8
+"""
+    Module: stats.
+
+    Description:
+
+    This module measures where the time goes on the hot paths: choosing,
+    binding and rendering facts, selecting actors by rules, evaluating,
+    parsing and compiling rules and templates, and reading actors and facts.
+
+    Instrumentation is off by default and then costs nothing: the measured
+    methods are replaced by timing wrappers only while it is enabled, and
+    the original methods are put back when it is disabled. The wrappers
+    record the number of calls and the histogram of their durations. The
+    steps of the plans that select actors, and the compiled predicates of
+    placeholders are called very often, so only their calls are counted:
+    the steps per strategy (see Plan), and the predicates all together.
+
+    The statistics can be exported as JSON, or in the text format of
+    Prometheus (e.g. for the textfile collector of node_exporter).
+"""
+import os
+import time
+import json
+import bisect
+import functools
+import threading
+from rules import *
+from actor import ActorStore, ActorFormatter, ActorJsonFormatter
+from planner import Plan
+from parallel import ParallelLoader
+from fact import Fact, ActorPlaceholder
+from fact.simple import SimpleStringFactTemplate, SimpleStringFactFormatter
+from fact.jinja import JinjaFactTemplate, PrecompiledFactTemplate
+from fact.choosers import FactChooser, RandomFactChooser, ActorBasedRandomFactChooser
+from server import FactService
+
+class Histogram:
+
+    """Number, total and maximum duration of calls, and their distribution among the buckets."""
+
+    # Upper bounds of the buckets, in seconds; the last bucket is unbounded.
+    BOUNDS = [float("%ge%d" % (m, e)) for e in range(-6, 1) for m in (1, 2.5, 5)]
+
+    def __init__(self):
+        """Initialize new empty instance of Histogram."""
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(self.BOUNDS) + 1)
+
+    def add(self, seconds):
+        """Record the call that took specified number of seconds."""
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+
+    def quantile(self, q):
+        """
+        Return the estimate of the q-quantile of durations: the upper bound of
+        its bucket, but not more than the maximum; or None if there are no calls.
+        """
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n > 0 and seen >= rank:
+                return i < len(self.BOUNDS) and min(self.BOUNDS[i], self.max) or self.max
+        return None
+
+    def toDict(self):
+        return {"count" : self.count, "total" : self.total, "max" : self.max,
+                "buckets" : dict(zip([repr(b) for b in self.BOUNDS] + ["+Inf"], self.buckets))}
+
+
+class Statistics:
+
+    """Counters and histograms of durations, by metric name. Safe to update from several threads."""
+
+    def __init__(self):
+        """Initialize new empty instance of Statistics."""
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def count(self, name, n = 1):
+        """Add n to the counter with specified name."""
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def time(self, name, seconds):
+        """Record the call of specified name, that took specified number of seconds."""
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(seconds)
+
+    def reset(self):
+        """Forget all recorded values."""
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+
+    def toDict(self):
+        with self.lock:
+            return {"counters" : dict(self.counters),
+                    "timers" : dict([(name, h.toDict()) for name, h in self.histograms.iteritems()])}
+
+    def toJson(self):
+        return json.dumps(self.toDict(), indent = 2, sort_keys = True)
+
+    def toPrometheus(self, prefix = "gtf"):
+        """Return the statistics in the text exposition format of Prometheus."""
+        lines = []
+        with self.lock:
+            if len(self.counters) > 0:
+                lines.append("# TYPE %s_calls_total counter" % prefix)
+                for name in sorted(self.counters):
+                    lines.append('%s_calls_total{name="%s"} %d' % (prefix, name, self.counters[name]))
+            if len(self.histograms) > 0:
+                lines.append("# TYPE %s_duration_seconds histogram" % prefix)
+            for name in sorted(self.histograms):
+                h = self.histograms[name]
+                seen = 0
+                for bound, n in zip([repr(b) for b in h.BOUNDS] + ["+Inf"], h.buckets):
+                    seen += n
+                    lines.append('%s_duration_seconds_bucket{name="%s",le="%s"} %d' %
+                                 (prefix, name, bound, seen))
+                lines.append('%s_duration_seconds_sum{name="%s"} %r' % (prefix, name, h.total))
+                lines.append('%s_duration_seconds_count{name="%s"} %d' % (prefix, name, h.count))
+        return "\n".join(lines) + "\n"
+
+    def export(self, fileName, format = "json"):
+        """
+        Write the statistics in specified format ("json" or "prometheus") to
+        the file. The file is replaced at once, so readers never see it
+        half-written.
+        """
+        text = format == "prometheus" and self.toPrometheus() or self.toJson()
+        temporary = fileName + ".tmp"
+        f = open(temporary, "w")
+        try:
+            f.write(text)
+        finally:
+            f.close()
+        os.rename(temporary, fileName)
+
+
+def timed(function, statistics, name):
+    """Return the function that records the duration of every call of specified one."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        start = time.time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            statistics.time(name, time.time() - start)
+    return wrapper
+
+def counted(function, statistics, name):
+    """Return the function that counts the calls of specified one."""
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        statistics.count(name)
+        return function(*args, **kwargs)
+    return wrapper
+
+def countedByStrategy(function, statistics, name):
+    """Return the method of Plan that counts its calls per strategy of the plan."""
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        statistics.count("%s.%s" % (name, self.strategy))
+        return function(self, *args, **kwargs)
+    return wrapper
+
+def countedResult(prop, statistics, name):
+    """Return the property whose value, a function, counts its calls."""
+    return property(lambda self: counted(prop.fget(self), statistics, name), doc = prop.__doc__)
+
+
+class Instrumentation:
+
+    """
+    Instrumentation replaces the measured methods of the classes with the
+    wrappers recording into Statistics, and restores them.
+    """
+
+    # Metric name, wrapper, and the classes with the method.
+    TARGETS = [
+        ("request", timed, [(FactService, "answer")]),
+        ("choose", timed, [(FactChooser, "choose")]),
+        ("bind", timed, [(RandomFactChooser, "bind"), (ActorBasedRandomFactChooser, "bind")]),
+        ("render", timed, [(Fact, "render")]),
+        ("select", timed, [(ActorStore, "select")]),
+        ("parse.rule", timed, [(RuleParser, "parse")]),
+        ("compile.rule", timed, [(RuleCompiler, "compile")]),
+        ("parse.template", timed, [(SimpleStringFactTemplate, "__parse__"),
+                                   (JinjaFactTemplate, "__parse__"),
+                                   (PrecompiledFactTemplate, "__parse__")]),
+        ("compile.template", timed, [(JinjaFactTemplate, "__compile__"),
+                                     (PrecompiledFactTemplate, "__compile__")]),
+        ("load.actor", timed, [(ActorFormatter, "read"), (ActorJsonFormatter, "read")]),
+        ("load.fact", timed, [(SimpleStringFactFormatter, "read")]),
+        ("load.parallel", timed, [(ParallelLoader, "load")]),
+        ("plan", countedByStrategy, [(Plan, "select")]),
+        ("predicate", countedResult, [(ActorPlaceholder, "predicate")]),
+    ]
+
+    def __init__(self, statistics):
+        """Initialize new disabled instance of Instrumentation recording into Statistics."""
+        self.statistics = statistics
+        self.originals = []
+
+    def isEnabled(self):
+        return len(self.originals) > 0
+
+    def enable(self):
+        """Replace the measured methods with the wrappers, if not done yet."""
+        if self.isEnabled():
+            return
+        for name, wrap, methods in self.TARGETS:
+            for cls, method in methods:
+                original = cls.__dict__[method]
+                self.originals.append((cls, method, original))
+                setattr(cls, method, wrap(original, self.statistics, name))
+
+    def disable(self):
+        """Restore the original methods."""
+        for cls, method, original in reversed(self.originals):
+            setattr(cls, method, original)
+        self.originals = []
+
+
+statistics = Statistics()
+instrumentation = Instrumentation(statistics)
@@ -1,6 +1,8 @@
 # coding=UTF-8
 import unittest
 from getthefacts.actor import *
+from getthefacts.bitsets import countOf
+from getthefacts.rules import TagRule
 
 class ActorJsonFormatterTests(unittest.TestCase):
 	def testRead(self):
@@ -9,3 +11,101 @@ class ActorJsonFormatterTests(unittest.TestCase):
 		assert a.name == "Name"
 		assert a.tags == ["1", "2"]
 		assert a.age == "24"
+
+	def testTagWithComparisonOperatorIsRejected(self):
+		try:
+			ActorJsonFormatter().read('{"name":"Name", "tags":["a<b"]}')
+			assert False
+		except ValueError:
+			pass
+		try:
+			ActorFormatter().read("Name| x, age=3")
+			assert False
+		except ValueError:
+			pass
+
+class ActorStoreTests(unittest.TestCase):
+	def setUp(self):
+		self.bear = Actor("Baloo", ["bear", "big"])
+		self.toy = Actor("Winnie-The-Pooh", ["bear", "toy"])
+		self.bird = Actor("Zazu", ["bird"])
+		self.store = ActorStore([self.bear, self.toy, self.bird])
+
+	def testIdsAreAssignedInOrder(self):
+		assert self.store.idOf(self.bear) == 0
+		assert self.store.idOf(self.bird) == 2
+		assert self.store[1] is self.toy
+		assert len(self.store) == 3
+
+	def testTagged(self):
+		assert self.store.ids(self.store.tagged("bear")) == [0, 1]
+		assert self.store.tagged("fish") == 0
+
+	def testActorAddedAfterQuery(self):
+		assert self.store.ids(self.store.tagged("bird")) == [2]
+		fish = Actor("Nemo", ["fish", "bird"])
+		self.store.add(fish)
+		assert self.store.ids(self.store.tagged("bird")) == [2, 3]
+		assert self.store.ids(self.store.everyone()) == [0, 1, 2, 3]
+
+	def testRemove(self):
+		self.store.remove(self.toy)
+		assert len(self.store) == 2
+		assert self.store.ids(self.store.tagged("bear")) == [0]
+		assert list(self.store) == [self.bear, self.bird]
+		assert self.toy not in self.store
+
+	def testRetag(self):
+		assert self.store.find(TagRule("toy")) == [self.toy]
+		self.store.retag(self.bird, ["bird", "toy"])
+		assert self.store.find(TagRule("toy")) == [self.toy, self.bird]
+		assert self.store.tagCount("toy") == 2
+		self.store.retag(self.toy, ["bear"])
+		assert self.store.find(TagRule("toy")) == [self.bird]
+		assert self.store.tagCount("toy") == 1
+
+	def testRemoveClearsTagsTheActorWasAddedWith(self):
+		self.toy.tags.append("fish")
+		self.store.remove(self.toy)
+		assert self.store.find(TagRule("toy")) == []
+		assert self.store.tagCount("toy") == 0
+		assert self.store.tagCount("fish") == 0
+
+	def testMaskOfAndIdsOf(self):
+		ids = [0, 7, 8, 63, 64, 1000]
+		assert idsOf(maskOf(ids)) == ids
+		assert countOf(maskOf(ids)) == len(ids)
+		assert maskOf([]) == 0
+
+class ActorRegistryTests(unittest.TestCase):
+	def setUp(self):
+		self.bear = Actor("Baloo", ["bear"])
+		self.bear.aliases = ["Papa Bear"]
+		self.bird = Actor("Zazu", ["bird"])
+		self.store = ActorStore([self.bear, self.bird])
+
+	def testByName(self):
+		assert self.store.byName("Zazu") is self.bird
+		assert self.store.byName("Nemo") is None
+
+	def testByAliasAndCaseFoldedName(self):
+		assert self.store.byName("Papa Bear") is self.bear
+		assert self.store.byName("zazu") is self.bird
+		assert self.store.byName("papa bear") is self.bear
+
+	def testNamed(self):
+		assert self.store.ids(self.store.named("Baloo")) == [0]
+		assert self.store.named("baloo") == 0
+
+	def testDuplicatesResolveToFirst(self):
+		other = Actor("Zazu", ["bird", "big"])
+		self.store.add(other)
+		assert self.store.registry.duplicates() == ["Zazu"]
+		assert self.store.byName("Zazu") is self.bird
+		assert self.store.ids(self.store.named("Zazu")) == [1, 2]
+
+	def testRemove(self):
+		self.store.remove(self.bear)
+		assert self.store.byName("Baloo") is None
+		assert self.store.byName("Papa Bear") is None
+		assert self.store.registry.named("Baloo") == []
@@ -0,0 +1,54 @@
+# coding=UTF-8
+import unittest
+from getthefacts.fact.assignment import ActorAssigner
+from getthefacts.fact.index import FactIndex
+from getthefacts.fact.jinja import JinjaFactTemplate
+from getthefacts.actor import Actor, ActorStore
+
+class ActorAssignerTests(unittest.TestCase):
+    def setUp(self):
+        # Every actor satisfies two of three placeholders below, so a greedy
+        # choice for the first placeholder can starve the last one.
+        self.actors = [Actor("One", ["a", "c"]), Actor("Two", ["a", "b"]),
+                       Actor("Three", ["b", "c"])]
+        self.store = ActorStore(self.actors)
+        self.assigner = ActorAssigner(self.store)
+        self.template = JinjaFactTemplate(
+            '{% actor "x", "a" %}{% actor "y", "b" %}{% actor "z", "c" %}'
+            '{{ x.name }} {{ y.name }} {{ z.name }}')
+
+    def testAssignmentNeverFails(self):
+        for i in range(100):
+            fact = self.template.buildup()
+            assert self.assigner.assign(fact, set())
+            assert fact.ready()
+            assert len(set([a.name for a in fact.actors])) == 3
+
+    def testAssignmentWithActorNeverFails(self):
+        for i in range(100):
+            fact = self.template.buildup()
+            assert self.assigner.assignWith(fact, self.actors[0])
+            assert self.actors[0] in fact.actors
+            assert len(set([a.name for a in fact.actors])) == 3
+
+    def testIsSatisfiable(self):
+        assert self.assigner.isSatisfiable(self.template)
+        assert self.assigner.isSatisfiable(self.template, self.actors[1])
+        t = JinjaFactTemplate('{% actor "x", "a" %}{% actor "y", "a" %}{% actor "z", "a" %}')
+        assert not self.assigner.isSatisfiable(t)
+        t = JinjaFactTemplate('{% actor "x", "b" %}{% actor "y", "@Two" %}')
+        assert self.assigner.isSatisfiable(t)
+        assert self.assigner.isSatisfiable(t, self.actors[1])
+        assert not self.assigner.isSatisfiable(t, self.actors[0])
+        t = JinjaFactTemplate('{% actor "x", "@Two" %}{% actor "y", "(a, b)" %}')
+        assert not self.assigner.isSatisfiable(t)
+
+    def testUnsatisfiableFactsAreReportedAndSkipped(self):
+        t = JinjaFactTemplate('{% actor "x", "@Two" %}{% actor "y", "@Two" %}')
+        index = FactIndex([t, self.template], self.store)
+        assert index.unsatisfiable() == [0]
+        for i in range(20):
+            assert index.sample() is self.template
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+# coding=UTF-8
+import unittest
+from getthefacts.cache import LruCache
+
+class LruCacheTests(unittest.TestCase):
+    def testGetAndPut(self):
+        c = LruCache(2)
+        c.put("a", 1)
+        assert c.get("a") == 1
+        assert c.get("b") is None
+        assert c.get("b", 0) == 0
+
+    def testLeastRecentlyUsedIsForgotten(self):
+        c = LruCache(2)
+        c.put("a", 1)
+        c.put("b", 2)
+        c.get("a")
+        c.put("c", 3)
+        assert "a" in c
+        assert "b" not in c
+        assert len(c) == 2
+
+    def testClear(self):
+        c = LruCache(2)
+        c.put("a", 1)
+        c.clear()
+        assert len(c) == 0
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,10 @@
 # coding=UTF-8
 import unittest
-from getthefacts.fact.choosers import RandomFactChooser
+import threading
+from getthefacts.fact.choosers import RandomFactChooser, ActorBasedRandomFactChooser, generate
 from getthefacts.fact.simple import SimpleStringFactTemplate
-from getthefacts.actor import Actor
+from getthefacts.actor import Actor, ActorStore
+from getthefacts.cache import LruCache
 
 class RandomFactChooserTests(unittest.TestCase):
 	def testSingleFactIsChosen(self):
@@ -43,3 +45,60 @@ class RandomFactChooserTests(unittest.TestCase):
 		chooser = RandomFactChooser([template], [actor])
 		c = chooser.choose()
 		assert c is None
+
+class ActorBasedRandomFactChooserTests(unittest.TestCase):
+	def testFactAboutActorIsChosen(self):
+		templates = [SimpleStringFactTemplate("%s is out there.|truth"),
+		             SimpleStringFactTemplate("%s is a lie.|lie")]
+		truth = Actor("The truth", ["truth"])
+		lie = Actor("The lie", ["lie"])
+		chooser = ActorBasedRandomFactChooser(lie, templates, [truth, lie])
+		assert chooser.choose() == "The lie is a lie."
+
+	def testNoApplicableFactRendersNone(self):
+		template = SimpleStringFactTemplate("%s is out there.|truth")
+		actor = Actor("The lie", ["lie"])
+		chooser = ActorBasedRandomFactChooser(actor, [template], [actor])
+		assert chooser.choose() is None
+
+class ConcurrentChooseTests(unittest.TestCase):
+	def testConcurrentChoose(self):
+		actors = ActorStore([Actor("Actor%d" % i, ["t%d" % (i % 5), "t%d" % (i % 3)]) for i in range(20)])
+		actors.cache = LruCache(2)
+		actors.samplers = LruCache(2)
+		templates = [SimpleStringFactTemplate("%%s is %d.|[t%d, !t%d]" % (i, i % 5, i % 3)) for i in range(30)]
+		chooser = RandomFactChooser(templates, actors)
+		errors = []
+		def choose(n):
+			try:
+				for i in range(300):
+					assert chooser.choose() is not None
+					assert ActorBasedRandomFactChooser(actors[(n + i) % 20], chooser.facts, actors).choose() is not None
+			except Exception, e:
+				errors.append(e)
+		threads = [threading.Thread(target = choose, args = (n,)) for n in range(8)]
+		for t in threads: t.start()
+		for t in threads: t.join()
+		assert errors == []
+
+class GenerateTests(unittest.TestCase):
+	def setUp(self):
+		self.templates = [SimpleStringFactTemplate("%s is out there."),
+		                  SimpleStringFactTemplate("%s is a lie.|lie")]
+		self.actors = [Actor("The truth"), Actor("The lie", ["lie"])]
+
+	def testGeneratesRequestedNumberOfFacts(self):
+		facts = list(generate(self.templates, self.actors, 10))
+		assert len(facts) == 10
+
+	def testGeneratesFactsAboutActor(self):
+		for fact in generate(self.templates, self.actors, 10, self.actors[0]):
+			assert fact == "The truth is out there."
+
+	def testSeedMakesBatchReproducible(self):
+		first = list(generate(self.templates, self.actors, 20, seed = 5))
+		second = list(generate(self.templates, self.actors, 20, seed = 5))
+		assert first == second
+
+	def testStopsWhenNoFactCanBeChosen(self):
+		assert list(generate([], self.actors, 10)) == []
@@ -0,0 +1,109 @@
+# coding=UTF-8
+import unittest
+from getthefacts.actor import Actor, ActorStore
+from getthefacts.columns import ActorTable, ActorView
+from getthefacts.rules import TagRule, NameRule, NotRule, AttributeRule, RuleCompiler
+
+class ActorTableTests(unittest.TestCase):
+    def setUp(self):
+        self.bear = Actor("Baloo", ["bear", "big"])
+        self.bear.age = "25"
+        self.bird = Actor("Zazu", ["bird"])
+        self.table = ActorTable()
+        self.table.append(self.bear)
+        self.table.append(self.bird)
+
+    def testView(self):
+        view = self.table[0]
+        assert view.name == "Baloo"
+        assert view.tags == ["bear", "big"]
+        assert view.isTaggedWith("big")
+        assert not view.isTaggedWith("bird")
+        assert view.isTaggedWithAny(["fish", "bear"])
+        assert view.hasTags()
+        assert view.age == "25"
+        assert view == self.table[0]
+        assert view != self.table[1]
+
+    def testMissingAttribute(self):
+        assert not hasattr(self.table[1], "age")
+        assert getattr(self.table[1], "weight", 1) == 1
+        self.table[1].weight = 3
+        assert self.table[1].weight == 3
+
+    def testAttributesNamedAsSlots(self):
+        self.bird.id = "Z-1"
+        self.bird.table = "round"
+        self.table.append(self.bird)
+        assert self.table[2].id == "Z-1"
+        assert self.table[2].table == "round"
+        assert not hasattr(self.table[0], "id")
+
+    def testValuesAreInterned(self):
+        other = Actor("Bagheera", ["big"])
+        other.age = "2" + "5"
+        self.table.append(other)
+        assert self.table[2].age is self.table[0].age
+
+    def testRemove(self):
+        self.table[0] = None
+        assert self.table[0] is None
+        assert not self.table.isLive(0)
+        assert [a.name for a in self.table if a is not None] == ["Zazu"]
+
+class ColumnarActorStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.actors = [Actor("Baloo", ["bear", "big"]),
+                       Actor("Winnie-The-Pooh", ["bear", "toy"]),
+                       Actor("Zazu", ["bird"])]
+        self.store = ActorStore(self.actors, columnar = True)
+
+    def names(self, actors):
+        return [a.name for a in actors]
+
+    def testSelect(self):
+        assert self.names(self.store.find(TagRule("bear"))) == ["Baloo", "Winnie-The-Pooh"]
+        assert self.names(self.store.find(NotRule(TagRule("bear")))) == ["Zazu"]
+        assert self.names(self.store.find(NameRule("Zazu"))) == ["Zazu"]
+
+    def testCompiledRule(self):
+        predicate = RuleCompiler().compile(NotRule(TagRule("toy")))
+        assert [predicate(a) for a in self.store] == [True, False, True]
+
+    def testIdsOfViews(self):
+        zazu = self.store.byName("Zazu")
+        assert isinstance(zazu, ActorView)
+        assert self.store.idOf(zazu) == 2
+        assert zazu in self.store
+        assert self.store.idOf(self.actors[2]) is None
+
+    def testRowOfRemovedActorIsReused(self):
+        for i in range(10):
+            self.store.remove(self.store.byName("Zazu"))
+            assert self.store.add(Actor("Zazu", ["bird", "t%d" % i])) == 2
+        assert len(self.store.actors) == 3
+        assert self.store.byName("Zazu").tags == ["bird", "t9"]
+        assert self.names(self.store.find(TagRule("bear"))) == ["Baloo", "Winnie-The-Pooh"]
+        assert self.names(self.store.find(TagRule("t9"))) == ["Zazu"]
+        assert len(self.store.actors.tagData) <= 10
+
+    def testRetag(self):
+        self.store.retag(self.store.byName("Zazu"), ["bird", "toy"])
+        assert self.names(self.store.find(TagRule("toy"))) == ["Winnie-The-Pooh", "Zazu"]
+        assert self.store.byName("Zazu").tags == ["bird", "toy"]
+        assert self.store.tagCount("toy") == 2
+
+    def testAttributeNamedId(self):
+        actor = Actor("Bagheera", ["cat"])
+        actor.id = "B-1"
+        self.store.add(actor)
+        assert self.names(self.store.find(AttributeRule("id", "=", "B-1"))) == ["Bagheera"]
+
+    def testRemove(self):
+        self.store.remove(self.store[1])
+        assert len(self.store) == 2
+        assert self.names(self.store.find(TagRule("bear"))) == ["Baloo"]
+        assert self.store.byName("Winnie-The-Pooh") is None
+
+if __name__ == "__main__":
+    unittest.main()
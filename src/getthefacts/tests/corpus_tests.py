@@ -0,0 +1,43 @@
+# coding=UTF-8
+import shutil
+import tempfile
+import unittest
+from getthefacts.corpus import CorpusGenerator
+from getthefacts.loaders import readDir
+from getthefacts.actor import ActorJsonFormatter
+from getthefacts.rules import RuleParser
+from getthefacts.fact.jinja import JinjaFactTemplate, JinjaFactFormatter
+
+class CorpusGeneratorTests(unittest.TestCase):
+    def testSameSeedGivesSameCorpus(self):
+        first, second = CorpusGenerator(7), CorpusGenerator(7)
+        assert [vars(a) for a in first.actors(20)] == [vars(a) for a in second.actors(20)]
+        assert first.facts(5, 3, 2) == second.facts(5, 3, 2)
+
+    def testActorsHaveDistinctTags(self):
+        for actor in CorpusGenerator(tags = 5).actors(10, 4):
+            assert len(set(actor.tags)) == 4
+            assert 1 <= actor.age <= 100
+
+    def testRulesAreParsed(self):
+        generator = CorpusGenerator()
+        for depth in range(4):
+            RuleParser(generator.rule(depth)).parse()
+
+    def testFactsHavePlaceholders(self):
+        for fact in CorpusGenerator().facts(5, 2, 3):
+            assert len(JinjaFactTemplate(fact).getActorPlaceholders()) == 3
+
+    def testWrittenCorpusIsRead(self):
+        generator = CorpusGenerator()
+        actors, facts = generator.actors(10), generator.facts(4)
+        actorsDir, factsDir = tempfile.mkdtemp(), tempfile.mkdtemp()
+        try:
+            generator.write(actorsDir, factsDir, actors, facts)
+            read = list(readDir(actorsDir, ActorJsonFormatter()))
+            templates = list(readDir(factsDir, JinjaFactFormatter()))
+        finally:
+            shutil.rmtree(actorsDir)
+            shutil.rmtree(factsDir)
+        assert [vars(a) for a in read] == [vars(a) for a in actors]
+        assert [t.getSource() for t in templates] == facts
@@ -0,0 +1,88 @@
+# coding=UTF-8
+import unittest
+from getthefacts.fact import FactFormatError
+from getthefacts.fact.index import FactIndex
+from getthefacts.fact.simple import SimpleStringFactTemplate
+from getthefacts.actor import Actor, ActorStore
+
+class CountingTemplate(SimpleStringFactTemplate):
+    def __init__(self, factString):
+        SimpleStringFactTemplate.__init__(self, factString)
+        self.parses = 0
+
+    def __parse__(self):
+        self.parses += 1
+        return SimpleStringFactTemplate.__parse__(self)
+
+class FactIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.bear = Actor("Baloo", ["bear", "big"])
+        self.bird = Actor("Zazu", ["bird"])
+        self.store = ActorStore([self.bear, self.bird])
+        self.facts = [SimpleStringFactTemplate("%s is big.|big"),
+                      SimpleStringFactTemplate("%s can fly.|bird"),
+                      SimpleStringFactTemplate("%s is here.")]
+        self.index = FactIndex(self.facts, self.store)
+
+    def testBehavesAsList(self):
+        assert len(self.index) == 3
+        assert self.index[1] is self.facts[1]
+        assert list(self.index) == self.facts
+
+    def testApplicableTo(self):
+        assert self.index.applicableTo(self.bear) == [0, 2]
+        assert self.index.applicableTo(self.bird) == [1, 2]
+
+    def testAddedFactIsIndexed(self):
+        assert self.index.applicableTo(self.bear) == [0, 2]
+        self.index.add(SimpleStringFactTemplate("%s is a bear.|bear"))
+        assert self.index.applicableTo(self.bear) == [0, 2, 3]
+        assert self.index.applicableTo(self.bird) == [1, 2]
+
+    def testAddedActorIsIndexed(self):
+        fish = Actor("Nemo", ["fish", "big"])
+        self.store.add(fish)
+        assert self.index.applicableTo(fish) == [0, 2]
+
+    def testRemovedActorIsForgotten(self):
+        assert self.index.applicableTo(self.bird) == [1, 2]
+        self.store.remove(self.bird)
+        self.bird.tags = ["big"]
+        self.store.add(self.bird)
+        assert self.index.applicableTo(self.bird) == [0, 2]
+
+    def testFactWithSeveralMatchingPlaceholdersIsListedOnce(self):
+        index = FactIndex([SimpleStringFactTemplate("%s is big.|big"),
+                           SimpleStringFactTemplate("%s is big.|big")], self.store)
+        assert index.applicableTo(self.bear) == [0, 1]
+        assert index.applicableTo(self.bird) == []
+
+    def testSampleForFollowsWeights(self):
+        self.index.setWeight(2, 0)
+        for i in range(50):
+            assert self.index.sampleFor(self.bear) is self.facts[0]
+        self.index.setWeight(0, 0)
+        assert self.index.sampleFor(self.bear) is None
+
+    def testDecay(self):
+        self.index.setWeight(1, 4)
+        self.index.decay(0.5)
+        assert self.facts[0].weight == 0.5
+        assert self.facts[1].weight == 2
+
+    def testTemplateThatFailsToParseIsParsedOnce(self):
+        broken = CountingTemplate("%s is [big.|big")
+        index = FactIndex([broken, self.facts[2]], self.store)
+        for i in range(20):
+            assert index.sample() is self.facts[2]
+        assert index.applicableTo(self.bear) == [1]
+        assert index.unsatisfiable() == [0]
+        self.store.add(Actor("Nemo", ["fish"]))
+        assert index.sample() is self.facts[2]
+        assert broken.parses == 1
+        assert isinstance(index.errors[0], FactFormatError)
+        index.remove(broken)
+        assert index.errors == {}
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,35 +1,63 @@
 # coding=UTF-8
 import unittest
-from getthefacts.fact import Fact
-from getthefacts.fact.simple import SimpleStringFactFormatter
+import threading
+from getthefacts.fact.simple import SimpleStringFactFormatter, SimpleStringFactTemplate
 from getthefacts.actor import Actor
 from getthefacts.rules import AndRule, TagRule, TrueRule
 
 class FactTests(unittest.TestCase):
     def testDefaultFactIsApplicableToAll(self):
-        fact = SimpleStringFactFormatter().read("%s is a word.")
+        fact = SimpleStringFactFormatter().read("%s is a word.").buildup()
         assert fact.isApplicableTo("Anything")
 
     def testGetFactAbout(self):
-        fact = SimpleStringFactFormatter().read("%s is a word.")
+        fact = SimpleStringFactFormatter().read("%s is a word.").buildup()
         factString = fact.getFactAbout(Actor("Book"))
         assert factString == "Book is a word."
 
     def testFactWithNoActorsIsReady(self):
-        fact = SimpleStringFactFormatter().read("Word is a word.")
+        fact = SimpleStringFactFormatter().read("Word is a word.").buildup()
         assert fact.ready()
 
+    def testFactsFromSameTemplateAreBoundSeparately(self):
+        template = SimpleStringFactTemplate("%s is a word.")
+        f1 = template.buildup()
+        f2 = template.buildup()
+        f1.bind(0, Actor("Book"))
+        assert f1.ready()
+        assert not f2.ready()
+        f2.bind(0, Actor("Pen"))
+        assert f1.render() == "Book is a word."
+        assert f2.render() == "Pen is a word."
+
+    def testConcurrentRendering(self):
+        template = SimpleStringFactTemplate("%s is a word.")
+        errors = []
+        def render(name):
+            for i in range(200):
+                fact = template.buildup()
+                fact.bind(0, Actor(name))
+                if fact.render() != name + " is a word.":
+                    errors.append(name)
+        threads = [threading.Thread(target = render, args = ("Word%d" % i,))
+                   for i in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        assert errors == []
+
 class FactFormatterTests(unittest.TestCase):
     def testRead(self):
         f = SimpleStringFactFormatter()
-        fact = f.read("%s is a big tree.| (big, tree)")
-        assert fact.__class__ is Fact
+        template = f.read("%s is a big tree.| (big, tree)")
+        assert template.__class__ is SimpleStringFactTemplate
+        assert not template.__parsed__
+        fact = template.buildup()
         assert fact.template.format == "%s is a big tree."
         assert fact.actorPlaceholders[0].rule == AndRule([TagRule("big"), TagRule("tree")])
 
     def testReadWithNoRules(self):
         f = SimpleStringFactFormatter()
-        fact = f.read("%s is a word.")
+        fact = f.read("%s is a word.").buildup()
         assert fact.actorPlaceholders[0].rule == TrueRule()
 
 
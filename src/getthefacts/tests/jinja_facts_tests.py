@@ -1,6 +1,9 @@
 # coding=UTF-8
+import os
+import tempfile
 import unittest
-from getthefacts.fact.jinja import ActorExtension, JinjaFactTemplate
+from getthefacts.fact import FactFormatError
+from getthefacts.fact.jinja import ActorExtension, JinjaFactTemplate, JinjaFactFormatter
 from getthefacts.actor import Actor
 from getthefacts.rules import *
 from jinja2 import Environment
@@ -51,4 +54,47 @@ class JinjaFactTemplateTests(unittest.TestCase):
         a = Actor("Ernest Hemingway", ["old", "beard"])
         r = f.getFactAbout(a)
         print r
-        assert r.strip() == "Ernest Hemingway was old and had a huge beard, but still he's a genius!"
\ No newline at end of file
+        assert r.strip() == "Ernest Hemingway was old and had a huge beard, but still he's a genius!"
+
+    def testTemplateIsCompiledOnce(self):
+        t = JinjaFactTemplate('{% actor "user", "human" %}Hello, {{ user.name }}!')
+        f1 = t.buildup()
+        f2 = t.buildup()
+        assert t.getTemplate() is t.getTemplate()
+        assert f1.actorPlaceholders is f2.actorPlaceholders
+        assert f1.getFactAbout(Actor("John", ["human"])) == "Hello, John!"
+        assert not f2.ready()
+
+    def testTemplatesDoNotShareActors(self):
+        t1 = JinjaFactTemplate('{% actor "a", "old" %}{{ a.name }}')
+        t2 = JinjaFactTemplate('{% actor "b", "young" %}{% actor "c" %}{{ b.name }}')
+        assert len(t1.buildup().actorPlaceholders) == 1
+        f2 = t2.buildup()
+        assert [p.index for p in f2.actorPlaceholders] == ["b", "c"]
+        assert f2.actorPlaceholders[0].rule == TagRule("young")
+
+    def testTemplateFromFile(self):
+        fd, fileName = tempfile.mkstemp()
+        os.write(fd, '{% actor "user", "human" %}Hello, {{ user.name }}!')
+        os.close(fd)
+        try:
+            t = JinjaFactFormatter().readFile(fileName)
+            f = t.buildup()
+            assert f.actorPlaceholders[0].rule == TagRule("human")
+            assert f.getFactAbout(Actor("John", ["human"])) == "Hello, John!"
+        finally:
+            os.remove(fileName)
+
+    def testFileChangedAfterParsing(self):
+        fd, fileName = tempfile.mkstemp()
+        os.write(fd, '{% actor "user", "human" %}Hello, {{ user.name }}!')
+        os.close(fd)
+        try:
+            t = JinjaFactFormatter().readFile(fileName)
+            f = t.buildup()
+            open(fileName, "w").write('{% actor "person", "human" %}Hi, {{ person.name }}!')
+            self.assertRaises(FactFormatError, f.getFactAbout, Actor("John", ["human"]))
+            open(fileName, "w").write('{% actor "user", "human" %}Hi, {{ user.name }}!')
+            assert f.getFactAbout(Actor("John", ["human"])) == "Hi, John!"
+        finally:
+            os.remove(fileName)
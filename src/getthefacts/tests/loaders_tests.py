@@ -0,0 +1,222 @@
+# coding=UTF-8
+import os
+import shutil
+import tempfile
+import unittest
+from getthefacts.loaders import readLines, readDir, DirectoryReloader, splitRecords
+from getthefacts.actor import ActorFormatter, ActorJsonFormatter, ActorStore
+from getthefacts.fact.jinja import JinjaFactFormatter
+from getthefacts.fact.simple import SimpleStringFactTemplate, SimpleStringFactFormatter
+from getthefacts.fact.index import FactIndex
+from getthefacts.actor import Actor
+from getthefacts.rules import TagRule
+
+class LoadersTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content):
+        fileName = os.path.join(self.dir, name)
+        f = open(fileName, "w")
+        f.write(content)
+        f.close()
+        return fileName
+
+    def testReadLines(self):
+        fileName = self.write("actors.txt", "# comment\nBaloo| bear, big\n\nZazu\n")
+        actors = readLines(fileName, ActorFormatter())
+        assert not isinstance(actors, list)
+        actors = list(actors)
+        assert [a.name for a in actors] == ["Baloo", "Zazu"]
+        assert actors[0].tags == ["bear", "big"]
+
+    def testReadDir(self):
+        self.write("b.json", '{"name":"Zazu"}')
+        self.write("a.json", '{"name":"Baloo", "tags":["bear"]}')
+        self.write("c.json", '{"tags":["nameless"]}')
+        actors = list(readDir(self.dir, ActorJsonFormatter()))
+        assert [a.name for a in actors] == ["Baloo", "Zazu"]
+
+    def testReadDirDefersReadingFacts(self):
+        fileName = self.write("fact.txt", "{% actor 'a' %}{{ a.name }}")
+        facts = list(readDir(self.dir, JinjaFactFormatter()))
+        assert facts[0].fileName == fileName
+        assert facts[0].factString is None
+
+    def testErrorsAreCollected(self):
+        self.write("a.json", '{"name":"Baloo"}')
+        broken = self.write("b.json", '{"name":')
+        errors = []
+        actors = list(readDir(self.dir, ActorJsonFormatter(), errors))
+        assert len(actors) == 1
+        assert len(errors) == 1
+        assert errors[0][0] == broken
+
+    def testErrorsAreRaised(self):
+        self.write("b.json", '{"name":')
+        self.assertRaises(ValueError, list, readDir(self.dir, ActorJsonFormatter()))
+
+class ContainerTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content):
+        fileName = os.path.join(self.dir, name)
+        f = open(fileName, "w")
+        f.write(content)
+        f.close()
+        return fileName
+
+    def testSplitRecords(self):
+        data = "-----\nfirst\n-----\n\nsecond\nline\n------  \n-----\nthird"
+        assert list(splitRecords(data)) == [(2, "first"), (5, "second\nline"), (9, "third")]
+        assert list(splitRecords("")) == []
+        assert list(splitRecords("single\n- not a separator")) == [(1, "single\n- not a separator")]
+
+    def testReadDirWithContainers(self):
+        self.write("a.json", '{"name":"Baloo"}')
+        self.write("b.gtf", '-----\n{"name":"Zazu"}\n-----\n{"name":"Nemo"}\n-----\n')
+        self.write("empty.gtf", '')
+        actors = list(readDir(self.dir, ActorJsonFormatter()))
+        assert [a.name for a in actors] == ["Baloo", "Zazu", "Nemo"]
+
+    def testJinjaRecords(self):
+        fileName = self.write("facts.gtf", "{% actor 'a' %}Hi, {{ a.name }}!\n-----\n"
+                                           "{% actor 'a' %}Bye, {{ a.name }}!\n")
+        facts = list(readDir(self.dir, JinjaFactFormatter()))
+        assert [f.fileName for f in facts] == [fileName + ":1", fileName + ":3"]
+        assert facts[1].buildup().getFactAbout(Actor("Baloo")) == "Bye, Baloo!"
+
+    def testErrorsHaveRecordOrigin(self):
+        fileName = self.write("actors.gtf", '{"name":"Baloo"}\n-----\n{"name":\n')
+        errors = []
+        actors = list(readDir(self.dir, ActorJsonFormatter(), errors))
+        assert len(actors) == 1
+        assert errors[0][0] == fileName + ":3"
+
+    def testMultilineSimpleFacts(self):
+        self.write("facts.gtf", "-----\n$1 is a tree,\nand a big one.\n-\n$1: (tree, big)\n"
+                                "-----\n$1 is a word.\n-----\n")
+        facts = [t.buildup() for t in readDir(self.dir, SimpleStringFactFormatter())]
+        assert facts[0].getFactAbout(Actor("Oak")) == "Oak is a tree,\nand a big one."
+        assert facts[0].isApplicableTo(Actor("Oak", ["tree", "big"]))
+        assert not facts[0].isApplicableTo(Actor("Oak", ["tree"]))
+        assert facts[1].getFactAbout(Actor("Book")) == "Book is a word."
+
+    def testReloadContainer(self):
+        self.write("a.gtf", '{"name":"Baloo"}\n-----\n{"name":"Zazu"}')
+        reloader = DirectoryReloader(self.dir, ActorJsonFormatter())
+        store = ActorStore(reloader.load())
+        assert len(store) == 2
+        fileName = self.write("a.gtf", '{"name":"Baloo"}\n-----\n{"name":"Nemo"}\n-----\n{"name":"Kaa"}')
+        os.utime(fileName, (1, 1))
+        assert reloader.reload(store) == (0, 1, 0)
+        assert sorted([a.name for a in store]) == ["Baloo", "Kaa", "Nemo"]
+
+class DirectoryReloaderTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.write("a.json", '{"name":"Baloo", "tags":["bear"]}')
+        self.write("b.json", '{"name":"Zazu", "tags":["bird"]}')
+        self.reloader = DirectoryReloader(self.dir, ActorJsonFormatter())
+        self.store = ActorStore(self.reloader.load())
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content, mtime = None):
+        fileName = os.path.join(self.dir, name)
+        f = open(fileName, "w")
+        f.write(content)
+        f.close()
+        if mtime is not None:
+            os.utime(fileName, (mtime, mtime))
+
+    def names(self):
+        return sorted([a.name for a in self.store])
+
+    def testNothingChanged(self):
+        assert self.reloader.reload(self.store) == (0, 0, 0)
+        assert self.names() == ["Baloo", "Zazu"]
+
+    def testAddedChangedAndRemoved(self):
+        self.write("a.json", '{"name":"Baloo", "tags":["bear", "big"]}', 1)
+        self.write("c.json", '{"name":"Nemo", "tags":["fish"]}')
+        os.remove(os.path.join(self.dir, "b.json"))
+        assert self.reloader.reload(self.store) == (1, 1, 1)
+        assert self.names() == ["Baloo", "Nemo"]
+        assert self.store.find(TagRule("big"))[0].name == "Baloo"
+        assert self.store.find(TagRule("bird")) == []
+
+    def testTouchedFileWithSameContentIsNotReparsed(self):
+        self.write("a.json", '{"name":"Baloo", "tags":["bear"]}', 1)
+        assert self.reloader.reload(self.store) == (0, 1, 0)
+        self.write("a.json", '{"name":"Baloo", "tags":["bear"]}', 2)
+        assert self.reloader.reload(self.store) == (0, 0, 0)
+
+    def testRepeatedReloadsReuseIds(self):
+        for i in range(20):
+            self.write("a.json", '{"name":"Baloo", "tags":["bear", "t%d"]}' % i, i + 1)
+            assert self.reloader.reload(self.store) == (0, 1, 0)
+        assert len(self.store.actors) == 2
+        assert [a.name for a in self.store.find(TagRule("t19"))] == ["Baloo"]
+        assert self.store.find(TagRule("t18")) == []
+
+class FactIndexReloadTests(unittest.TestCase):
+    def testRemovedFactIsNotApplicable(self):
+        store = ActorStore([Actor("Baloo", ["bear"])])
+        big = SimpleStringFactTemplate("%s is big.|bear")
+        small = SimpleStringFactTemplate("%s is small.|bear")
+        index = FactIndex([big, small], store)
+        assert index.applicableTo(store[0]) == [0, 1]
+        index.remove(big)
+        assert index.applicableTo(store[0]) == [1]
+        assert len(index) == 1
+        assert list(index) == [small]
+        for i in range(10):
+            assert index.sample() is small
+
+    def testIdOfRemovedFactIsReused(self):
+        store = ActorStore([Actor("Baloo", ["bear"]), Actor("Zazu", ["bird"])])
+        facts = [SimpleStringFactTemplate("%s is big.|bear"),
+                 SimpleStringFactTemplate("%s flies.|bird")]
+        index = FactIndex(facts, store)
+        assert index.applicableTo(store[0]) == [0]
+        for i in range(5):
+            index.remove(facts[0])
+            facts[0] = SimpleStringFactTemplate("%s is a bird too.|bird")
+            assert index.add(facts[0]) == 0
+        assert len(index.facts) == 2
+        assert index.applicableTo(store[0]) == []
+        assert index.applicableTo(store[1]) == [0, 1]
+
+    def testReloadFactWithPlaceholdersOfSameRule(self):
+        dir = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(dir, "met.txt")
+            f = open(fileName, "w")
+            f.write("{% actor 'a' %}{% actor 'b' %}{{ a.name }} met {{ b.name }}.")
+            f.close()
+            reloader = DirectoryReloader(dir, JinjaFactFormatter())
+            store = ActorStore([Actor("Baloo", ["bear"]), Actor("Zazu", ["bird"])])
+            index = FactIndex(reloader.load(), store)
+            assert index.applicableTo(store[0]) == [0]
+            f = open(fileName, "w")
+            f.write("{% actor 'a' %}{% actor 'b' %}{{ b.name }} met {{ a.name }}.")
+            f.close()
+            os.utime(fileName, (1, 1))
+            assert reloader.reload(index) == (0, 1, 0)
+            assert len(index) == 1
+            assert index.applicableTo(store[1]) == [0]
+            assert index.sample().getSource() == "{% actor 'a' %}{% actor 'b' %}{{ b.name }} met {{ a.name }}."
+        finally:
+            shutil.rmtree(dir)
+
+if __name__ == "__main__":
+    unittest.main()
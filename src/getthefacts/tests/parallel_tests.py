@@ -0,0 +1,57 @@
+# coding=UTF-8
+import os
+import shutil
+import tempfile
+import unittest
+from getthefacts.parallel import ParallelLoader
+from getthefacts.actor import Actor
+from getthefacts.rules import TagRule
+
+class ParallelLoaderTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.actorsDir = os.path.join(self.dir, "actors")
+        self.factsDir = os.path.join(self.dir, "facts")
+        os.mkdir(self.actorsDir)
+        os.mkdir(self.factsDir)
+        for i in range(10):
+            self.write(self.actorsDir, "a%02d.json" % i, '{"name":"Actor %d", "tags":["t%d"]}' % (i, i))
+            self.write(self.factsDir, "f%02d.txt" % i, '{%% actor "a", "t%d" %%}Fact %d about {{ a.name }}' % (i, i))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, d, name, content):
+        f = open(os.path.join(d, name), "w")
+        f.write(content)
+        f.close()
+
+    def testLoadIsOrderedByFileName(self):
+        actors, facts, errors = ParallelLoader(3).load(self.actorsDir, self.factsDir)
+        assert errors == []
+        assert [a.name for a in actors] == ["Actor %d" % i for i in range(10)]
+        assert actors[3].tags == ["t3"]
+        assert len(facts) == 10
+        f = facts[7].buildup()
+        assert f.actorPlaceholders[0].rule == TagRule("t7")
+        assert f.getFactAbout(Actor("Baloo")) == "Fact 7 about Baloo"
+
+    def testErrorsAreAggregated(self):
+        self.write(self.actorsDir, "broken.json", '{"name":')
+        self.write(self.factsDir, "broken.txt", '{% actor "a", "(t1" %}')
+        actors, facts, errors = ParallelLoader(2).load(self.actorsDir, self.factsDir)
+        assert len(actors) == 10
+        assert len(facts) == 10
+        assert [os.path.basename(f) for f, e in errors] == ["broken.json", "broken.txt"]
+
+    def testContainers(self):
+        self.write(self.actorsDir, "more.gtf", '{"name":"Baloo"}\n-----\n{"name":"Zazu"}')
+        self.write(self.factsDir, "more.gtf", '{% actor "a" %}One\n-----\n{% actor "a", "(t1" %}')
+        actors, facts, errors = ParallelLoader(2).load(self.actorsDir, self.factsDir)
+        assert [a.name for a in actors][-2:] == ["Baloo", "Zazu"]
+        assert len(facts) == 11
+        assert facts[-1].fileName.endswith("more.gtf:1")
+        assert [os.path.basename(f) for f, e in errors] == ["more.gtf:3"]
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+# coding=UTF-8
+import unittest
+from getthefacts.actor import Actor, ActorStore
+from getthefacts.rules import *
+
+class RulePlannerTests(unittest.TestCase):
+    def setUp(self):
+        self.actors = []
+        for i in range(200):
+            a = Actor("Animal %d" % i, ["animal"] + (i % 2 and ["big"] or []))
+            a.age = i % 20
+            self.actors.append(a)
+        self.actors.append(Actor("Baloo", ["animal", "bear"]))
+        self.store = ActorStore(self.actors)
+        self.planner = self.store.planner
+
+    def assertSelectsAsEvaluate(self, rule):
+        expected = [a for a in self.actors if rule.evaluate(a)]
+        assert self.store.find(rule) == expected
+
+    def testStatistics(self):
+        assert self.store.tagCount("animal") == 201
+        assert self.store.tagCount("big") == 100
+        assert self.store.tagCount("fish") == 0
+        self.store.remove(self.actors[-1])
+        assert self.store.tagCount("bear") == 0
+
+    def testSelectivity(self):
+        assert self.planner.selectivity(TagRule("animal")) == 1.0
+        assert self.planner.selectivity(NameRule("Baloo")) == 1.0 / 201
+        assert self.planner.selectivity(NotRule(TagRule("animal"))) == 0.0
+        assert self.planner.selectivity(AttributeRule("age", "<", "2")) == 20.0 / 201
+
+    def testSelectiveChildIsPlannedFirst(self):
+        plan = self.planner.plan(AndRule([TagRule("animal"), NameRule("Baloo")]))
+        assert plan.children[0].rule == NameRule("Baloo")
+
+    def testFilterAfterSelectiveChild(self):
+        plan = self.planner.plan(AndRule([TagRule("animal"), NotRule(TagRule("big")),
+                                          NameRule("Baloo")]))
+        assert plan.strategy == "filter"
+        assert plan.children[0].rule == NameRule("Baloo")
+        assert plan.children[1].strategy == "check"
+
+    def testOrder(self):
+        rule = self.planner.order(OrRule([TagRule("bear"), TagRule("animal")]))
+        assert rule.baseRules[0] == TagRule("animal")
+        rule = self.planner.order(AndRule([TagRule("animal"), TagRule("bear")]))
+        assert rule.baseRules[0] == TagRule("bear")
+
+    def testPlansSelectAsEvaluate(self):
+        self.assertSelectsAsEvaluate(AndRule([TagRule("animal"), NameRule("Baloo")]))
+        self.assertSelectsAsEvaluate(AndRule([TagRule("big"), NotRule(NameRule("Animal 1"))]))
+        self.assertSelectsAsEvaluate(AndRule([AttributeRule("age", "=", "3"),
+                                              OrRule([TagRule("big"), TagRule("bear")])]))
+        self.assertSelectsAsEvaluate(OrRule([NameRule("Baloo"), AndRule([TagRule("big"),
+                                             AttributeRule("age", ">", "17")])]))
+
+    def testDescribe(self):
+        lines = self.planner.plan(AndRule([TagRule("big"), NameRule("Baloo")])).describe()
+        assert lines[0].startswith("and ") or lines[0].startswith("filter ")
+        assert lines[1].strip().endswith("@Baloo")
+
+class RuleFormatterTests(unittest.TestCase):
+    def testWrite(self):
+        s = "([animal, bird, @Nemo], !big, age>=18)"
+        assert RuleFormatter().write(RuleParser(s).parse()) == s
+
+if __name__ == "__main__":
+    unittest.main()
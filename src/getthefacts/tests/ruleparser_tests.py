@@ -1,5 +1,6 @@
 # coding=UTF-8
 from getthefacts.rules import *
+from getthefacts.actor import Actor
 import unittest
 
 class NameRuleParserTests(unittest.TestCase):
@@ -124,6 +125,74 @@ class OrRuleParserTests(unittest.TestCase):
                                         TagRule("big")])])
 
 
+class AttributeRuleParserTests(unittest.TestCase):
+    def testParse(self):
+        assert RuleParser("age>18").parse() == AttributeRule("age", ">", "18")
+        assert RuleParser("weight<=5").parse() == AttributeRule("weight", "<=", "5")
+        assert RuleParser("species=cat").parse() == AttributeRule("species", "=", "cat")
+
+    def testParseWhitespace(self):
+        assert RuleParser(" age >= 18 ").parse() == AttributeRule("age", ">=", "18")
+
+    def testParseEmbedded(self):
+        rule = RuleParser("(human, age>=18, !species=cat)").parse()
+        assert rule == AndRule([TagRule("human"),
+                                AttributeRule("age", ">=", "18"),
+                                NotRule(AttributeRule("species", "=", "cat"))])
+
+    def testFailIfInvalidComparison(self):
+        self.assertRaises(RuleParserError, RuleParser("age>").parse)
+        self.assertRaises(RuleParserError, RuleParser("=18").parse)
+        self.assertRaises(RuleParserError, RuleParser("age=>18").parse)
+        self.assertRaises(RuleParserError, RuleParser("(tag1, a<b<c)").parse)
+
+class LongRuleParserTests(unittest.TestCase):
+    def testParseDeeplyNested(self):
+        depth = RuleParser.MAX_DEPTH / 2
+        rule = RuleParser("!" * depth + "(" * depth + "tag1" + ")" * depth).parse()
+        hash(rule)
+        assert RuleCompiler().simplify(rule) == TagRule("tag1")
+        assert rule.evaluate(Actor("Baloo", ["tag1"]))
+        assert RuleCompiler().compile(rule)(Actor("Baloo", ["tag1"]))
+        for i in range(depth):
+            assert rule.__class__ is NotRule
+            rule = rule.baseRule
+        for i in range(depth):
+            assert rule.__class__ is AndRule and len(rule.baseRules) == 1
+            rule = rule.baseRules[0]
+        assert rule == TagRule("tag1")
+
+    def testFailIfNestedTooDeep(self):
+        depth = RuleParser.MAX_DEPTH
+        RuleParser("(" * depth + "tag1" + ")" * depth).parse()
+        try:
+            RuleParser("!" + "(" * depth + "tag1" + ")" * depth).parse()
+            assert False
+        except RuleParserError, e:
+            assert str(e) == "Rule is nested deeper than %d levels at %d." % (depth, depth)
+        self.assertRaises(RuleParserError, RuleParser("!" * 5000 + "tag1").parse)
+
+    def testParseLong(self):
+        tags = ["tag%d" % i for i in range(5000)]
+        rule = RuleParser("[" + ", ".join(tags) + "]").parse()
+        assert rule == OrRule([TagRule(t) for t in tags])
+
+class ErrorPositionTests(unittest.TestCase):
+    def assertFailsAt(self, ruleString, pos):
+        try:
+            RuleParser(ruleString).parse()
+        except RuleParserError, e:
+            assert str(e).rstrip(".").endswith(" %d" % pos), str(e)
+        else:
+            self.fail("RuleParserError is not raised")
+
+    def testPositions(self):
+        self.assertFailsAt("tag1, tag2", 4)
+        self.assertFailsAt("(tag1, ]", 7)
+        self.assertFailsAt("(tag1,)", 6)
+        self.assertFailsAt("[tag1)", 5)
+        self.assertFailsAt("(tag1, a<)", 7)
+
 class InvalidInputTests(unittest.TestCase):
     
     def testIfStartsWithInvalidSymbol(self):
@@ -123,6 +123,218 @@ class OrRuleTests(unittest.TestCase):
         assert OrRule([TrueRule(), TrueRule()]) != AndRule([TrueRule(), TrueRule()])
         assert OrRule([TrueRule(), TrueRule()]) != TrueRule()
 
+class SelectTests(unittest.TestCase):
+    def setUp(self):
+        self.actors = [Actor("Baloo", ["bear", "big"]),
+                       Actor("Winnie-The-Pooh", ["bear", "toy"]),
+                       Actor("Zazu", ["bird"]),
+                       Actor("Nemo", ["fish"])]
+        self.store = ActorStore(self.actors)
+
+    def assertSelectsAsEvaluate(self, rule):
+        expected = [a for a in self.actors if rule.evaluate(a)]
+        assert self.store.find(rule) == expected
+
+    def testSelect(self):
+        self.assertSelectsAsEvaluate(TrueRule())
+        self.assertSelectsAsEvaluate(FalseRule())
+        self.assertSelectsAsEvaluate(TagRule("bear"))
+        self.assertSelectsAsEvaluate(TagRule("unknown"))
+        self.assertSelectsAsEvaluate(NameRule("Zazu"))
+        self.assertSelectsAsEvaluate(NotRule(TagRule("bear")))
+        self.assertSelectsAsEvaluate(AndRule([TagRule("bear"), NotRule(TagRule("toy"))]))
+        self.assertSelectsAsEvaluate(OrRule([TagRule("fish"), NameRule("Baloo")]))
+        self.assertSelectsAsEvaluate(NotRule(OrRule([TagRule("fish"),
+                                                     AndRule([TagRule("bear"), TagRule("big")])])))
+
+    def testNameRuleResolve(self):
+        assert NameRule("Zazu").resolve(self.store) == 2
+        assert NameRule("zazu").resolve(self.store) is None
+
+class AttributeRuleTests(unittest.TestCase):
+    def setUp(self):
+        self.actors = [Actor("Baloo", ["bear"]),
+                       Actor("Zazu", ["bird"]),
+                       Actor("Tom", ["cat"]),
+                       Actor("Nemo", ["fish"])]
+        self.actors[0].age = "25"
+        self.actors[1].age = 7
+        self.actors[2].age = "18"
+        self.actors[2].species = "cat"
+        self.actors[3].species = "fish"
+        self.store = ActorStore(self.actors)
+
+    def names(self, rule):
+        return [a.name for a in self.store.find(rule)]
+
+    def testEvaluate(self):
+        assert AttributeRule("age", ">", "18").evaluate(self.actors[0])
+        assert not AttributeRule("age", ">", "18").evaluate(self.actors[2])
+        assert AttributeRule("age", ">=", "18").evaluate(self.actors[2])
+        assert AttributeRule("age", "<", "10").evaluate(self.actors[1])
+        assert not AttributeRule("age", "<", "10").evaluate(self.actors[3])
+        assert AttributeRule("species", "=", "cat").evaluate(self.actors[2])
+        assert not AttributeRule("species", ">", "10").evaluate(self.actors[2])
+
+    def testSelect(self):
+        assert self.names(AttributeRule("age", ">", "18")) == ["Baloo"]
+        assert self.names(AttributeRule("age", ">=", "18")) == ["Baloo", "Tom"]
+        assert self.names(AttributeRule("age", "<=", "18")) == ["Zazu", "Tom"]
+        assert self.names(AttributeRule("age", "=", "7")) == ["Zazu"]
+        assert self.names(AttributeRule("species", "=", "cat")) == ["Tom"]
+        assert self.names(AttributeRule("species", ">", "cat")) == ["Nemo"]
+        assert self.names(AttributeRule("species", "<", "100")) == []
+        assert self.names(NotRule(AttributeRule("species", "=", "cat"))) == ["Baloo", "Zazu", "Nemo"]
+
+    def testSelectsAsEvaluate(self):
+        for operator in AttributeRule.OPERATORS:
+            for value in ["0", "7", "18", "20", "cat", "dog"]:
+                for attribute in ["age", "species", "weight"]:
+                    rule = AttributeRule(attribute, operator, value)
+                    expected = [a for a in self.actors if rule.evaluate(a)]
+                    assert self.store.find(rule) == expected
+
+    def testIndexIsRebuiltAfterChange(self):
+        assert self.names(AttributeRule("age", ">", "18")) == ["Baloo"]
+        old = Actor("Kaa", ["snake"])
+        old.age = "100"
+        self.store.add(old)
+        assert self.names(AttributeRule("age", ">", "18")) == ["Baloo", "Kaa"]
+        self.store.setWeight(old, 5)
+        assert self.names(AttributeRule("weight", "<=", "5")) == ["Kaa"]
+
+    def testBooleans(self):
+        self.actors[0].tame = True
+        self.actors[1].tame = False
+        self.actors[2].tame = 1
+        assert self.names(AttributeRule("tame", "=", "true")) == ["Baloo"]
+        assert self.names(AttributeRule("tame", "=", "False")) == ["Zazu"]
+        assert self.names(AttributeRule("tame", "=", "1")) == ["Tom"]
+        assert AttributeRule("tame", "=", "true").evaluate(self.actors[0])
+        assert not AttributeRule("tame", "=", "1").evaluate(self.actors[0])
+
+    def testEquality(self):
+        assert AttributeRule("age", ">", "18") == AttributeRule("age", ">", "18.0")
+        assert AttributeRule("age", ">", "18") != AttributeRule("age", ">=", "18")
+        assert hash(AttributeRule("age", "=", "1")) == hash(AttributeRule("age", "=", "1"))
+
+class RuleFactoryTests(unittest.TestCase):
+    def setUp(self):
+        self.factory = RuleFactory()
+
+    def testEqualRulesAreShared(self):
+        f = self.factory
+        assert f.tagRule("big") is f.tagRule("big")
+        assert f.tagRule("big") is not f.tagRule("small")
+        assert f.notRule(f.tagRule("big")) is f.notRule(TagRule("big"))
+        assert f.andRule([TagRule("a"), NameRule("b")]) is \
+               f.andRule([f.tagRule("a"), f.nameRule("b")])
+        assert f.andRule([TagRule("a")]) is not f.orRule([TagRule("a")])
+        assert f.attributeRule("age", ">", "18") is f.attributeRule("age", ">", "18.0")
+
+    def testIntern(self):
+        rule = OrRule([AndRule([TagRule("bear"), NotRule(TagRule("toy"))]), NameRule("Nemo")])
+        shared = self.factory.intern(rule)
+        assert shared == rule
+        assert shared is self.factory.intern(rule)
+        assert shared.baseRules[0].baseRules[1].baseRule is self.factory.tagRule("toy")
+
+    def testParsedRulesAreShared(self):
+        a = RuleParser("([bird, fish], !big)", self.factory).parse()
+        b = RuleParser("([bird, fish],!big)", self.factory).parse()
+        c = RuleParser("[bird, fish]", self.factory).parse()
+        assert a is b
+        assert a.baseRules[0] is c
+
+    def testUnusedRulesAreForgotten(self):
+        rule = self.factory.andRule([TagRule("a"), TagRule("b")])
+        assert len(self.factory) == 3
+        del rule
+        assert len(self.factory) == 0
+
+class RuleCompilerTests(unittest.TestCase):
+    def setUp(self):
+        self.actors = [Actor("Baloo", ["bear", "big"]),
+                       Actor("Winnie-The-Pooh", ["bear", "toy"]),
+                       Actor("Zazu", ["bird"]),
+                       Actor("Nemo", ["fish"])]
+
+    def assertCompilesAsEvaluate(self, rule):
+        predicate = RuleCompiler().compile(rule)
+        for a in self.actors:
+            assert predicate(a) == rule.evaluate(a)
+
+    def testCompile(self):
+        self.assertCompilesAsEvaluate(TrueRule())
+        self.assertCompilesAsEvaluate(FalseRule())
+        self.assertCompilesAsEvaluate(TagRule("bear"))
+        self.assertCompilesAsEvaluate(NameRule("Zazu"))
+        self.assertCompilesAsEvaluate(NotRule(NotRule(TagRule("bear"))))
+        self.assertCompilesAsEvaluate(AndRule([TagRule("bear"), NotRule(TagRule("toy"))]))
+        self.assertCompilesAsEvaluate(OrRule([TagRule("fish"), NameRule("Baloo"),
+                                              AndRule([FalseRule(), TagRule("bird")])]))
+        self.assertCompilesAsEvaluate(RuleParser("[(bear, !toy), [bird, @Nemo]]").parse())
+
+    def testCompileDeepRule(self):
+        rule = TagRule("bear")
+        for i in range(60):
+            rule = OrRule([NotRule(AndRule([rule, TagRule("x%d" % i)])), TagRule("fish")])
+        self.assertCompilesAsEvaluate(rule)
+
+    def testSimplifyFlattensAndFolds(self):
+        c = RuleCompiler()
+        rule = c.simplify(AndRule([TagRule("a"), AndRule([TrueRule(), TagRule("b")])]))
+        assert rule.__class__ is AndRule
+        assert sorted([r.tag for r in rule.baseRules]) == ["a", "b"]
+        assert c.simplify(OrRule([TagRule("a"), NotRule(FalseRule())])) == TrueRule()
+        assert c.simplify(AndRule([TagRule("a"), TagRule("a")])) == TagRule("a")
+        assert c.simplify(NotRule(NotRule(TagRule("a")))) == TagRule("a")
+
+    def testSimplifyPutsCheapRulesFirst(self):
+        rule = RuleCompiler().simplify(AndRule([NotRule(TagRule("a")), TagRule("b"), NameRule("c")]))
+        assert rule == AndRule([NameRule("c"), TagRule("b"), NotRule(TagRule("a"))])
+
+class HashTests(unittest.TestCase):
+    def testEqualRulesHaveEqualHashes(self):
+        assert hash(TagRule("a")) == hash(TagRule("a"))
+        assert hash(NameRule("a")) == hash(NameRule("a"))
+        assert hash(NotRule(TrueRule())) == hash(NotRule(TrueRule()))
+        assert hash(AndRule([TagRule("a"), NameRule("b")])) == \
+               hash(AndRule([TagRule("a"), NameRule("b")]))
+
+    def testRulesAsKeys(self):
+        d = {RuleParser("([bird, fish], !big)").parse() : 1}
+        assert d[AndRule([OrRule([TagRule("bird"), TagRule("fish")]),
+                          NotRule(TagRule("big"))])] == 1
+        assert TagRule("a") not in {TagRule("b") : 1}
+
+    def testSimplifiedRulesAreCanonical(self):
+        c = RuleCompiler()
+        assert c.simplify(RuleParser("(a, b, !c)").parse()) == \
+               c.simplify(RuleParser("(!c, (b, a))").parse())
+        assert c.simplify(RuleParser("[a, b]").parse()) == \
+               c.simplify(RuleParser("[b, a, b]").parse())
+
+class CountingRule(TagRule):
+    def __init__(self, tag):
+        TagRule.__init__(self, tag)
+        self.selected = 0
+
+    def select(self, store):
+        self.selected += 1
+        return TagRule.select(self, store)
+
+class SelectCacheTests(unittest.TestCase):
+    def testRuleIsSelectedOncePerPopulation(self):
+        store = ActorStore([Actor("Baloo", ["bear", "big"]), Actor("Zazu", ["bird"])])
+        counting = CountingRule("bear")
+        assert store.ids(store.select(AndRule([counting, TagRule("big")]))) == [0]
+        assert store.ids(store.select(AndRule([TagRule("big"), counting]))) == [0]
+        assert counting.selected == 1
+        store.add(Actor("Bagheera", ["big"]))
+        assert store.ids(store.select(AndRule([counting, TagRule("big")]))) == [0]
+        assert counting.selected == 2
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,40 @@
+# coding=UTF-8
+import random
+import unittest
+from getthefacts.sampling import AliasTable, weightOf
+from getthefacts.actor import Actor
+
+class AliasTableTests(unittest.TestCase):
+    def testEmptyTableSamplesNone(self):
+        assert AliasTable([]).sample() is None
+        assert AliasTable([0, 0]).sample() is None
+
+    def testZeroWeightIsNeverSampled(self):
+        t = AliasTable([0, 1, 0])
+        for i in range(100):
+            assert t.sample() == 1
+
+    def testSamplesFollowWeights(self):
+        rng = random.Random(1)
+        t = AliasTable([1, 3])
+        counts = [0, 0]
+        for i in range(4000):
+            counts[t.sample(rng)] += 1
+        assert 800 < counts[0] < 1200
+        assert 2800 < counts[1] < 3200
+
+    def testInvalidWeightsAreRejected(self):
+        for weight in [-1, float("inf"), float("nan")]:
+            self.assertRaises(ValueError, AliasTable, [1, weight])
+
+class WeightOfTests(unittest.TestCase):
+    def testDefaultWeight(self):
+        assert weightOf(Actor("Name")) == 1.0
+
+    def testWeightFromAttribute(self):
+        a = Actor("Name")
+        a.weight = "2.5"
+        assert weightOf(a) == 2.5
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+# coding=UTF-8
+import os
+import json
+import signal
+import socket
+import shutil
+import tempfile
+import threading
+import unittest
+from getthefacts.server import FactService, FactServer
+from getthefacts.fact.simple import SimpleStringFactTemplate
+from getthefacts.fact.jinja import JinjaFactTemplate
+from getthefacts.fact.index import FactIndex
+from getthefacts.actor import Actor, ActorStore
+from getthefacts.cache import LruCache
+
+def createService():
+    actors = ActorStore([Actor("John"), Actor("Jane")])
+    facts = FactIndex([SimpleStringFactTemplate("%s is out there.")], actors)
+    return FactService(facts, actors)
+
+class FactServiceTests(unittest.TestCase):
+    def setUp(self):
+        self.service = createService()
+
+    def testSayAboutActor(self):
+        assert self.service.answer("say John") == 'OK 1\n"John is out there."\n'
+
+    def testSayAboutRandomActor(self):
+        lines = self.service.answer("say").splitlines()
+        assert lines[0] == "OK 1"
+        assert json.loads(lines[1]) in ("John is out there.", "Jane is out there.")
+
+    def testBatch(self):
+        lines = self.service.answer("batch 3 Jane").splitlines()
+        assert lines == ["OK 3"] + ['"Jane is out there."'] * 3
+
+    def testLockIsShared(self):
+        lock = threading.RLock()
+        service = FactService(self.service.facts, self.service.actors, lock)
+        answers = []
+        with lock:
+            thread = threading.Thread(target = lambda: answers.append(service.answer("say John")))
+            thread.start()
+            thread.join(0.1)
+            assert answers == []
+        thread.join()
+        assert answers == ['OK 1\n"John is out there."\n']
+
+    def testPreparedTemplatesOutliveTheCache(self):
+        actors = ActorStore([Actor("John"), Actor("Jane")])
+        templates = [JinjaFactTemplate("{%% actor 'a' %%}{{ a.name }} is %d." % i) for i in range(5)]
+        compiled = JinjaFactTemplate.compiled
+        JinjaFactTemplate.compiled = LruCache(2)
+        try:
+            FactService(FactIndex(templates, actors), actors).prepare()
+            kept = [t.getTemplate() for t in templates]
+            assert [t.getTemplate() for t in templates] == kept
+            assert len(JinjaFactTemplate.compiled) == 2
+        finally:
+            JinjaFactTemplate.compiled = compiled
+
+    def testErrors(self):
+        assert self.service.answer("say Nobody").startswith("ERR ")
+        assert self.service.answer("batch many").startswith("ERR ")
+        assert self.service.answer("dance").startswith("ERR ")
+
+class FactServerTests(unittest.TestCase):
+    def start(self, address):
+        self.server = FactServer(createService(), address, 3)
+        self.thread = threading.Thread(target = self.server.serve)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.stop()
+        self.thread.join()
+
+    def request(self, family, requests):
+        client = socket.socket(family, socket.SOCK_STREAM)
+        client.connect(self.server.address)
+        client.sendall("".join([r + "\n" for r in requests]) + "quit\n")
+        data = []
+        while True:
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            data.append(chunk)
+        client.close()
+        return "".join(data)
+
+    def testPipelinedResponsesAreOrdered(self):
+        self.start(("127.0.0.1", 0))
+        requests = ["batch 20 John", "say Jane", "say Nobody", "batch 2 Jane", "say John"] * 20
+        service = createService()
+        expected = "".join([service.answer(r) for r in requests])
+        assert self.request(socket.AF_INET, requests) == expected
+
+    def testUnixSocket(self):
+        dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(dir, "gtf.sock")
+            self.start(path)
+            assert self.request(socket.AF_UNIX, ["say John"]) == 'OK 1\n"John is out there."\n'
+            self.server.stop()
+            self.thread.join()
+            assert not os.path.exists(path)
+        finally:
+            shutil.rmtree(dir)
+
+class ForkedFactServerTests(unittest.TestCase):
+    def setUp(self):
+        self.server = FactServer(createService(), ("127.0.0.1", 0), 2)
+        self.pid = os.fork()
+        if self.pid == 0:
+            try:
+                self.server.fork(3)
+            finally:
+                os._exit(0)
+        self.server.close()
+
+    def tearDown(self):
+        os.kill(self.pid, signal.SIGINT)
+        os.waitpid(self.pid, 0)
+
+    def request(self, request):
+        client = socket.create_connection(self.server.address)
+        client.sendall(request + "\nquit\n")
+        data = []
+        while True:
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            data.append(chunk)
+        client.close()
+        return "".join(data)
+
+    def testConnectionsAreAnswered(self):
+        for i in range(10):
+            assert self.request("batch 2 Jane") == 'OK 2\n"Jane is out there."\n"Jane is out there."\n'
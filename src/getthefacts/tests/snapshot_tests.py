@@ -0,0 +1,62 @@
+# coding=UTF-8
+import os
+import shutil
+import tempfile
+import unittest
+from getthefacts.snapshot import Snapshot, SnapshotWriter, SnapshotError, sourcesOf
+from getthefacts.loaders import readDir
+from getthefacts.actor import Actor, ActorJsonFormatter
+from getthefacts.fact.jinja import JinjaFactFormatter
+from getthefacts.rules import TagRule
+
+class SnapshotTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.actorsDir = os.path.join(self.dir, "actors")
+        self.factsDir = os.path.join(self.dir, "facts")
+        os.mkdir(self.actorsDir)
+        os.mkdir(self.factsDir)
+        self.write(self.actorsDir, "a.json", '{"name":"John", "tags":["human"], "age":"25"}')
+        self.write(self.factsDir, "f.txt", '{% actor "u", "human" %}Hello, {{ u.name }}!')
+        self.dirs = [self.actorsDir, self.factsDir]
+        self.fileName = os.path.join(self.dir, "gtf.snapshot")
+        sources = sourcesOf(self.dirs)
+        actors = list(readDir(self.actorsDir, ActorJsonFormatter()))
+        facts = list(readDir(self.factsDir, JinjaFactFormatter()))
+        SnapshotWriter().write(self.fileName, actors, facts, sources)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, d, name, content):
+        f = open(os.path.join(d, name), "w")
+        f.write(content)
+        f.close()
+
+    def testActorsAreRestored(self):
+        actors = list(Snapshot(self.fileName).actors())
+        assert len(actors) == 1
+        assert actors[0].name == "John"
+        assert actors[0].tags == ["human"]
+        assert actors[0].age == "25"
+
+    def testFactsAreRestored(self):
+        facts = Snapshot(self.fileName).facts()
+        assert len(facts) == 1
+        f = facts[0].buildup()
+        assert f.actorPlaceholders[0].index == "u"
+        assert f.actorPlaceholders[0].rule == TagRule("human")
+        assert f.getFactAbout(Actor("John")) == "Hello, John!"
+
+    def testIsStale(self):
+        snapshot = Snapshot(self.fileName)
+        assert not snapshot.isStale(self.dirs)
+        self.write(self.factsDir, "g.txt", "Hello!")
+        assert snapshot.isStale(self.dirs)
+
+    def testNotASnapshot(self):
+        self.write(self.dir, "other", "{}" * 20)
+        self.assertRaises(SnapshotError, Snapshot, os.path.join(self.dir, "other"))
+
+if __name__ == "__main__":
+    unittest.main()
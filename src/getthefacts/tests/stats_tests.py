@@ -0,0 +1,91 @@
+# coding=UTF-8
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from getthefacts.stats import Histogram, Statistics, Instrumentation
+from getthefacts.fact import Fact, ActorPlaceholder
+from getthefacts.fact.choosers import RandomFactChooser
+from getthefacts.fact.simple import SimpleStringFactTemplate
+from getthefacts.actor import Actor
+
+class HistogramTests(unittest.TestCase):
+    def testQuantiles(self):
+        h = Histogram()
+        for i in range(99):
+            h.add(0.00002)
+        h.add(0.3)
+        assert h.count == 100
+        assert h.quantile(0.5) == 2.5e-05
+        assert h.quantile(0.99) == 2.5e-05
+        assert h.quantile(1.0) == 0.3
+        assert Histogram().quantile(0.5) is None
+
+class StatisticsTests(unittest.TestCase):
+    def setUp(self):
+        self.statistics = Statistics()
+        self.statistics.time("render", 0.002)
+        self.statistics.time("render", 0.02)
+        self.statistics.count("plan.index", 3)
+
+    def testPrometheus(self):
+        lines = self.statistics.toPrometheus().splitlines()
+        assert 'gtf_calls_total{name="plan.index"} 3' in lines
+        assert 'gtf_duration_seconds_bucket{name="render",le="0.0025"} 1' in lines
+        assert 'gtf_duration_seconds_bucket{name="render",le="+Inf"} 2' in lines
+        assert 'gtf_duration_seconds_count{name="render"} 2' in lines
+
+    def testExport(self):
+        dir = tempfile.mkdtemp()
+        try:
+            fileName = os.path.join(dir, "stats.json")
+            self.statistics.export(fileName)
+            data = json.load(open(fileName))
+            assert os.listdir(dir) == ["stats.json"]
+        finally:
+            shutil.rmtree(dir)
+        assert data["counters"] == {"plan.index" : 3}
+        assert data["timers"]["render"]["count"] == 2
+
+    def testReset(self):
+        self.statistics.reset()
+        assert self.statistics.toDict() == {"counters" : {}, "timers" : {}}
+
+class InstrumentationTests(unittest.TestCase):
+    def setUp(self):
+        self.statistics = Statistics()
+        self.instrumentation = Instrumentation(self.statistics)
+
+    def tearDown(self):
+        self.instrumentation.disable()
+
+    def testMethodsAreRestored(self):
+        render, predicate = Fact.__dict__["render"], ActorPlaceholder.__dict__["predicate"]
+        self.instrumentation.enable()
+        assert Fact.__dict__["render"] is not render
+        self.instrumentation.enable()
+        self.instrumentation.disable()
+        assert Fact.__dict__["render"] is render
+        assert ActorPlaceholder.__dict__["predicate"] is predicate
+
+    def testCallsAreRecorded(self):
+        self.instrumentation.enable()
+        chooser = RandomFactChooser([SimpleStringFactTemplate("%s is out there.|[truth, (lie, !big)]")],
+                                    [Actor("The truth", ["truth"]), Actor("A lie", ["lie", "big"])])
+        assert chooser.choose() == "The truth is out there."
+        assert chooser.facts.applicableTo(Actor("The truth", ["truth"])) == [0]
+        timers = self.statistics.histograms
+        assert timers["choose"].count == 1
+        assert timers["bind"].count == 1
+        assert timers["render"].count == 1
+        assert timers["parse.template"].count == 1
+        counters = self.statistics.counters
+        assert counters["plan.or"] == counters["plan.and"] == counters["plan.not"] == 1
+        assert counters["plan.index"] == 3
+        assert counters["predicate"] == 1
+
+    def testNothingIsRecordedWhenDisabled(self):
+        chooser = RandomFactChooser([SimpleStringFactTemplate("%s is out there.")], [Actor("The truth")])
+        chooser.choose()
+        assert self.statistics.toDict() == {"counters" : {}, "timers" : {}}
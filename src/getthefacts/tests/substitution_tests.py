@@ -18,17 +18,51 @@ class SubstitutionTests(unittest.TestCase):
 class FactSubstitutionTests(unittest.TestCase):
 
     def testParse(self):
-        f = SimpleStringFactFormatter().read("%s is a [big, beautiful] [tree, bird, fish].")
+        f = SimpleStringFactFormatter().read("%s is a [big, beautiful] [tree, bird, fish].").buildup()
         s = f.template.substitutions
         assert len(s) == 2
         assert s[0].subst == "[big, beautiful]"
         assert s[1].subst == "[tree, bird, fish]"
 
     def testSingleSubstitution(self):
-        f = SimpleStringFactFormatter().read("%s is a [big, beautiful] tree.")
+        f = SimpleStringFactFormatter().read("%s is a [big, beautiful] tree.").buildup()
         s = f.getFactAbout(Actor("Oak"))
         assert s in ["Oak is a beautiful tree.", "Oak is a big tree."]
 
     def testInvalidFormatRaisesError(self):
         f = SimpleStringFactTemplate("%s is a [big, beautiful tree.")
         self.assertRaises(FactFormatError, f.buildup)
+
+class SegmentsTests(unittest.TestCase):
+    def render(self, pattern, name = "Oak"):
+        return SimpleStringFactFormatter().read(pattern).buildup().getFactAbout(Actor(name))
+
+    def testSegments(self):
+        t = SimpleStringFactTemplate("%s is a [big, old] tree, 100%% sure.")
+        t.buildup()
+        assert t.segments[0] == 0
+        assert t.segments[1] == " is a "
+        assert t.segments[2].choices == ["big", "old"]
+        assert t.segments[3] == " tree, 100% sure."
+
+    def testNestedSubstitution(self):
+        f = "%s is [a [big, tall], an old] tree."
+        results = set([self.render(f) for i in range(200)])
+        assert results == set(["Oak is a big tree.", "Oak is a tall tree.",
+                               "Oak is an old tree."])
+
+    def testSameTextInSeveralSubstitutions(self):
+        results = set([self.render("%s: [a, b] [a, b]") for i in range(200)])
+        assert results == set(["Oak: a a", "Oak: a b", "Oak: b a", "Oak: b b"])
+
+    def testNameIsNotSubstituted(self):
+        assert self.render("%s is here.", "[x, y]") == "[x, y] is here."
+
+    def testUnbalancedBracketsRaiseError(self):
+        self.assertRaises(FactFormatError, SimpleStringFactTemplate("%s is] here.").buildup)
+        self.assertRaises(FactFormatError, SimpleStringFactTemplate("%s is [a [b, c] here.").buildup)
+
+    def testRenderWithContext(self):
+        t = SimpleStringFactTemplate("%s is a word.")
+        t.buildup()
+        assert t.render({0 : Actor("Book")}) == "Book is a word."
@@ -1,13 +1,24 @@
 # coding=UTF-8
 import os
+import sys
 import cmd
 import random
+import itertools
+import threading
 import gettext
 import os.path
 from getthefacts.fact.simple import SimpleStringFactFormatter
 from getthefacts.fact.jinja import JinjaFactFormatter
 from getthefacts.fact.choosers import *
+from getthefacts.fact.index import FactIndex
 from getthefacts.actor import *
+from getthefacts.bitsets import countOf
+from getthefacts.loaders import readLines, readDir, readRecords, DirectoryReloader, DirectoryWatcher
+from getthefacts.snapshot import Snapshot, SnapshotWriter, SnapshotError, sourcesOf
+from getthefacts.parallel import ParallelLoader
+from getthefacts.rules import RuleParser, RuleParserError, RuleCompiler
+from getthefacts.server import FactService, FactServer
+from getthefacts.stats import statistics, instrumentation
 
 try:
     t = gettext.translation("getthefacts", "lang")
@@ -17,23 +28,31 @@ except:
 
 __version__ = "0.2"
 
-def readList(fileName, formatter):
-    list = []
-    try:
-        list = [formatter.read(line.strip()) for line in file(fileName).readlines()
-                if not (line == "\n" or line.startswith("#"))]
-    except Exception, e:
-        print "Error occurred while reading the file %s" % fileName
-        print e
-    finally:
-        return list
-
 class GtfCmd(cmd.Cmd):
 
+    JINJA_DIRS = ["../j/actors", "../j/facts"]
+
+    SNAPSHOT = "../j/gtf.snapshot"
+
+    # Multiline facts of the plain store, many per file.
+    PLAIN_CONTAINER = "../data/facts.gtf"
+
     def __init__(self):
         cmd.Cmd.__init__(self, "\t")
-        self.actors = []
-        self.facts = []
+        self.actors = ActorStore()
+        self.facts = FactIndex([], self.actors)
+        self.reloaders = None
+        self.watcher = None
+        # Commands and reloads by the watcher are executed one at a time.
+        self.lock = threading.RLock()
+
+    def onecmd(self, line):
+        # The server takes the lock for every request itself, so the
+        # watcher can reload the store between the requests.
+        if self.parseline(line)[0] == "serve":
+            return cmd.Cmd.onecmd(self, line)
+        with self.lock:
+            return cmd.Cmd.onecmd(self, line)
 
     def preloop(self):
         pass
@@ -41,38 +60,234 @@ class GtfCmd(cmd.Cmd):
     def postcmd(self, stop, line):
         return stop
 
-    def __load_plain(self):
-        self.actors = readList("../data/actors.txt", ActorFormatter())
-        self.facts = readList("../data/facts.txt", SimpleStringFactFormatter())
+    def __load_plain(self, errors):
+        self.actors = ActorStore(readLines("../data/actors.txt", ActorFormatter(), errors))
+        facts = readLines("../data/facts.txt", SimpleStringFactFormatter(), errors)
+        if os.path.exists(GtfCmd.PLAIN_CONTAINER):
+            facts = itertools.chain(facts, readRecords(GtfCmd.PLAIN_CONTAINER,
+                                                       SimpleStringFactFormatter(), errors))
+        self.facts = FactIndex(facts, self.actors)
 
-    def __load_dir(self, _dir, formatter):
-        r = []
-        ff = os.listdir(_dir)
-        for f in ff:
-            fl = os.path.join(_dir,f)
-            if os.path.isfile(fl):
-                r.append(formatter.read(open(fl).read()))
-        return r
+    def __load_jinja(self, errors):
+        actors = DirectoryReloader("../j/actors", ActorJsonFormatter())
+        facts = DirectoryReloader("../j/facts", JinjaFactFormatter())
+        self.actors = ActorStore(actors.load(errors))
+        self.facts = FactIndex(facts.load(errors), self.actors)
+        self.reloaders = (actors, facts)
 
-    def __load_jinja(self):
-        self.actors = self.__load_dir("../j/actors", ActorJsonFormatter())
-        self.facts = self.__load_dir("../j/facts", JinjaFactFormatter())
+    def __load_compact(self, errors):
+        self.actors = ActorStore(readDir("../j/actors", ActorJsonFormatter(), errors), columnar = True)
+        self.facts = FactIndex(readDir("../j/facts", JinjaFactFormatter(), errors), self.actors)
 
+    def __load_snapshot(self, errors):
+        try:
+            snapshot = Snapshot(GtfCmd.SNAPSHOT)
+        except (EnvironmentError, SnapshotError), e:
+            errors.append((GtfCmd.SNAPSHOT, e))
+            return False
+        if snapshot.isStale(GtfCmd.JINJA_DIRS):
+            print _("The snapshot is out of date, loading the sources instead. "
+                    "Use 'compile' to update it.")
+            self.__load_jinja(errors)
+            return
+        self.actors = ActorStore(snapshot.actors())
+        self.facts = FactIndex(snapshot.facts(), self.actors)
+
+    def __load_parallel(self, errors):
+        actors, facts, failed = ParallelLoader().load("../j/actors", "../j/facts")
+        errors.extend(failed)
+        self.actors = ActorStore(actors)
+        self.facts = FactIndex(facts, self.actors)
+
+    # Loaders return False if the store could not be loaded at all, and the
+    # previously loaded store is kept.
     STORES = {
         "plain" : __load_plain,
         "jinja" : __load_jinja,
+        "snapshot" : __load_snapshot,
+        "parallel" : __load_parallel,
+        "compact" : __load_compact,
     }
 
     def do_load(self, store):
         store = store or "jinja"
         if store in GtfCmd.STORES:
             doload = GtfCmd.STORES[store]
-            doload(self)
+            errors = []
+            reloaders, self.reloaders = self.reloaders, None
+            loaded = doload(self, errors) is not False
+            for fileName, e in errors:
+                print _("Error occurred while reading the file %s") % fileName
+                print e
+            if not loaded:
+                self.reloaders = reloaders
+                print _("Could not load the %s store, the previous one is kept.") % store
+                return
+            for name in self.actors.registry.duplicates():
+                print _("Several actors are named %s, the first one is used.") % name
             print _("Loaded %d facts and %d actors.") % (len(self.facts), len(self.actors))
         else:
             print _("Unknown storage format: %s") % store
             print _("Availavle formats: %s") % ", ".join(GtfCmd.STORES.iterkeys())
 
+    def do_explain(self, line):
+        try:
+            rule = RuleCompiler().simplify(RuleParser(line).parse())
+        except RuleParserError, e:
+            print _("Invalid rule: %s") % e
+            return False
+        plan = self.actors.planner.plan(rule)
+        for step in plan.describe():
+            print step
+        print _("Selected %d of %d actors.") % \
+              (countOf(plan.select(self.actors)), len(self.actors))
+        return False
+
+    def do_check(self, line):
+        unsatisfiable = self.facts.unsatisfiable()
+        for i in unsatisfiable:
+            if i in self.facts.errors:
+                print _("Can not be parsed: %s: %s") % (self.__describe(self.facts[i]),
+                                                        self.facts.errors[i])
+            else:
+                print _("Can not be satisfied: %s") % self.__describe(self.facts[i])
+        print _("%d of %d facts can not be satisfied by loaded actors.") % \
+              (len(unsatisfiable), len(self.facts))
+
+    def __describe(self, template):
+        return getattr(template, "fileName", None) or template.factString
+
+    def do_compile(self, line):
+        errors = []
+        sources = sourcesOf(GtfCmd.JINJA_DIRS)
+        actors = list(readDir("../j/actors", ActorJsonFormatter(), errors))
+        facts = list(readDir("../j/facts", JinjaFactFormatter(), errors))
+        try:
+            if len(errors) == 0:
+                SnapshotWriter().write(GtfCmd.SNAPSHOT, actors, facts, sources)
+        except Exception, e:
+            errors.append((GtfCmd.SNAPSHOT, e))
+        for fileName, e in errors:
+            print _("Error occurred while compiling the file %s") % fileName
+            print e
+        if len(errors) == 0:
+            print _("Compiled %d facts and %d actors into %s.") % \
+                  (len(facts), len(actors), GtfCmd.SNAPSHOT)
+        return False
+
+    def do_reload(self, line):
+        self.__reload(False)
+        return False
+
+    def __reload(self, quiet):
+        with self.lock:
+            if self.reloaders is None:
+                if not quiet:
+                    print _("Only the jinja store can be reloaded.")
+                return
+            errors = []
+            actorsReloader, factsReloader = self.reloaders
+            actors = actorsReloader.reload(self.actors, errors)
+            facts = factsReloader.reload(self.facts, errors)
+            for fileName, e in errors:
+                print _("Error occurred while reading the file %s") % fileName
+                print e
+            if not quiet or sum(actors + facts) > 0:
+                print _("Actors: %d added, %d changed, %d removed.") % actors
+                print _("Facts: %d added, %d changed, %d removed.") % facts
+
+    def do_watch(self, line):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        if line.strip() == "off":
+            print _("Stopped watching the store.")
+            return False
+        try:
+            interval = float(line or 5)
+        except ValueError:
+            print _("Please specify the interval in seconds, or 'off'.")
+            return False
+        self.watcher = DirectoryWatcher(interval, lambda: self.__reload(True))
+        self.watcher.start()
+        print _("Reloading the changes every %g seconds.") % interval
+        return False
+
+    def do_serve(self, line):
+        words = line.split()
+        address = len(words) > 0 and words[0] or "localhost:7777"
+        try:
+            workers = int(len(words) > 1 and words[1] or 4)
+            processes = int(len(words) > 2 and words[2] or 1)
+            if ":" in address:
+                host, port = address.rsplit(":", 1)
+                address = (host, int(port))
+        except ValueError:
+            print _("Please specify host:port or the path of a Unix socket, "
+                    "the number of workers and the number of processes.")
+            return False
+        if processes > 1 and self.watcher is not None:
+            print _("The changes can not be reloaded into several processes; "
+                    "please stop watching the store first.")
+            return False
+        with self.lock:
+            if len(self.facts) == 0:
+                self.do_load("")
+            service = FactService(self.facts, self.actors, self.lock)
+        try:
+            server = FactServer(service, address, workers)
+        except EnvironmentError, e:
+            print _("Could not listen on %s: %s") % (line, e)
+            return False
+        print _("Serving the facts on %s by %d processes. Press Ctrl+C to stop.") % \
+              (server.address, processes)
+        try:
+            if processes > 1:
+                server.fork(processes)
+            else:
+                server.serve()
+        except KeyboardInterrupt:
+            pass
+        print _("Stopped serving the facts.")
+        return False
+
+    def do_stats(self, line):
+        words = line.split()
+        command = len(words) > 0 and words[0] or ""
+        if command == "on":
+            instrumentation.enable()
+            print _("Collecting the statistics.")
+        elif command == "off":
+            instrumentation.disable()
+            print _("Stopped collecting the statistics.")
+        elif command == "reset":
+            statistics.reset()
+        elif command in ("json", "prometheus") and len(words) == 2:
+            try:
+                statistics.export(words[1], command)
+            except EnvironmentError, e:
+                print _("Could not write the statistics: %s") % e
+        elif command == "":
+            self.__print_stats()
+        else:
+            print _("Unknown arguments: %s") % line
+        return False
+
+    def __print_stats(self):
+        if not instrumentation.isEnabled():
+            print _("The statistics are not collected. Use 'stats on' to start.")
+        timers = dict(statistics.histograms)
+        if len(timers) > 0:
+            print "%-20s %10s %12s %10s %10s %10s" % \
+                  (_("name"), _("calls"), _("total ms"), _("mean ms"), _("p99 ms"), _("max ms"))
+        for name in sorted(timers):
+            h = timers[name]
+            print "%-20s %10d %12.1f %10.3f %10.3f %10.3f" % \
+                  (name, h.count, h.total * 1000, h.total * 1000 / h.count,
+                   h.quantile(0.99) * 1000, h.max * 1000)
+        for name, count in sorted(dict(statistics.counters).iteritems()):
+            print "%-20s %10d" % (name, count)
+
     def do_quit(self, line):
         return True
 
@@ -89,10 +304,29 @@ class GtfCmd(cmd.Cmd):
         self.__say_fact(chooser)
         return False
 
+    def do_batch(self, line):
+        [count, name] = (line.split(None, 1) + [""])[:2]
+        try:
+            count = int(count)
+        except ValueError:
+            print _("Please specify the number of facts.")
+            return False
+        actor = None
+        if len(name) > 0:
+            actor = self.__findActor(name)
+            if actor is None:
+                print _("Sorry, I could not find %s.") % name
+                return False
+        try:
+            for fact in generate(self.facts, self.actors, count, actor):
+                print fact
+        except Exception, e:
+            print _("Error occurred. Please try once again.")
+            print e
+        return False
+
     def __findActor(self, name):
-        for a in self.actors:
-            if a.name == name:
-                return a
+        return self.actors.byName(name)
 
     def __say_fact(self, chooser):
         try:
@@ -116,6 +350,72 @@ class GtfCmd(cmd.Cmd):
                 "provided, a fact about this actor is displayed. If the name "
                 "is omitted, a fact about random actor is displayed.")
 
+    def help_batch(self):
+        print _("Show several facts at once.")
+        print _("Command format:")
+        print _("")
+        print _("batch count [name]")
+        print _("")
+        print _("Parameters:")
+        print _("    count: the number of facts to show.")
+        print _("    name (optional): the name of an actor. If the name is "
+                "provided, the facts about this actor are displayed.")
+
+    def help_check(self):
+        print _("Parse all loaded facts and list the ones that can not be "
+                "satisfied by loaded actors.")
+
+    def help_explain(self):
+        print _("Show how the actors satisfying the rule are selected: the "
+                "steps of the plan with the estimated number of actors and "
+                "cost of each step.")
+        print _("Command format:")
+        print _("")
+        print _("explain rule")
+
+    def help_compile(self):
+        print _("Compile the jinja store into the snapshot, that is loaded "
+                "much faster by 'load snapshot'.")
+
+    def help_reload(self):
+        print _("Reload the files of the jinja store that were added, changed "
+                "or removed since it was loaded.")
+
+    def help_watch(self):
+        print _("Reload the changes of the jinja store periodically.")
+        print _("Command format:")
+        print _("")
+        print _("watch [seconds | off]")
+
+    def help_serve(self):
+        print _("Answer 'say' and 'batch' requests over a local socket, until "
+                "interrupted. The jinja store is loaded if nothing is loaded.")
+        print _("Command format:")
+        print _("")
+        print _("serve [host:port | path] [workers] [processes]")
+        print _("")
+        print _("Parameters:")
+        print _("    host:port or path (optional): the TCP address, or the "
+                "path of a Unix socket to listen on; localhost:7777 by default.")
+        print _("    workers (optional): the number of threads rendering the "
+                "facts in every process; 4 by default.")
+        print _("    processes (optional): the number of processes sharing "
+                "the loaded store and accepting the connections; 1 by default.")
+
+    def help_stats(self):
+        print _("Show or export the statistics of calls on the hot paths: "
+                "their number and durations.")
+        print _("Command format:")
+        print _("")
+        print _("stats [on | off | reset | json file | prometheus file]")
+        print _("")
+        print _("Parameters:")
+        print _("    on, off: start or stop collecting the statistics; they "
+                "are not collected by default.")
+        print _("    reset: forget the collected statistics.")
+        print _("    json, prometheus: write the statistics to the file as "
+                "JSON, or in the text format of Prometheus.")
+
     def help_help(self):
         print _("Display this help.")
 
@@ -124,9 +424,13 @@ class GtfCmd(cmd.Cmd):
 
 
 if __name__ == "__main__":
-    print _("Welcome to GetTheFacts v. %s") % __version__
-    cmd = GtfCmd()
-    cmd.intro = _("Enter the command. Enter '?' or 'help' for the "
-                  "list of available commands.")
-    cmd.prompt = ">>"
-    cmd.cmdloop()
\ No newline at end of file
+    gtf = GtfCmd()
+    if len(sys.argv) > 1:
+        # Run the single command given on the command line, e.g. 'compile'.
+        gtf.onecmd(" ".join(sys.argv[1:]))
+    else:
+        print _("Welcome to GetTheFacts v. %s") % __version__
+        gtf.intro = _("Enter the command. Enter '?' or 'help' for the "
+                      "list of available commands.")
+        gtf.prompt = ">>"
+        gtf.cmdloop()
\ No newline at end of file